@@ -4,102 +4,35 @@ from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
     QPushButton, QGraphicsScene, QGraphicsView, QGraphicsPixmapItem,
     QGraphicsEllipseItem, QGraphicsLineItem, QGraphicsTextItem,
-    QGraphicsItem, QShortcut, QInputDialog, QUndoStack, QUndoCommand,
-    QListWidget, QLabel, QDialog, QFormLayout, QLineEdit, QCheckBox,
-    QDialogButtonBox, QAbstractItemView, QPlainTextEdit
+    QGraphicsItem, QShortcut, QInputDialog,
+    QListView, QLabel, QDialog, QFormLayout, QLineEdit, QCheckBox,
+    QDialogButtonBox, QAbstractItemView, QFileDialog, QMessageBox, QPlainTextEdit,
+    QComboBox, QTableView
 )
 from PyQt5.QtGui import (
-    QPixmap, QIcon, QPen, QBrush, QPainter, QKeySequence, QTransform
+    QPixmap, QIcon, QPen, QBrush, QColor, QPainter, QPainterPath, QPicture, QKeySequence, QTransform
+)
+from PyQt5.QtCore import (
+    Qt, QRectF, QPointF, QLineF, QAbstractListModel, QAbstractTableModel, QModelIndex, QTimer, QThread,
+    pyqtSignal
 )
-from PyQt5.QtCore import Qt, QRectF, QPointF
-
-##############################################################################
-#                        Component Property Definitions                      #
-##############################################################################
-COMPONENT_PROPERTIES = {
-    "BS": {  # new beam splitter
-        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
-        "R": {"label": "Reflectivity", "required": False, "default": "", "type": "float"},
-        "T": {"label": "Transmissivity", "required": False, "default": "", "type": "float"},
-        "L": {"label": "Loss", "required": False, "default": "", "type": "float"},
-        "phi": {"label": "Microscopic tuning (°)", "required": False, "default": "", "type": "float"},
-        "alpha": {"label": "Angle of incidence (°)", "required": False, "default": "", "type": "float"},
-        "Rc": {"label": "Radius of curvature (m)", "required": False, "default": "inf", "type": "float"},
-        "xbeta": {"label": "Misalignment yaw (rad)", "required": False, "default": "0", "type": "float"},
-        "ybeta": {"label": "Misalignment pitch (rad)", "required": False, "default": "0", "type": "float"},
-        "plane": {"label": "Plane of incidence", "required": False, "default": "xz", "type": "str"},
-        "misaligned": {"label": "Misaligned (True/False)", "required": False, "default": False, "type": "bool"},
-        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
-    },
-    "beamsplitter_old": {  # old beam splitter
-        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
-        "R": {"label": "Reflectivity", "required": False, "default": "", "type": "float"},
-        "T": {"label": "Transmissivity", "required": False, "default": "", "type": "float"},
-        "L": {"label": "Loss", "required": False, "default": "", "type": "float"},
-        "phi": {"label": "Microscopic tuning (°)", "required": False, "default": "", "type": "float"},
-        "alpha": {"label": "Angle of incidence (°)", "required": False, "default": "", "type": "float"},
-        "Rc": {"label": "Radius of curvature (m)", "required": False, "default": "inf", "type": "float"},
-        "xbeta": {"label": "Misalignment yaw (rad)", "required": False, "default": "0", "type": "float"},
-        "ybeta": {"label": "Misalignment pitch (rad)", "required": False, "default": "0", "type": "float"},
-        "plane": {"label": "Plane of incidence", "required": False, "default": "xz", "type": "str"},
-        "misaligned": {"label": "Misaligned (True/False)", "required": False, "default": False, "type": "bool"},
-        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
-    },
-    "mirror": {
-        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
-        "R": {"label": "Reflectivity", "required": False, "default": 0.5, "type": "float"},
-        "T": {"label": "Transmittance", "required": False, "default": 0.5, "type": "float"},
-        "L": {"label": "Loss", "required": False, "default": 0.0, "type": "float"},
-        "phi": {"label": "Tuning (°)", "required": False, "default": 0.0, "type": "float"},
-        "Rc": {"label": "Radius of curvature (m)", "required": False, "default": "inf", "type": "float"},
-        "xbeta": {"label": "Misalignment yaw (rad)", "required": False, "default": "0", "type": "float"},
-        "ybeta": {"label": "Misalignment pitch (rad)", "required": False, "default": "0", "type": "float"},
-        "misaligned": {"label": "Misaligned (True/False)", "required": False, "default": False, "type": "bool"},
-        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
-    },
-    "laser": {
-        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
-        "P": {"label": "Power (W)", "required": False, "default": 1, "type": "float"},
-        "f": {"label": "Frequency offset (Hz)", "required": False, "default": 0, "type": "float"},
-        "phase": {"label": "Phase offset", "required": False, "default": 0, "type": "float"},
-        "signals_only": {"label": "Signals only (True/False)", "required": False, "default": False, "type": "bool"},
-        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
-    },
-    "power_detector": {
-        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
-        "node": {"label": "Node", "required": True, "default": "", "type": "str"},
-        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
-    },
-}
 
-##############################################################################
-#                             Undo/Redo Commands                             #
-##############################################################################
-class AddItemCommand(QUndoCommand):
-    def __init__(self, scene, item, description="Add Item"):
-        super().__init__(description)
-        self.scene = scene
-        self.item = item
-    def undo(self):
-        self.scene.removeItem(self.item)
-    def redo(self):
-        self.scene.addItem(self.item)
-
-class RemoveItemCommand(QUndoCommand):
-    def __init__(self, scene, item, description="Remove Item"):
-        super().__init__(description)
-        self.scene = scene
-        self.item = item
-        self.original_pos = item.pos()
-        self.original_parent = item.parentItem()
-    def undo(self):
-        if self.original_parent:
-            self.item.setParentItem(self.original_parent)
-        else:
-            self.scene.addItem(self.item)
-        self.item.setPos(self.original_pos)
-    def redo(self):
-        self.scene.removeItem(self.item)
+from model import (
+    COMPONENT_PROPERTIES, PORT_POSITIONS, LayoutModel,
+    COMPONENT_ADDED, COMPONENT_REMOVED, COMPONENT_MOVED, COMPONENT_ROTATED,
+    COMPONENT_CHANGED, CONNECTION_ADDED, CONNECTION_REMOVED, BATCH_FINISHED, BLOCK_REMOVED,
+    display_label, component_display_label, connection_text
+)
+from pixmaps import PixmapLibrary, ICON_SIZE
+from assistant import AssistantWidget
+from layout_io import (
+    LayoutJournal, load_layout, save_layout, snapshot_records, apply_record, LAYOUT_EXTENSION
+)
+from netlist import NetlistCompiler
+from connectivity import ConnectivityIndex
+from history import History
+from blocks import MEMBER_SIZE, block_type, block_name, is_block_type, instance_property_defs
+from profiling import PROFILER, profiled
 
 ##############################################################################
 #                Properties Dialog for Optical Components                  #
@@ -175,72 +108,266 @@ class PropertiesDialog(QDialog):
                     result[key] = text
         return result
 
+##############################################################################
+#              Bulk Property Editor (columnar, one row per component)        #
+##############################################################################
+class PropertyTableModel(QAbstractTableModel):
+    # Qt view of a proptable.PropertyTable. Invalid cells are tinted; edits
+    # that do not parse are refused.
+    def __init__(self, table, parent=None):
+        super().__init__(parent)
+        self.table = table
+        self.problems = {}
+        self.revalidate()
+
+    def revalidate(self):
+        self.problems = {(row, key): message for row, key, message in self.table.validate()}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.table)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.table.keys)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.table.defs[self.table.keys[section]].get("label", self.table.keys[section])
+        comp = self.table.model.components.get(self.table.ids[section])
+        if comp is None:
+            return None
+        return comp.label or f"{comp.comp_type} {comp.id}"
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        key = self.table.keys[index.column()]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.table.text(index.row(), key)
+        problem = self.problems.get((index.row(), key))
+        if problem is not None:
+            if role == Qt.BackgroundRole:
+                return QBrush(QColor(255, 200, 200))
+            if role == Qt.ToolTipRole:
+                return problem
+        return None
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        return self.setValues(self.table.keys[index.column()], [index.row()], [str(value)])
+
+    def setValues(self, key, rows, texts):
+        try:
+            self.table.set_values(key, rows, texts)
+        except ValueError:
+            return False
+        self.revalidate()
+        # Validation spans rows (duplicate names), so the whole table is refreshed at once.
+        self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, self.columnCount() - 1))
+        return True
+
+class BulkPropertyDialog(QDialog):
+    # Edits all selected components, one table per component type. Nothing
+    # reaches the model until OK, and then as a single undo step.
+    def __init__(self, tables, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Edit selected properties")
+        self.tables = tables
+        self.table_models = {comp_type: PropertyTableModel(table, self) for comp_type, table in tables.items()}
+        layout = QVBoxLayout(self)
+        self.type_combo = QComboBox()
+        self.type_combo.addItems([f"{comp_type} ({len(table)})" for comp_type, table in tables.items()])
+        self.type_combo.currentIndexChanged.connect(self.show_type)
+        layout.addWidget(self.type_combo)
+        self.view = QTableView()
+        layout.addWidget(self.view)
+        fill_row = QHBoxLayout()
+        self.key_combo = QComboBox()
+        self.value_edit = QLineEdit()
+        self.value_edit.setPlaceholderText("Value for the selected rows (all rows if none)")
+        fill_button = QPushButton("Set")
+        fill_button.clicked.connect(self.fill_column)
+        self.value_edit.returnPressed.connect(self.fill_column)
+        fill_row.addWidget(self.key_combo)
+        fill_row.addWidget(self.value_edit, 1)
+        fill_row.addWidget(fill_button)
+        layout.addLayout(fill_row)
+        self.status = QLabel()
+        layout.addWidget(self.status)
+        self.buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        layout.addWidget(self.buttons)
+        for table_model in self.table_models.values():
+            table_model.dataChanged.connect(self.update_status)
+        self.show_type(0)
+        self.resize(800, 500)
+
+    def current_model(self):
+        return list(self.table_models.values())[self.type_combo.currentIndex()]
+
+    def show_type(self, index):
+        table_model = self.current_model()
+        self.view.setModel(table_model)
+        self.key_combo.clear()
+        for key in table_model.table.keys:
+            self.key_combo.addItem(table_model.table.defs[key].get("label", key), key)
+        self.update_status()
+
+    def fill_column(self):
+        table_model = self.current_model()
+        key = self.key_combo.currentData()
+        rows = sorted({index.row() for index in self.view.selectionModel().selectedIndexes()}) or None
+        if key is None:
+            return
+        if not table_model.setValues(key, rows, self.value_edit.text()):
+            self.status.setText(f"'{self.value_edit.text()}' is not a valid {self.key_combo.currentText()}")
+
+    def update_status(self, *args):
+        problems = [message for table_model in self.table_models.values()
+                    for message in table_model.problems.values()]
+        changed = sum(len(table.changed_rows()) for table in self.tables.values())
+        if problems:
+            self.status.setText(f"{len(problems)} problem(s): {problems[0]}")
+        else:
+            self.status.setText(f"{changed} component(s) changed")
+        self.buttons.button(QDialogButtonBox.Ok).setEnabled(not problems)
+
+##############################################################################
+#                     Parameter Sweep Dialog and Background Task             #
+##############################################################################
+class SweepDialog(QDialog):
+    # Offers the same numeric parameters PropertiesDialog edits for the type.
+    def __init__(self, comp_type, parameters, current_values, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Sweep parameter: {comp_type}")
+        layout = QVBoxLayout()
+        form = QFormLayout()
+        self.parameter = QComboBox()
+        prop_defs = COMPONENT_PROPERTIES.get(comp_type, {})
+        for key in parameters:
+            self.parameter.addItem(prop_defs[key].get("label", key), key)
+        form.addRow("Parameter", self.parameter)
+        self.start = QLineEdit("0")
+        self.stop = QLineEdit("1")
+        self.points = QLineEdit("101")
+        form.addRow("Start", self.start)
+        form.addRow("Stop", self.stop)
+        form.addRow("Points", self.points)
+        layout.addLayout(form)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+    def getValues(self):
+        try:
+            return (self.parameter.currentData(), float(self.start.text()), float(self.stop.text()),
+                    max(int(self.points.text()), 1))
+        except ValueError:
+            return None
+
+class SweepTask(QThread):
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    def __init__(self, model, axes, maxtem=None, parent=None):
+        super().__init__(parent)
+        # Snapshot on the GUI thread; the sweep itself only reads the copy.
+        from layout_io import snapshot_records, apply_record
+        from blocks import flatten
+        self.model = LayoutModel()
+        for record in snapshot_records(model):
+            apply_record(self.model, record)
+        self.model = flatten(self.model)
+        self.axes = axes
+        self.maxtem = maxtem
+    def run(self):
+        from sweep import run_sweep
+        try:
+            self.done.emit(run_sweep(self.model, self.axes, maxtem=self.maxtem))
+        except Exception as e:  # e.g. BrokenProcessPool; an uncaught error would end the thread silently
+            self.failed.emit(str(e) or type(e).__name__)
+
 ##############################################################################
 #               Ports, Components, and ConnectionLine Classes                #
 ##############################################################################
-PORT_POSITIONS = {
-    "BS": {
-        "p1": (0.0, 0.45),
-        "p2": (0.0, 0.55),
-        "p3": (1.0, 0.45),
-        "p4": (1.0, 0.55),
-    },
-    "beamsplitter_old": {
-        "p1": (0.5, 0.0),
-        "p2": (0.5, 1.0),
-        "p3": (0.0, 0.5),
-        "p4": (1.0, 0.5),
-    },
-    "lens": {
-        "p1": (0.0, 0.5),
-        "p2": (1.0, 0.5),
-    },
-    "mirror": {
-        "p1": (0.0, 0.5),
-        "p2": (1.0, 0.5),
-    },
-    "laser": {
-        "p1": (1.0, 0.5),
-    },
-    "power_detector": {
-        "p1": (0.0, 0.5),
-    },
-}
+# Below this scale (device pixels per scene unit) items are drawn as simple glyphs.
+LOD_THRESHOLD = 0.35
+
+def levelOfDetail(painter, option):
+    return option.levelOfDetailFromTransform(painter.worldTransform())
 
 class ConnectionLine(QGraphicsLineItem):
-    def __init__(self, portA, portB):
+    def __init__(self, portA, portB, model_id=None):
         super().__init__()
         self.setFlag(QGraphicsItem.ItemIsSelectable, True)
         pen = QPen(Qt.red, 2)
         self.setPen(pen)
+        self.model_id = model_id
         self.portA = portA
         self.portB = portB
-        portA.connected_lines.append(self)
-        portB.connected_lines.append(self)
+        # Component positions the line was last drawn for (see LineUpdateScheduler).
+        self.anchorA = None
+        self.anchorB = None
+        portA.connected_lines.add(self)
+        portB.connected_lines.add(self)
         self.updateLinePosition()
+    @profiled("line.updateLinePosition")
     def updateLinePosition(self):
         ptA = self.portA.mapToScene(self.portA.boundingRect().center())
         ptB = self.portB.mapToScene(self.portB.boundingRect().center())
         self.setLine(ptA.x(), ptA.y(), ptB.x(), ptB.y())
+        self.anchorA = self.portA.parent_component.pos()
+        self.anchorB = self.portB.parent_component.pos()
+    def mouseDoubleClickEvent(self, event):
+        model = getattr(self.scene(), "model", None)
+        if model is None or self.model_id not in model.connections:
+            return super().mouseDoubleClickEvent(event)
+        length, ok = QInputDialog.getDouble(None, "Space length", "Length (m):",
+                                            model.connections[self.model_id].length, 0.0, 1e12, 6)
+        if ok:
+            model.set_connection_length(self.model_id, length)
+    def paint(self, painter, option, widget=None):
+        lod = levelOfDetail(painter, option)
+        if self.line().length() * lod < 1.0:
+            return  # shorter than a pixel on screen
+        if lod < LOD_THRESHOLD:
+            painter.setRenderHint(QPainter.Antialiasing, False)
+            painter.setPen(QPen(Qt.red, 0))
+            painter.drawLine(self.line())
+            return
+        super().paint(painter, option, widget)
+    def translateBy(self, delta):
+        self.setLine(self.line().translated(delta))
+        self.anchorA = self.anchorA + delta
+        self.anchorB = self.anchorB + delta
     def removeFromPorts(self):
-        if self in self.portA.connected_lines:
-            self.portA.connected_lines.remove(self)
-        if self in self.portB.connected_lines:
-            self.portB.connected_lines.remove(self)
+        self.portA.connected_lines.discard(self)
+        self.portB.connected_lines.discard(self)
 
 class PortItem(QGraphicsEllipseItem):
-    def __init__(self, parent_component, port_name, radius=6):
+    def __init__(self, parent_component, port_name, radius=6, model_id=None):
         super().__init__()
         self.parent_component = parent_component
         self.port_name = port_name
+        self.model_id = model_id
         self.radius = radius
         self.setRect(0, 0, radius * 2, radius * 2)
         self.setBrush(QBrush(Qt.red, Qt.SolidPattern))
         self.setPen(QPen(Qt.white, 1))
-        self.connected_lines = []
+        self.connected_lines = set()
         self.setVisible(False)
         self.setZValue(10)
         self.setFlags(QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemIsFocusable)
+    def paint(self, painter, option, widget=None):
+        if levelOfDetail(painter, option) < LOD_THRESHOLD:
+            return
+        super().paint(painter, option, widget)
     def mousePressEvent(self, event):
         super().mousePressEvent(event)
         scene = self.scene()
@@ -248,9 +375,10 @@ class PortItem(QGraphicsEllipseItem):
             scene.portClicked(self)
 
 class OpticalComponent(QGraphicsPixmapItem):
-    def __init__(self, pixmap, comp_type):
+    def __init__(self, pixmap, comp_type, model_id=None, port_ids=None):
         super().__init__(pixmap)
         self.comp_type = comp_type
+        self.model_id = model_id
         self.rotation_angle = 0.0
         self.component_label = ""
         self.properties = {}
@@ -260,12 +388,24 @@ class OpticalComponent(QGraphicsPixmapItem):
             QGraphicsItem.ItemSendsGeometryChanges
         )
         self.ports = []
+        port_ids = port_ids or {}
         if comp_type in PORT_POSITIONS:
             for pname, (nx, ny) in PORT_POSITIONS[comp_type].items():
-                p = PortItem(self, pname)
+                p = PortItem(self, pname, model_id=port_ids.get(pname))
                 p.setParentItem(self)
                 self.ports.append(p)
             self.updatePortsPosition()
+    def mouseDoubleClickEvent(self, event):
+        scene = self.scene()
+        if hasattr(scene, "componentDoubleClicked"):
+            scene.componentDoubleClicked(self)
+            return
+        super().mouseDoubleClickEvent(event)
+    def layoutModel(self):
+        scene = self.scene()
+        if self.model_id is None or scene is None:
+            return None
+        return getattr(scene, "model", None)
     def updatePortsPosition(self):
         if self.comp_type not in PORT_POSITIONS:
             return
@@ -275,143 +415,542 @@ class OpticalComponent(QGraphicsPixmapItem):
             px = rect.width() * nx
             py = rect.height() * ny
             port_item.setPos(px - port_item.radius, py - port_item.radius)
+    @profiled("component.itemChange")
     def itemChange(self, change, value):
         if change in (QGraphicsItem.ItemPositionHasChanged, QGraphicsItem.ItemTransformHasChanged):
-            for port in self.ports:
-                for line in port.connected_lines:
-                    line.updateLinePosition()
+            scheduler = getattr(self.scene(), "line_scheduler", None)
+            if scheduler is not None:
+                scheduler.markDirty(self, change == QGraphicsItem.ItemTransformHasChanged)
+            else:
+                self.updateConnectionLines()
+            model = self.layoutModel()
+            if change == QGraphicsItem.ItemPositionHasChanged and model is not None:
+                model.move_component(self.model_id, value.x(), value.y())
         elif change == QGraphicsItem.ItemSelectedHasChanged:
             for port in self.ports:
                 port.setVisible(bool(value))
         return super().itemChange(change, value)
+    def paint(self, painter, option, widget=None):
+        lod = levelOfDetail(painter, option)
+        if lod < LOD_THRESHOLD:
+            painter.setRenderHint(QPainter.Antialiasing, False)
+            painter.setPen(QPen(Qt.darkGray, 0))
+            painter.setBrush(QBrush(Qt.lightGray) if not self.isSelected() else QBrush(Qt.yellow))
+            painter.drawRect(self.boundingRect())
+            return
+        library = getattr(self.scene(), "pixmapLibrary", lambda: None)()
+        if library is not None and not self.pixmap().isNull():
+            size = library.sizeForZoom(lod)
+            if size != ICON_SIZE:
+                variant = library.pixmap(self.comp_type, size)
+                if not variant.isNull():
+                    painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+                    painter.drawPixmap(self.boundingRect(), variant, QRectF(variant.rect()))
+                    if self.isSelected():
+                        painter.setPen(QPen(Qt.black, 0, Qt.DashLine))
+                        painter.setBrush(Qt.NoBrush)
+                        painter.drawRect(self.boundingRect())
+                    return
+        super().paint(painter, option, widget)
+    def updateConnectionLines(self):
+        for port in self.ports:
+            for line in port.connected_lines:
+                line.updateLinePosition()
     def setAngle(self, angle_degrees):
         self.rotation_angle = angle_degrees
         transform = QTransform()
         transform.rotate(angle_degrees)
-        self.setTransform(transform)
-        for port in self.ports:
-            for line in port.connected_lines:
-                line.updateLinePosition()
+        self.setTransform(transform)  # lines follow through itemChange
+        model = self.layoutModel()
+        if model is not None:
+            model.set_angle(self.model_id, angle_degrees)
+
+class BlockItem(OpticalComponent):
+    # A block instance: one item with the block's exposed ports, drawn from
+    # a QPicture of its members that the scene records once per definition.
+    def __init__(self, definition, comp_type, model_id=None, port_ids=None):
+        super().__init__(QPixmap(), comp_type, model_id=model_id)
+        self.definition = definition
+        self.port_positions = definition.port_positions()
+        port_ids = port_ids or {}
+        for pname in definition.exposed:
+            p = PortItem(self, pname, model_id=port_ids.get(pname))
+            p.setParentItem(self)
+            self.ports.append(p)
+        self.updatePortsPosition()
+    def boundingRect(self):
+        return QRectF(0, 0, self.definition.width, self.definition.height)
+    def shape(self):
+        path = QPainterPath()
+        path.addRect(self.boundingRect())
+        return path
+    def updatePortsPosition(self):
+        for port_item in self.ports:
+            nx, ny = self.port_positions[port_item.port_name]
+            port_item.setPos(self.definition.width * nx - port_item.radius,
+                             self.definition.height * ny - port_item.radius)
+    def paint(self, painter, option, widget=None):
+        rect = self.boundingRect()
+        if levelOfDetail(painter, option) < LOD_THRESHOLD:
+            painter.setRenderHint(QPainter.Antialiasing, False)
+            painter.setPen(QPen(Qt.darkGray, 0))
+            painter.setBrush(QBrush(Qt.lightGray) if not self.isSelected() else QBrush(Qt.yellow))
+            painter.drawRect(rect)
+            return
+        scene = self.scene()
+        if hasattr(scene, "blockPicture"):
+            painter.drawPicture(0, 0, scene.blockPicture(self.definition))
+        painter.setPen(QPen(Qt.darkBlue, 0, Qt.DashLine if self.isSelected() else Qt.DotLine))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(rect)
+        painter.drawText(rect.adjusted(4, 2, -4, -2), Qt.AlignLeft | Qt.AlignTop,
+                         self.properties.get("name") or self.component_label)
+
+##############################################################################
+#                  Coalesced Connection-Line Updates During Drags            #
+##############################################################################
+LINE_UPDATE_INTERVAL_MS = 16  # roughly one display frame
+
+class LineUpdateScheduler:
+    # Collects components moved since the last frame and refreshes each
+    # affected ConnectionLine once. A line whose two ends moved by the same
+    # delta (and were not rotated) is translated instead of re-mapped.
+    def __init__(self, interval_ms=LINE_UPDATE_INTERVAL_MS):
+        self._dirty = set()
+        self._transformed = set()
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def markDirty(self, comp, transformed=False):
+        self._dirty.add(comp)
+        if transformed:
+            self._transformed.add(comp)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def forget(self, comp):
+        self._dirty.discard(comp)
+        self._transformed.discard(comp)
+
+    @profiled("lines.flush")
+    def flush(self):
+        self._timer.stop()
+        dirty, transformed = self._dirty, self._transformed
+        self._dirty, self._transformed = set(), set()
+        lines = set()
+        for comp in dirty:
+            for port in comp.ports:
+                lines.update(port.connected_lines)
+        translated = 0
+        for line in lines:
+            compA = line.portA.parent_component
+            compB = line.portB.parent_component
+            if line.anchorA is not None and compA not in transformed and compB not in transformed:
+                deltaA = compA.pos() - line.anchorA
+                if deltaA == compB.pos() - line.anchorB:
+                    line.translateBy(deltaA)
+                    translated += 1
+                    continue
+            line.updateLinePosition()
+        PROFILER.count("lines.translated", translated)
+        PROFILER.count("lines.recomputed", len(lines) - translated)
 
 ##############################################################################
 #              Custom Graphics Scene to Handle Placement and Port Clicks     #
 ##############################################################################
 class MyGraphicsScene(QGraphicsScene):
-    def __init__(self, parent=None):
+    # The scene is a view over a LayoutModel: edits go to the model and the
+    # graphics items are created, moved and removed from its events.
+    def __init__(self, parent=None, model=None):
         super().__init__(parent)
         self.pending_port = None
+        self.line_scheduler = LineUpdateScheduler()
+        self.model = model if model is not None else LayoutModel()
+        self.component_items = {}
+        self.port_items = {}
+        self.connection_items = {}
+        self.block_pictures = {}  # block name -> QPicture shared by its instances
+        self.model.subscribe(self.onModelEvent)
+        for comp_id in list(self.model.components):
+            self.onModelEvent(COMPONENT_ADDED, comp_id)
+        for conn_id in list(self.model.connections):
+            self.onModelEvent(CONNECTION_ADDED, conn_id)
+
+    def pixmapLibrary(self):
+        images = getattr(self.parent(), "images", None)
+        return images if isinstance(images, PixmapLibrary) else None
+
+    def pixmapFor(self, comp_type):
+        images = getattr(self.parent(), "images", None) or {}
+        return images.get(comp_type)
+
+    def blockPicture(self, definition):
+        # Members and internal connections recorded once, replayed by every instance.
+        picture = self.block_pictures.get(definition.name)
+        if picture is not None:
+            return picture
+        picture = QPicture()
+        painter = QPainter(picture)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        for member in definition.members:
+            painter.save()
+            painter.translate(member.x, member.y)
+            painter.rotate(member.angle)
+            pixmap = self.pixmapFor(member.comp_type)
+            if pixmap is not None and not pixmap.isNull():
+                painter.drawPixmap(QRectF(0, 0, MEMBER_SIZE, MEMBER_SIZE), pixmap, QRectF(pixmap.rect()))
+            else:
+                painter.setPen(QPen(Qt.darkGray, 0))
+                painter.drawRect(QRectF(0, 0, MEMBER_SIZE, MEMBER_SIZE))
+            painter.restore()
+        painter.setPen(QPen(Qt.red, 2))
+        for a, port_a, b, port_b, _ in definition.connections:
+            painter.drawLine(QPointF(*definition.member_port_position(a, port_a)),
+                             QPointF(*definition.member_port_position(b, port_b)))
+        painter.end()
+        self.block_pictures[definition.name] = picture
+        return picture
 
     def mousePressEvent(self, event):
         main_window = self.parent()
         if hasattr(main_window, 'current_comp_to_place') and main_window.current_comp_to_place is not None:
             comp_type = main_window.current_comp_to_place
             pixmap = main_window.images.get(comp_type)
-            if pixmap is not None:
-                comp = OpticalComponent(pixmap, comp_type)
-                comp.setPos(event.scenePos())
-                self.addItem(comp)
+            if pixmap is not None or (is_block_type(comp_type) and block_name(comp_type) in self.model.blocks):
+                pos = event.scenePos()
+                self.model.add_component(comp_type, pos.x(), pos.y())
                 main_window.current_comp_to_place = None  # Reset selection after placing
                 return  # Consume the event
         super().mousePressEvent(event)
 
+    def mouseReleaseEvent(self, event):
+        super().mouseReleaseEvent(event)
+        history = getattr(self.parent(), "history", None)
+        if history is not None:
+            history.seal()  # one drag is one undo step
+
+    def componentDoubleClicked(self, comp):
+        edit = getattr(self.parent(), "edit_properties", None)
+        if edit is not None and comp.model_id in self.model.components:
+            edit(comp.model_id)
+
     def portClicked(self, port):
         if self.pending_port is None:
             self.pending_port = port
         else:
-            if self.pending_port != port:
-                connection = ConnectionLine(self.pending_port, port)
-                self.addItem(connection)
+            # Clicking the same pair twice does not stack a second connection.
+            if self.pending_port != port and self.model.connection_between(self.pending_port.model_id, port.model_id) is None:
+                self.model.connect(self.pending_port.model_id, port.model_id)
             self.pending_port = None
 
+    def onModelEvent(self, event, obj_id):
+        if event == COMPONENT_ADDED:
+            record = self.model.components[obj_id]
+            if is_block_type(record.comp_type):
+                comp = BlockItem(self.model.blocks[block_name(record.comp_type)], record.comp_type,
+                                 model_id=obj_id, port_ids=record.ports)
+            else:
+                pixmap = self.pixmapFor(record.comp_type)
+                comp = OpticalComponent(pixmap if pixmap is not None else QPixmap(), record.comp_type,
+                                        model_id=obj_id, port_ids=record.ports)
+            comp.component_label = record.label
+            comp.properties = record.properties
+            comp.setPos(record.x, record.y)
+            if record.angle:
+                comp.setAngle(record.angle)
+            self.component_items[obj_id] = comp
+            for port in comp.ports:
+                self.port_items[port.model_id] = port
+            self.addItem(comp)
+        elif event == COMPONENT_REMOVED:
+            comp = self.component_items.pop(obj_id)
+            self.line_scheduler.forget(comp)
+            for port in comp.ports:
+                self.port_items.pop(port.model_id, None)
+                if self.pending_port is port:
+                    self.pending_port = None
+            self.removeItem(comp)
+        elif event == COMPONENT_MOVED:
+            record = self.model.components[obj_id]
+            comp = self.component_items[obj_id]
+            if comp.pos() != QPointF(record.x, record.y):
+                comp.setPos(record.x, record.y)
+        elif event == COMPONENT_ROTATED:
+            record = self.model.components[obj_id]
+            comp = self.component_items[obj_id]
+            if comp.rotation_angle != record.angle:
+                comp.setAngle(record.angle)
+        elif event == COMPONENT_CHANGED:
+            record = self.model.components[obj_id]
+            comp = self.component_items[obj_id]
+            comp.component_label = record.label
+            comp.properties = record.properties
+        elif event == CONNECTION_ADDED:
+            record = self.model.connections[obj_id]
+            line = ConnectionLine(self.port_items[record.port_a], self.port_items[record.port_b],
+                                  model_id=obj_id)
+            self.connection_items[obj_id] = line
+            self.addItem(line)
+        elif event == CONNECTION_REMOVED:
+            line = self.connection_items.pop(obj_id)
+            line.removeFromPorts()
+            self.removeItem(line)
+        elif event == BLOCK_REMOVED:
+            self.block_pictures.pop(obj_id, None)
+
 ##############################################################################
-#                      Assistant Widget (OpenAI Assistant API)             #
+#                    Connection Details (incremental list model)             #
 ##############################################################################
-class AssistantWidget(QWidget):
-    def __init__(self, parent=None):
+class ConnectionListModel(QAbstractListModel):
+    # One row per model connection. Rows are inserted/removed on connection
+    # events in O(1) and only the rows touching a changed component are re-rendered.
+    def __init__(self, layout_model, parent=None):
         super().__init__(parent)
-        layout = QVBoxLayout(self)
-        title = QLabel("Assistant")
-        layout.addWidget(title)
-        self.conversation = QPlainTextEdit()
-        self.conversation.setReadOnly(True)
-        layout.addWidget(self.conversation)
-        h_layout = QHBoxLayout()
-        self.input_line = QLineEdit()
-        h_layout.addWidget(self.input_line)
-        self.send_button = QPushButton("Send")
-        h_layout.addWidget(self.send_button)
-        layout.addLayout(h_layout)
-        self.send_button.clicked.connect(self.send_message)
-        from openai import OpenAI
-        self.client = OpenAI(api_key='')
-        thread = self.client.beta.threads.create()
-        self.thread_id = thread.id
-        self.assistant_id = "asst_kgr19shqp0uwRR3rkmW1EfeV"
-        self.conversation.appendPlainText("Assistant thread created. Thread ID: " + self.thread_id)
-    def send_message(self):
-        user_text = self.input_line.text().strip()
-        if not user_text:
-            return
-        self.conversation.appendPlainText("User: " + user_text)
-        self.input_line.clear()
-        response = self.call_assistant_api(user_text)
-        self.conversation.appendPlainText("Assistant: " + response)
-    def call_assistant_api(self, user_text):
-        try:
-            self.client.beta.threads.messages.create(
-                thread_id=self.thread_id,
-                role="user",
-                content=user_text
-            )
-            run = self.client.beta.threads.runs.create_and_poll(
-                thread_id=self.thread_id,
-                assistant_id=self.assistant_id,
-                instructions="Please address the user as Jane Doe. The user has a premium account."
-            )
-            if run.status == "completed":
-                messages = self.client.beta.threads.messages.list(thread_id=self.thread_id)
-                assistant_response = ""
-                for msg in messages.data:
-                    if msg.role == "assistant":
-                        if isinstance(msg.content, list):
-                            for block in msg.content:
-                                if isinstance(block, dict) and block.get("type") == "text":
-                                    assistant_response += block.get("text", {}).get("value", "")
-                                elif isinstance(block, str):
-                                    assistant_response += block
-                        else:
-                            assistant_response += str(msg.content)
-                return assistant_response if assistant_response else "No response received."
-            else:
-                return "Run did not complete: " + run.status
-        except Exception as e:
-            return "Error: " + str(e)
+        self.layout_model = layout_model
+        self._rows = []
+        self._row_of = {}
+        self._labels = {}
+        self._batch_rows = set()
+        self._batch_reset = False
+        self.layout_model.subscribe(self.onModelEvent)
+        self.reset()
+
+    def reset(self):
+        self.beginResetModel()
+        self._rows = list(self.layout_model.connections)
+        self._row_of = {conn_id: row for row, conn_id in enumerate(self._rows)}
+        self._labels.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        conn_id = self._rows[index.row()]
+        if conn_id not in self.layout_model.connections:
+            return None  # removed in a batch that has not finished yet
+        return connection_text(self.layout_model, conn_id, self.labelFor)
+
+    def labelFor(self, comp_id):
+        label = self._labels.get(comp_id)
+        if label is None:
+            label = component_display_label(self.layout_model.components[comp_id])
+            self._labels[comp_id] = label
+        return label
+
+    @profiled("details.onModelEvent")
+    def onModelEvent(self, event, obj_id):
+        # Inside a batch, structural changes end in one reset and label
+        # changes in one dataChanged over the affected rows.
+        batching = self.layout_model.in_batch()
+        if batching and event in (CONNECTION_ADDED, CONNECTION_REMOVED):
+            self._batch_reset = True
+        elif event == BATCH_FINISHED:
+            rows, self._batch_rows = self._batch_rows, set()
+            if self._batch_reset:
+                self._batch_reset = False
+                self.reset()
+            elif rows:
+                self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [Qt.DisplayRole])
+        elif event == CONNECTION_ADDED:
+            row = len(self._rows)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._rows.append(obj_id)
+            self._row_of[obj_id] = row
+            self.endInsertRows()
+        elif event == CONNECTION_REMOVED:
+            row = self._row_of.pop(obj_id, None)
+            if row is None:
+                return
+            # Swap-remove: the last row takes the removed row's place, so no
+            # other row moves (list order is creation order until the next reset).
+            last = len(self._rows) - 1
+            self.beginRemoveRows(QModelIndex(), last, last)
+            moved = self._rows.pop()
+            if row != last:
+                self._rows[row] = moved
+                self._row_of[moved] = row
+            self.endRemoveRows()
+            if row != last:
+                self.dataChanged.emit(self.index(row), self.index(row), [Qt.DisplayRole])
+        elif event == COMPONENT_CHANGED:
+            self._labels.pop(obj_id, None)
+            for conn_id in self.layout_model.component_connections(obj_id):
+                row = self._row_of.get(conn_id)
+                if row is None:
+                    continue
+                if batching:
+                    self._batch_rows.add(row)
+                else:
+                    index = self.index(row)
+                    self.dataChanged.emit(index, index, [Qt.DisplayRole])
+        elif event == COMPONENT_REMOVED:
+            self._labels.pop(obj_id, None)
 
 ##############################################################################
 #                           Custom Graphics View                             #
 ##############################################################################
+GRID_STEP = 50
+GRID_MIN_SPACING_PX = 8  # coarser grid levels are used when zoomed out
+CANVAS_EXTENT = 1e6
+ZOOM_STEP = 1.15
+ZOOM_RANGE = (0.005, 20.0)
+PROFILER_OVERLAY_REFRESH_MS = 500
+PROFILER_OVERLAY_ROWS = 12
+
 class CustomGraphicsView(QGraphicsView):
     def __init__(self, scene, parent=None):
         super().__init__(scene, parent)
         self.setRenderHint(QPainter.Antialiasing)
         self.setDragMode(QGraphicsView.RubberBandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        self.setCacheMode(QGraphicsView.CacheBackground)
+        scene.setSceneRect(-CANVAS_EXTENT, -CANVAS_EXTENT, 2 * CANVAS_EXTENT, 2 * CANVAS_EXTENT)
+        self.centerOn(1000, 1000)
+        self.grid_pen = QPen(Qt.gray, 0)
+        self._pan_origin = None
+        self.profiler_overlay = False
+        self.overlay_timer = QTimer(self)
+        self.overlay_timer.setInterval(PROFILER_OVERLAY_REFRESH_MS)
+        self.overlay_timer.timeout.connect(self.viewport().update)
+
+    def zoomFactor(self):
+        return self.transform().m11()
+
+    def setProfilerOverlay(self, visible):
+        self.profiler_overlay = visible
+        if visible:
+            self.overlay_timer.start()
+        else:
+            self.overlay_timer.stop()
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        with PROFILER.span("view.paint"):
+            super().paintEvent(event)
+
+    def drawForeground(self, painter, rect):
+        super().drawForeground(painter, rect)
+        if not self.profiler_overlay:
+            return
+        # Drawn in viewport coordinates, top-left, over whatever is on screen.
+        frame = PROFILER.histograms.get("view.paint")
+        lines = ["frame  n=%d  p50 %.1f ms  p95 %.1f ms  max %.1f ms" % (
+            frame.count, frame.percentile(0.5) * 1e3, frame.percentile(0.95) * 1e3, frame.max * 1e3)
+            if frame is not None else "frame  no paints recorded"]
+        for name, count, mean, p50, p95, worst in PROFILER.summary(PROFILER_OVERLAY_ROWS):
+            if name != "view.paint":
+                lines.append("%-26s n=%-7d p50 %7.3f ms  p95 %7.3f ms  max %7.1f ms" % (
+                    name, count, p50 * 1e3, p95 * 1e3, worst * 1e3))
+        for name, value in sorted(PROFILER.counters.items()):
+            lines.append(f"{name:<26} {value}")
+        if not PROFILER.enabled:
+            lines.append("profiling is off")
+        painter.save()
+        painter.resetTransform()
+        font = painter.font()
+        font.setFamily("monospace")
+        font.setStyleHint(font.TypeWriter)
+        font.setPointSize(8)
+        painter.setFont(font)
+        metrics = painter.fontMetrics()
+        width = max(metrics.horizontalAdvance(line) for line in lines) + 12
+        height = metrics.height() * len(lines) + 8
+        painter.fillRect(QRectF(4, 4, width, height), QColor(0, 0, 0, 170))
+        painter.setPen(Qt.white)
+        for i, line in enumerate(lines):
+            painter.drawText(10, 8 + metrics.ascent() + i * metrics.height(), line)
+        painter.restore()
+
+    def drawBackground(self, painter, rect):
+        # Procedural grid: only the lines inside the exposed rect are drawn, and
+        # the step doubles until lines are at least GRID_MIN_SPACING_PX apart.
+        super().drawBackground(painter, rect)
+        step = GRID_STEP
+        scale = abs(self.zoomFactor()) or 1.0
+        while step * scale < GRID_MIN_SPACING_PX:
+            step *= 2
+        left = math.floor(rect.left() / step) * step
+        top = math.floor(rect.top() / step) * step
+        lines = []
+        x = left
+        while x <= rect.right():
+            lines.append(QLineF(x, rect.top(), x, rect.bottom()))
+            x += step
+        y = top
+        while y <= rect.bottom():
+            lines.append(QLineF(rect.left(), y, rect.right(), y))
+            y += step
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setPen(self.grid_pen)
+        painter.drawLines(lines)
+        painter.restore()
+
+    def wheelEvent(self, event):
+        factor = ZOOM_STEP if event.angleDelta().y() > 0 else 1 / ZOOM_STEP
+        new_zoom = self.zoomFactor() * factor
+        if ZOOM_RANGE[0] <= new_zoom <= ZOOM_RANGE[1]:
+            self.scale(factor, factor)
+            self.resetCachedContent()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MiddleButton:
+            self._pan_origin = event.pos()
+            self.setCursor(Qt.ClosedHandCursor)
+            return
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self._pan_origin is not None:
+            delta = event.pos() - self._pan_origin
+            self._pan_origin = event.pos()
+            self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - delta.x())
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() - delta.y())
+            return
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MiddleButton and self._pan_origin is not None:
+            self._pan_origin = None
+            self.unsetCursor()
+            return
+        super().mouseReleaseEvent(event)
 
 ##############################################################################
 #                              Main Window                                 #
 ##############################################################################
+AUTOSAVE_INTERVAL_MS = 2000
+NETLIST_REFRESH_MS = 150
+LAYOUT_FILE_FILTER = f"OpticsGPT layouts (*{LAYOUT_EXTENSION} *{LAYOUT_EXTENSION}.gz)"
+
 class OpticalSetupGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Optical Layout Editor (Real-Time Movement)")
         self.setGeometry(100, 100, 1200, 800)
-        self.undo_stack = QUndoStack(self)
-        QShortcut(QKeySequence.Undo, self).activated.connect(self.undo_stack.undo)
-        QShortcut(QKeySequence.Redo, self).activated.connect(self.undo_stack.redo)
         # Shortcut for Delete key to remove selected items
         QShortcut(QKeySequence.Delete, self).activated.connect(self.delete_selected)
         
         self.current_comp_to_place = None
         self.component_counts = {}
+        self.layout_path = None
+        self.journal = None
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setInterval(AUTOSAVE_INTERVAL_MS)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.create_file_menu()
+        self.create_edit_menu()
+        self.create_simulation_menu()
+        self.create_view_menu()
+        self.carrier_solver = None
+        self.beam_tracer = None
+        self.maxtem = None  # plane waves until higher-order modes are switched on
         
         central_widget = QWidget()
         main_layout = QVBoxLayout(central_widget)
@@ -424,16 +963,9 @@ class OpticalSetupGUI(QMainWindow):
         # Left column: Palette buttons
         left_layout = QVBoxLayout()
         top_row.addLayout(left_layout, 0)
-        self.images = {
-            "lens": self.load_image("/Users/ligo/Desktop/ComponentLibrary_files/png/b-lens2.png"),
-            "BS": self.load_image("/Users/ligo/Desktop/ComponentLibrary_files/png/b-bspcube.png"),
-            "beamsplitter_old": self.load_image("/Users/ligo/Desktop/ComponentLibrary_files/png/b-bsp.png"),
-            "mirror": self.load_image("/Users/ligo/Desktop/ComponentLibrary_files/png/b-mir.png"),
-            "laser": self.load_image("/Users/ligo/Desktop/ComponentLibrary_files/png/c-laser1.png"),
-            "power_detector": self.load_image("/Users/ligo/Desktop/ComponentLibrary_files/png/e-pd1.png"),
-            "faraday_isolator": self.load_image("/Users/ligo/Desktop/ComponentLibrary_files/png/c-isolator.png"),
-        }
-        for comp_name, pix in self.images.items():
+        self.images = PixmapLibrary()
+        for comp_name in self.images.keys():
+            pix = self.images.pixmap(comp_name)
             btn = QPushButton(comp_name)
             btn.setIcon(QIcon(pix))
             btn.setIconSize(pix.size())
@@ -441,7 +973,9 @@ class OpticalSetupGUI(QMainWindow):
             left_layout.addWidget(btn)
         
         # Center column: Canvas using MyGraphicsScene
-        self.scene = MyGraphicsScene(self)
+        self.model = LayoutModel()
+        self.history = History(self.model)
+        self.scene = MyGraphicsScene(self, model=self.model)
         self.view = CustomGraphicsView(self.scene, self)
         top_row.addWidget(self.view, 1)
         
@@ -449,45 +983,363 @@ class OpticalSetupGUI(QMainWindow):
         self.assistant_widget = AssistantWidget()
         top_row.addWidget(self.assistant_widget, 0)
         
-        # Bottom row: Connection Details
+        # Bottom row: Connection Details (left) and Finesse netlist (right)
+        bottom_row = QHBoxLayout()
+        main_layout.addLayout(bottom_row)
         bottom_layout = QVBoxLayout()
-        main_layout.addLayout(bottom_layout)
+        bottom_row.addLayout(bottom_layout, 1)
         bottom_label = QLabel("Connection Details")
         bottom_layout.addWidget(bottom_label)
-        self.connection_list = QListWidget()
+        self.connection_model = ConnectionListModel(self.model, self)
+        self.connection_list = QListView()
+        self.connection_list.setModel(self.connection_model)
+        self.connection_list.setUniformItemSizes(True)
         self.connection_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         bottom_layout.addWidget(self.connection_list)
         copy_shortcut = QShortcut(QKeySequence.Copy, self.connection_list)
         copy_shortcut.activated.connect(self.copy_connection_details)
-        
-        self.draw_grid()
+        netlist_layout = QVBoxLayout()
+        bottom_row.addLayout(netlist_layout, 1)
+        netlist_layout.addWidget(QLabel("Finesse Netlist"))
+        self.netlist_view = QPlainTextEdit()
+        self.netlist_view.setReadOnly(True)
+        self.netlist_view.setLineWrapMode(QPlainTextEdit.NoWrap)
+        netlist_layout.addWidget(self.netlist_view)
+        self.netlist_compiler = NetlistCompiler(self.model)
+        self.assistant_widget.attach_layout(self.netlist_compiler)
+        self.connectivity = ConnectivityIndex(self.model)
+        self.netlist_timer = QTimer(self)
+        self.netlist_timer.setSingleShot(True)
+        self.netlist_timer.setInterval(NETLIST_REFRESH_MS)
+        self.netlist_timer.timeout.connect(self.update_netlist)
+        self.model.subscribe(self.on_model_changed)
+        self.update_netlist()
     
     def delete_selected(self):
-        # Remove all selected items from the scene.
-        for item in self.scene.selectedItems():
-            self.scene.removeItem(item)
+        # Remove all selected items as one undo step; components and connections go through the model.
+        items = self.scene.selectedItems()
+        with self.history.macro(f"Delete {len(items)} item(s)"), self.model.batch():
+            for item in items:
+                if item.scene() is None:
+                    continue  # already removed along with its component
+                if isinstance(item, OpticalComponent) and item.model_id in self.model.components:
+                    self.model.remove_component(item.model_id)
+                elif isinstance(item, ConnectionLine) and item.model_id in self.model.connections:
+                    self.model.disconnect(item.model_id)
+                elif not isinstance(item, PortItem):
+                    self.scene.removeItem(item)
+    
+    def edit_properties(self, comp_id):
+        record = self.model.components[comp_id]
+        if is_block_type(record.comp_type):
+            prop_defs = instance_property_defs(self.model.blocks[block_name(record.comp_type)])
+        else:
+            prop_defs = COMPONENT_PROPERTIES.get(record.comp_type, {})
+        current = dict(record.properties, angle=record.angle)
+        dialog = PropertiesDialog(record.comp_type, current, prop_defs, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        values = dialog.getValues()
+        angle = values.pop("angle", None)
+        from proptable import stored_properties
+        properties = stored_properties(values, prop_defs)
+        if properties == record.properties and angle in (None, record.angle):
+            return  # accepted unchanged
+        with self.history.macro("Edit properties"):
+            self.model.set_properties(comp_id, properties)
+            if angle is not None:
+                self.model.set_angle(comp_id, angle)
     
     def copy_connection_details(self):
-        selected_items = self.connection_list.selectedItems()
-        if selected_items:
-            texts = [item.text() for item in selected_items]
+        selected_rows = sorted(self.connection_list.selectionModel().selectedIndexes(), key=lambda i: i.row())
+        if selected_rows:
+            texts = [index.data() for index in selected_rows]
             clipboard = QApplication.clipboard()
             clipboard.setText("\n".join(texts))
             print("[INFO] Copied connection details to clipboard.")
     
-    def draw_grid(self):
-        pen = QPen(Qt.gray, 1)
-        step = 50
-        for x in range(0, 2000, step):
-            self.scene.addLine(x, 0, x, 2000, pen)
-        for y in range(0, 2000, step):
-            self.scene.addLine(0, y, 2000, y, pen)
+    def create_file_menu(self):
+        file_menu = self.menuBar().addMenu("&File")
+        file_menu.addAction("&Open...", self.open_layout, QKeySequence.Open)
+        file_menu.addAction("&Save", self.save_layout, QKeySequence.Save)
+        file_menu.addAction("Save &As...", self.save_layout_as, QKeySequence.SaveAs)
+    
+    def edit_selected_properties(self):
+        by_type = {}
+        for item in self.scene.selectedItems():
+            if isinstance(item, OpticalComponent) and item.model_id in self.model.components \
+                    and not is_block_type(item.comp_type):
+                by_type.setdefault(item.comp_type, []).append(item.model_id)
+        if not by_type:
+            QMessageBox.information(self, "Edit properties", "Select one or more components.")
+            return
+        from proptable import PropertyTable
+        tables = {comp_type: PropertyTable(self.model, sorted(ids)) for comp_type, ids in sorted(by_type.items())}
+        dialog = BulkPropertyDialog(tables, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        count = sum(len(table.changed_rows()) for table in tables.values())
+        with self.history.macro(f"Edit properties of {count} component(s)"), self.model.batch():
+            for table in tables.values():
+                table.apply()
+    
+    def create_edit_menu(self):
+        edit_menu = self.menuBar().addMenu("&Edit")
+        self.undo_action = edit_menu.addAction("&Undo", lambda: self.history.undo(), QKeySequence.Undo)
+        self.redo_action = edit_menu.addAction("&Redo", lambda: self.history.redo(), QKeySequence.Redo)
+        edit_menu.addSeparator()
+        edit_menu.addAction("Edit selected &properties...", self.edit_selected_properties, "Ctrl+E")
+        edit_menu.addSeparator()
+        edit_menu.addAction("&Group selection into block...", self.group_selected, "Ctrl+G")
+        edit_menu.addAction("U&ngroup block", self.ungroup_selected, "Ctrl+Shift+G")
+        edit_menu.addAction("&Insert block...", self.insert_block)
+        edit_menu.aboutToShow.connect(self.update_edit_menu)
+    
+    def update_edit_menu(self):
+        self.undo_action.setEnabled(self.history.can_undo())
+        self.undo_action.setText(f"&Undo {self.history.undo_text()}".strip())
+        self.redo_action.setEnabled(self.history.can_redo())
+        self.redo_action.setText(f"&Redo {self.history.redo_text()}".strip())
+    
+    def selected_component_ids(self):
+        return sorted(item.model_id for item in self.scene.selectedItems()
+                      if isinstance(item, OpticalComponent) and item.model_id in self.model.components)
+    
+    def group_selected(self):
+        from blocks import group_into_block
+        comp_ids = self.selected_component_ids()
+        if not comp_ids:
+            QMessageBox.information(self, "Group into block", "Select the components to group.")
+            return
+        name, ok = QInputDialog.getText(self, "Group into block", "Block name:")
+        if not ok:
+            return
+        try:
+            with self.history.macro(f"Group into block {name.strip()}"), self.model.batch():
+                group_into_block(self.model, comp_ids, name.strip())
+        except ValueError as e:
+            QMessageBox.warning(self, "Group into block", str(e))
+    
+    def ungroup_selected(self):
+        from blocks import explode_instance
+        comp_ids = [comp_id for comp_id in self.selected_component_ids()
+                    if is_block_type(self.model.components[comp_id].comp_type)]
+        with self.history.macro("Ungroup block"), self.model.batch():
+            for comp_id in comp_ids:
+                explode_instance(self.model, comp_id)
+    
+    def insert_block(self):
+        if not self.model.blocks:
+            QMessageBox.information(self, "Insert block", "No blocks defined yet; group a selection first.")
+            return
+        name, ok = QInputDialog.getItem(self, "Insert block", "Block:", sorted(self.model.blocks), 0, False)
+        if ok:
+            self.current_comp_to_place = block_type(name)
+    
+    def create_view_menu(self):
+        view_menu = self.menuBar().addMenu("&View")
+        self._profiler_was_enabled = PROFILER.enabled
+        self.profiler_action = view_menu.addAction("&Profiler overlay", self.toggle_profiler, "Ctrl+Shift+P")
+        self.profiler_action.setCheckable(True)
+        view_menu.addAction("Export profiler &trace...", self.export_profiler_trace)
+        view_menu.addAction("&Reset profiler", PROFILER.reset)
+    
+    def toggle_profiler(self):
+        # The overlay switches collection on while it is shown, then back to
+        # what it was (still on with OPTICSGPT_PROFILE=1, which collects from startup).
+        visible = self.profiler_action.isChecked()
+        if visible:
+            self._profiler_was_enabled = PROFILER.enabled
+            PROFILER.enabled = True
+        else:
+            PROFILER.enabled = self._profiler_was_enabled
+        self.view.setProfilerOverlay(visible)
+    
+    def export_profiler_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export trace", "trace.json", "Chrome trace (*.json)")
+        if path:
+            PROFILER.export_chrome_trace(path)
+    
+    def create_simulation_menu(self):
+        sim_menu = self.menuBar().addMenu("&Simulation")
+        sim_menu.addAction("&Detector powers", self.show_detector_powers, "F5")
+        sim_menu.addAction("Parameter &sweep...", self.sweep_selected)
+        sim_menu.addAction("Higher-order &modes...", self.set_maxtem)
+        sim_menu.addAction("&Beam trace", self.show_beam_trace)
+        sim_menu.addAction("&Check connectivity", self.show_connectivity)
+    
+    def sweep_selected(self):
+        from sweep import SweepAxis, sweepable_parameters
+        comps = [i for i in self.scene.selectedItems() if isinstance(i, OpticalComponent)]
+        if len(comps) != 1 or not sweepable_parameters(comps[0].comp_type):
+            QMessageBox.information(self, "Parameter sweep", "Select one component with numeric parameters.")
+            return
+        comp = comps[0]
+        dialog = SweepDialog(comp.comp_type, sweepable_parameters(comp.comp_type), comp.properties, self)
+        if dialog.exec_() != QDialog.Accepted or dialog.getValues() is None:
+            return
+        key, start, stop, points = dialog.getValues()
+        import numpy as np
+        axis = SweepAxis(comp.model_id, key, np.linspace(start, stop, points))
+        self.sweep_task = SweepTask(self.model, [axis], self.maxtem, self)
+        self.sweep_task.done.connect(self.show_sweep_result)
+        self.sweep_task.failed.connect(lambda message: QMessageBox.warning(self, "Parameter sweep", message))
+        self.sweep_task.start()
+    
+    def show_sweep_result(self, result):
+        axis = result.axes[0]
+        lines = ["\t".join([axis.key] + result.detectors)]
+        for value, row in zip(axis.values, result.powers):
+            lines.append("\t".join([f"{value:.6g}"] + [f"{p:.6g}" for p in row]))
+        self.show_text_dialog("Sweep results" + (" (cached)" if result.cached else ""), "\n".join(lines))
     
-    def load_image(self, path):
-        pixmap = QPixmap(path)
-        if pixmap.isNull():
-            print(f"Warning: could not load image at {path}")
-        return pixmap.scaled(80, 80, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    def set_maxtem(self, maxtem=None):
+        # Highest Hermite-Gauss order solved for (n + m <= maxtem); -1 means plane waves.
+        if maxtem is None:
+            current = -1 if self.maxtem is None else self.maxtem
+            maxtem, ok = QInputDialog.getInt(self, "Higher-order modes",
+                                             "Maximum mode order (-1 for plane waves):", current, -1, 12)
+            if not ok:
+                return
+        self.maxtem = None if maxtem < 0 else maxtem
+        if self.carrier_solver is not None:
+            self.carrier_solver.close()
+            self.carrier_solver = None
+    
+    def simulation_model(self):
+        # Block instances are expanded only when a simulation needs their members.
+        from blocks import flatten
+        return flatten(self.model)
+    
+    def show_beam_trace(self):
+        from beamtrace import BeamTracer
+        model = self.simulation_model()
+        if model is not self.model:
+            tracer = BeamTracer(model)  # a one-off copy with the block instances expanded
+        else:
+            if self.beam_tracer is None:
+                self.beam_tracer = BeamTracer(self.model)
+            tracer = self.beam_tracer
+        report = tracer.report()
+        self.show_text_dialog("Beam trace", report or "No laser beams to trace.")
+    
+    def show_connectivity(self):
+        report = self.connectivity.report(lambda comp_id: component_display_label(self.model.components[comp_id]))
+        self.show_text_dialog("Connectivity", report)
+    
+    def show_text_dialog(self, title, text):
+        dialog = QDialog(self)
+        dialog.setWindowTitle(title)
+        layout = QVBoxLayout(dialog)
+        view = QPlainTextEdit(text)
+        view.setReadOnly(True)
+        view.setLineWrapMode(QPlainTextEdit.NoWrap)
+        layout.addWidget(view)
+        dialog.resize(500, 400)
+        dialog.show()
+    
+    def show_detector_powers(self):
+        # numpy/scipy are only imported when a simulation is first requested.
+        model = self.simulation_model()
+        if model is not self.model:
+            from solver import CarrierSolver
+            solver = CarrierSolver(model, maxtem=self.maxtem)  # a one-off copy with the block instances expanded
+        else:
+            if self.carrier_solver is None:
+                from solver import CarrierSolver
+                self.carrier_solver = CarrierSolver(self.model, maxtem=self.maxtem)
+            solver = self.carrier_solver
+        try:
+            powers = solver.solve().detector_powers()
+        except ValueError as e:
+            QMessageBox.warning(self, "Detector powers", str(e))
+            return
+        if not powers:
+            text = "The layout has no power_detector components."
+        else:
+            text = "\n".join(
+                f"{name}: {'no node' if power is None else f'{power:.6g} W'}" for name, power in powers.items()
+            )
+        QMessageBox.information(self, "Detector powers", text)
+    
+    def open_layout(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open layout", "", LAYOUT_FILE_FILTER)
+        if path:
+            self.load_layout_file(path)
+    
+    def load_layout_file(self, path):
+        # Read into a scratch model first, so a failed Open leaves the current
+        # layout, its file and its journal untouched.
+        try:
+            loaded = load_layout(path)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.warning(self, "Open layout", f"Could not open {path}:\n{e}")
+            return
+        self.detach_journal()
+        with self.history.suspended(), self.model.batch():
+            self.model.clear()
+            for record in snapshot_records(loaded):
+                apply_record(self.model, record)
+            self.model.reserve_ids(loaded.next_id())
+        self.history.clear()
+        self.attach_journal(path)
+    
+    def save_layout(self):
+        if self.layout_path is None:
+            self.save_layout_as()
+            return
+        if self.journal is not None:
+            # The file plus its journal already hold every edit; the journal
+            # folds itself back into the file in the background.
+            self.journal.flush()
+            return
+        self.write_layout_file(self.layout_path)
+    
+    def save_layout_as(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save layout", "", LAYOUT_FILE_FILTER)
+        if not path:
+            return
+        if not path.endswith((LAYOUT_EXTENSION, LAYOUT_EXTENSION + ".gz")):
+            path += LAYOUT_EXTENSION
+        self.write_layout_file(path)
+    
+    def write_layout_file(self, path):
+        self.detach_journal()
+        save_layout(self.model, path)
+        self.attach_journal(path)
+    
+    def attach_journal(self, path):
+        # After a full save/open, edits are appended to <path>.journal by autosave().
+        self.layout_path = path
+        self.journal = LayoutJournal(self.model, path)
+        self.autosave_timer.start()
+        self.setWindowTitle(f"Optical Layout Editor - {path}")
+    
+    def detach_journal(self):
+        self.autosave_timer.stop()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+    
+    def autosave(self):
+        if self.journal is not None:
+            self.journal.flush()
+    
+    def closeEvent(self, event):
+        self.detach_journal()
+        super().closeEvent(event)
+    
+    def on_model_changed(self, event, obj_id):
+        if not self.netlist_timer.isActive():
+            self.netlist_timer.start()
+    
+    @profiled("netlist.update")
+    def update_netlist(self):
+        text = self.netlist_compiler.compile()
+        if text != self.netlist_view.toPlainText():
+            scroll = self.netlist_view.verticalScrollBar().value()
+            self.netlist_view.setPlainText(text)
+            self.netlist_view.verticalScrollBar().setValue(scroll)
     
     def pick_component(self, comp_name):
         self.current_comp_to_place = comp_name
@@ -509,28 +1361,12 @@ class OpticalSetupGUI(QMainWindow):
             return f"{comp_name.capitalize()} {count}"
     
     def get_component_display_label(self, comp):
-        label = comp.component_label if comp.component_label else comp.comp_type
-        changed = []
-        for key, value in comp.properties.items():
-            if key in ("name", "angle"):
-                continue
-            changed.append(f"{key}={value}")
-        if changed:
-            label += " (" + ", ".join(changed) + ")"
-        return label
+        return display_label(comp.component_label, comp.comp_type, comp.properties)
     
+    @profiled("details.update")
     def update_connection_details(self):
-        self.connection_list.clear()
-        for item in self.scene.items():
-            if isinstance(item, ConnectionLine):
-                portA = item.portA
-                portB = item.portB
-                compA = portA.parent_component
-                compB = portB.parent_component
-                labelA = self.get_component_display_label(compA)
-                labelB = self.get_component_display_label(compB)
-                connection_text = f"{labelA} {portA.port_name} - connected to {labelB} {portB.port_name}"
-                self.connection_list.addItem(connection_text)
+        # The list follows model events on its own; this forces a full rebuild.
+        self.connection_model.reset()
 
 ##############################################################################
 #                              Main Application                            #
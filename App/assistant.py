@@ -0,0 +1,324 @@
+import os
+import time
+import threading
+
+from PyQt5.QtWidgets import (
+    QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QLabel, QLineEdit, QPlainTextEdit
+)
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+
+from profiling import PROFILER
+from cache import JsonCache
+from assistant_context import LayoutContext, response_key, conversation_digest, replayed_exchanges
+
+ASSISTANT_ID = "asst_kgr19shqp0uwRR3rkmW1EfeV"
+ASSISTANT_INSTRUCTIONS = "Please address the user as Jane Doe. The user has a premium account."
+# Per-request limit. A watchdog closes the stream when it runs out, so a
+# stalled stream cannot hold the request open past it.
+REQUEST_TIMEOUT_S = 120.0
+# The openai import and thread creation start this long after the widget is first shown.
+WARMUP_DELAY_MS = 250
+# Answers kept on disk, keyed by prompt and layout; OPTICSGPT_ASSISTANT_CACHE=0 turns this off.
+RESPONSE_CACHE_ENTRIES = 256
+
+##############################################################################
+#                 Lazily Created Client and Conversation Thread              #
+##############################################################################
+class AssistantSession:
+    # Nothing is imported or sent over the network until client() or
+    # ensure_thread() is first called, normally from a worker thread.
+    def __init__(self, base_url=None, api_key=None):
+        self.base_url = base_url or os.environ.get("OPENAI_BASE_URL")
+        self.api_key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY", "")
+        self._client = None
+        self._thread_id = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from openai import OpenAI
+                self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+            return self._client
+
+    def ensure_thread(self):
+        # Returns (thread_id, created) where created is True only for the caller that made it.
+        client = self.client()
+        with self._lock:
+            if self._thread_id is not None:
+                return self._thread_id, False
+            self._thread_id = client.beta.threads.create().id
+            return self._thread_id, True
+
+    def is_ready(self):
+        return self._thread_id is not None
+
+class AssistantConnect(QThread):
+    # Background warm-up: import openai and create the conversation thread.
+    ready = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, session, parent=None):
+        super().__init__(parent)
+        self.session = session
+
+    def run(self):
+        try:
+            thread_id, created = self.session.ensure_thread()
+            if created:
+                self.ready.emit(thread_id)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+##############################################################################
+#                   Background Assistant Request (streaming)                 #
+##############################################################################
+class AssistantRequest(QThread):
+    # Posts one user message and streams the run's text deltas back to the
+    # GUI thread. cancel() stops reading, closes the stream and cancels the
+    # run server-side; running out of time does the same.
+    connected = pyqtSignal(str, bool)
+    delta = pyqtSignal(str)
+    completed = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, session, user_text, assistant_id=ASSISTANT_ID,
+                 instructions=ASSISTANT_INSTRUCTIONS, timeout=REQUEST_TIMEOUT_S, parent=None):
+        super().__init__(parent)
+        self.session = session
+        self.thread_id = None
+        self.user_text = user_text
+        self.assistant_id = assistant_id
+        self.instructions = instructions
+        self.timeout = timeout
+        self._cancelled = threading.Event()
+        self._timed_out = threading.Event()
+        self._stream = None
+        self.run_id = None
+
+    def cancel(self):
+        self._cancelled.set()
+        self._closeStream()
+
+    def _expire(self):
+        self._timed_out.set()
+        self._closeStream()
+
+    def _stopped(self):
+        return self._cancelled.is_set() or self._timed_out.is_set()
+
+    def _closeStream(self):
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()  # unblocks the worker if it is waiting on the socket
+            except Exception:
+                pass
+
+    def _client(self, deadline):
+        # Each HTTP call may only use the time left before the deadline.
+        return self.session.client().with_options(timeout=max(deadline - time.monotonic(), 0.1))
+
+    def run(self):
+        deadline = time.monotonic() + self.timeout
+        watchdog = threading.Timer(self.timeout, self._expire)
+        watchdog.daemon = True
+        watchdog.start()
+        parts = []
+        status = None
+        try:
+            self.thread_id, created = self.session.ensure_thread()
+            self.connected.emit(self.thread_id, created)
+            self._client(deadline).beta.threads.messages.create(
+                thread_id=self.thread_id,
+                role="user",
+                content=self.user_text
+            )
+            with self._client(deadline).beta.threads.runs.stream(
+                thread_id=self.thread_id,
+                assistant_id=self.assistant_id,
+                instructions=self.instructions
+            ) as stream:
+                self._stream = stream
+                if self._stopped():
+                    self._closeStream()  # stopped before the stream was there to close
+                for event in stream:
+                    if self._stopped():
+                        break
+                    if event.event == "thread.run.created":
+                        self.run_id = event.data.id
+                    elif event.event == "thread.message.delta":
+                        for block in event.data.delta.content or []:
+                            if block.type == "text" and block.text is not None and block.text.value:
+                                parts.append(block.text.value)
+                                self.delta.emit(block.text.value)
+                    elif event.event.startswith("thread.run.") and event.event != "thread.run.created":
+                        status = event.data.status
+        except Exception as e:
+            if not self._stopped():
+                self.failed.emit("Error: " + str(e))
+                return
+        finally:
+            watchdog.cancel()
+            self._stream = None
+        if self._stopped():
+            self._cancelRun()
+            self.failed.emit("Cancelled." if self._cancelled.is_set() else "Timed out.")
+        elif status not in (None, "completed"):
+            self.failed.emit("Run did not complete: " + status)
+        else:
+            text = "".join(parts)
+            self.completed.emit(text if text else "No response received.")
+
+    def _cancelRun(self):
+        if self.run_id is None:
+            return
+        try:
+            self.session.client().with_options(timeout=10.0).beta.threads.runs.cancel(
+                self.run_id, thread_id=self.thread_id
+            )
+        except Exception:
+            pass  # the run may already have finished
+
+##############################################################################
+#                      Assistant Widget (OpenAI Assistant API)             #
+##############################################################################
+class AssistantWidget(QWidget):
+    # base_url (or OPENAI_BASE_URL) points the client at a local stand-in server.
+    # Once attach_layout() is called, messages carry the layout as netlist
+    # lines (in full, then as diffs) and answers are memoized per prompt, layout
+    # and conversation so far.
+    def __init__(self, parent=None, base_url=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        title = QLabel("Assistant")
+        layout.addWidget(title)
+        self.conversation = QPlainTextEdit()
+        self.conversation.setReadOnly(True)
+        layout.addWidget(self.conversation)
+        h_layout = QHBoxLayout()
+        self.input_line = QLineEdit()
+        h_layout.addWidget(self.input_line)
+        self.send_button = QPushButton("Send")
+        h_layout.addWidget(self.send_button)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        h_layout.addWidget(self.cancel_button)
+        layout.addLayout(h_layout)
+        self.send_button.clicked.connect(self.send_message)
+        self.input_line.returnPressed.connect(self.send_message)
+        self.cancel_button.clicked.connect(self.cancel_request)
+        self.request = None
+        self._received = False
+        self._request_started = None
+        self._answering = False
+        self.session = AssistantSession(base_url=base_url)
+        self.assistant_id = ASSISTANT_ID
+        self.connector = None
+        self._warmup_scheduled = False
+        self.layout_context = None
+        self.response_cache = (JsonCache("assistant", RESPONSE_CACHE_ENTRIES)
+                               if os.environ.get("OPTICSGPT_ASSISTANT_CACHE", "1") != "0" else None)
+        self._pending = None  # (cache key, cache entry, layout lines) of the request in flight
+        self.exchanges = []   # (prompt, answer) pairs of this conversation
+        self._unsent = []     # exchanges answered from the cache that the thread has not seen
+    def attach_layout(self, compiler):
+        self.layout_context = LayoutContext(compiler)
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._warmup_scheduled:
+            self._warmup_scheduled = True
+            QTimer.singleShot(WARMUP_DELAY_MS, self.warm_up)
+    def warm_up(self):
+        # Connect in the background; a failure (e.g. offline) is reported and
+        # the next send_message() tries again.
+        if self.session.is_ready() or self.connector is not None:
+            return
+        self.connector = AssistantConnect(self.session, self)
+        self.connector.ready.connect(self.on_connected)
+        self.connector.failed.connect(self.on_connect_failed)
+        self.connector.finished.connect(self.on_connector_finished)
+        self.connector.start()
+    def on_connected(self, thread_id):
+        self.conversation.appendPlainText("Assistant thread created. Thread ID: " + thread_id)
+    def on_connect_failed(self, message):
+        self.conversation.appendPlainText("Assistant unavailable: " + message)
+    def on_connector_finished(self):
+        self.connector.deleteLater()
+        self.connector = None
+    def send_message(self):
+        user_text = self.input_line.text().strip()
+        if not user_text or self.request is not None:
+            return
+        self.conversation.appendPlainText("User: " + user_text)
+        self.input_line.clear()
+        lines, digest = self.layout_context.snapshot() if self.layout_context is not None else ([], "")
+        key = response_key(user_text, digest, conversation_digest(self.exchanges),
+                           self.assistant_id, self.session.base_url or "")
+        cached = self.response_cache.get(key) if self.response_cache is not None else None
+        if cached is not None:
+            PROFILER.count("assistant.cache_hit")
+            self.conversation.appendPlainText("Assistant (cached): " + cached["response"])
+            self.exchanges.append((user_text, cached["response"]))
+            self._unsent.append((user_text, cached["response"]))
+            return
+        content = user_text
+        if self.layout_context is not None:
+            content = self.layout_context.message(user_text, lines)
+        if self._unsent:
+            content = replayed_exchanges(self._unsent) + content
+        self._pending = (key, {"prompt": user_text, "layout": digest}, lines)
+        self.request = AssistantRequest(self.session, content,
+                                        assistant_id=self.assistant_id, parent=self)
+        self._received = False
+        self._answering = False
+        self._request_started = PROFILER.start()
+        self.request.connected.connect(self.on_request_connected)
+        self.request.delta.connect(self.on_delta)
+        self.request.completed.connect(self.on_completed)
+        self.request.failed.connect(self.on_failed)
+        self.request.finished.connect(self.on_request_finished)
+        self.send_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.request.start()
+    def cancel_request(self):
+        if self.request is not None:
+            self.request.cancel()
+    def append_partial(self, text):
+        self.conversation.moveCursor(QTextCursor.End)
+        self.conversation.insertPlainText(text)
+        self.conversation.ensureCursorVisible()
+    def on_request_connected(self, thread_id, created):
+        if created:
+            self.on_connected(thread_id)
+        self.conversation.appendPlainText("Assistant: ")
+        self._answering = True
+    def on_delta(self, text):
+        if not self._received:
+            PROFILER.finish("assistant.first_delta", self._request_started)
+        self._received = True
+        self.append_partial(text)
+    def on_completed(self, text):
+        if not self._received:
+            self.append_partial(text)  # e.g. "No response received."
+            return
+        key, entry, lines = self._pending
+        if self.layout_context is not None:
+            self.layout_context.mark_sent(lines)  # the next message only needs the diff
+        self._unsent = []
+        self.exchanges.append((entry["prompt"], text))
+        if self.response_cache is not None:
+            self.response_cache.put(key, dict(entry, response=text))
+    def on_failed(self, message):
+        if not self._answering:
+            self.conversation.appendPlainText("Assistant: " + message)
+        else:
+            self.append_partial(("\n" if self._received else "") + message)
+    def on_request_finished(self):
+        PROFILER.finish("assistant.round_trip", self._request_started)
+        self.request.deleteLater()
+        self.request = None
+        self._pending = None
+        self.send_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
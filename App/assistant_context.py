@@ -0,0 +1,86 @@
+import json
+import hashlib
+
+##############################################################################
+#                 Layout Context for Assistant Messages                      #
+##############################################################################
+# The layout is described by its Finesse netlist, which the editor already
+# keeps up to date incrementally. The first message of a conversation
+# carries the whole netlist; later ones carry only the lines that changed.
+# A cached answer is only reused for the same prompt, layout and
+# conversation so far.
+CONTEXT_MAX_LINES = 400  # netlist or diff lines per message; the rest is summarised
+# Bump when the message format changes so cached responses are not reused.
+CONTEXT_VERSION = 2
+
+def netlist_lines(text):
+    return [line for line in text.splitlines() if line and not line.startswith("# Generated")]
+
+def layout_hash(lines):
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+def conversation_digest(exchanges):
+    # exchanges: the (prompt, answer) pairs of the conversation so far.
+    return hashlib.sha256(json.dumps(exchanges).encode("utf-8")).hexdigest()
+
+def replayed_exchanges(exchanges):
+    # Answers served from the cache never reached the conversation thread;
+    # the next message that is sent carries them so follow-ups keep their context.
+    lines = ["Earlier in this conversation (answered without you):"]
+    for prompt, answer in exchanges:
+        lines += [f"User: {prompt}", f"Assistant: {answer}"]
+    return "\n".join(lines) + "\n\n"
+
+def response_key(prompt, layout_digest, *scope):
+    # scope: whatever else decides the answer (assistant id, server URL, ...).
+    payload = "\x00".join([str(CONTEXT_VERSION), prompt, layout_digest] + [str(s) for s in scope])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _clipped(lines, limit=CONTEXT_MAX_LINES):
+    if len(lines) <= limit:
+        return lines
+    return lines[:limit] + [f"... ({len(lines) - limit} more lines not shown)"]
+
+class LayoutContext:
+    """Builds the layout part of each assistant message from a NetlistCompiler.
+
+    snapshot() is cheap when nothing changed (the compiler returns its
+    cached text). message() wraps the user's text with the full netlist or
+    a diff against the last snapshot passed to mark_sent(); reset() forgets
+    that baseline, e.g. when a new conversation thread starts.
+    """
+    def __init__(self, compiler):
+        self.compiler = compiler
+        self._sent = None  # lines the assistant has seen, in order
+
+    def snapshot(self):
+        lines = netlist_lines(self.compiler.compile())
+        return lines, layout_hash(lines)
+
+    def reset(self):
+        self._sent = None
+
+    def mark_sent(self, lines):
+        self._sent = lines
+
+    def diff(self, lines):
+        # (removed, added), each in netlist order.
+        old = dict.fromkeys(self._sent or ())
+        new = dict.fromkeys(lines)
+        return [line for line in old if line not in new], [line for line in new if line not in old]
+
+    def message(self, user_text, lines):
+        if self._sent is None:
+            if not lines:
+                return user_text
+            return ("Current optical layout (Finesse netlist):\n"
+                    + "\n".join(_clipped(lines)) + "\n\n" + user_text)
+        removed, added = self.diff(lines)
+        if not removed and not added:
+            return user_text
+        changes = [f"- {line}" for line in removed] + [f"+ {line}" for line in added]
+        if len(changes) >= len(lines):
+            return ("The optical layout is now (Finesse netlist):\n"
+                    + "\n".join(_clipped(lines)) + "\n\n" + user_text)
+        return ("Layout changes since my last message (netlist lines, - removed, + added):\n"
+                + "\n".join(_clipped(changes)) + "\n\n" + user_text)
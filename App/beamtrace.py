@@ -0,0 +1,302 @@
+import math
+
+import numpy as np
+
+from model import (
+    COUPLINGS, COMPONENT_ADDED, COMPONENT_REMOVED, COMPONENT_CHANGED,
+    CONNECTION_ADDED, CONNECTION_REMOVED, CONNECTION_CHANGED
+)
+from netlist import finesse_names
+from solver import WAVELENGTH, float_property
+
+##############################################################################
+#                 Gaussian Beam Tracing (ABCD / q-parameter)                 #
+##############################################################################
+# Beams are traced from every laser along the same port couplings the
+# carrier solver uses. Every root-to-leaf walk is a path: a list of ABCD
+# elements (spaces, lenses, curved reflections). Cumulative transfer
+# matrices for a path are built with a batched prefix scan over stacked 2x2
+# matrices, for the x (tangential) and y (sagittal) planes together.
+DEFAULT_WAIST = 1e-3  # used for lasers without a w0 property
+# Ports on the side Rc is measured from (Finesse: reflection there sees +Rc).
+FRONT_PORTS = {"mirror": ("p1",), "BS": ("p1", "p2"), "beamsplitter_old": ("p1", "p2")}
+# Linear cavities end on optics that retro-reflect.
+CAVITY_END_TYPES = ("mirror",)
+
+def space_matrix(length):
+    return np.array([[1.0, length], [0.0, 1.0]])
+
+def lens_matrix(focal_length):
+    return np.array([[1.0, 0.0], [-1.0 / focal_length if focal_length else 0.0, 1.0]])
+
+def prefix_products(mats):
+    # out[k] = mats[k] @ mats[k-1] @ ... @ mats[0] for mats shaped (n, ..., 2, 2),
+    # in log2(n) batched matmul steps (Hillis-Steele scan).
+    out = np.array(mats, dtype=float)
+    step = 1
+    while step < len(out):
+        out[step:] = np.matmul(out[step:], out[:-step])
+        step *= 2
+    return out
+
+def coupling_kind(comp_type, in_port, out_port):
+    for src, dst, kind in COUPLINGS.get(comp_type, []):
+        if src == in_port and dst == out_port:
+            return kind
+    return None
+
+def apply_abcd(m, q):
+    return (m[..., 0, 0] * q + m[..., 0, 1]) / (m[..., 1, 0] * q + m[..., 1, 1])
+
+def beam_size(q, wavelength=WAVELENGTH):
+    return np.sqrt(-wavelength / (np.pi * np.imag(1.0 / np.asarray(q))))
+
+def waist_size(q, wavelength=WAVELENGTH):
+    return np.sqrt(np.imag(q) * wavelength / np.pi)
+
+def q_from_waist(w0, z=0.0, wavelength=WAVELENGTH):
+    return z + 1j * np.pi * w0 ** 2 / wavelength
+
+class TracePath:
+    __slots__ = ("root", "elements", "stops", "key", "cumulative")
+    def __init__(self, root, elements, stops):
+        self.root = root            # laser component id
+        self.elements = elements    # [("space", conn_id) | ("comp", comp_id, in_port, out_port)]
+        self.stops = stops          # (port id, "i"/"o") reached after each element
+        self.key = None
+        self.cumulative = None
+
+class CavityMode:
+    def __init__(self, mirror_a, mirror_b, round_trip, q, wavelength):
+        self.mirrors = (mirror_a, mirror_b)  # (component id, port id) at each end
+        self.round_trip = round_trip         # (2, 2, 2): x and y planes
+        self.stable = q is not None
+        self.q = q                            # (qx, qy) leaving mirror_a, or None if unstable
+        self.wavelength = wavelength
+
+    def waist(self):
+        return None if self.q is None else waist_size(self.q, self.wavelength)
+
+    def waist_distance(self):
+        # Distance from mirror_a towards mirror_b at which the waist sits.
+        return None if self.q is None else -np.real(self.q)
+
+class BeamTracer:
+    # Paths are re-walked when connectivity changes, but cumulative matrices
+    # are cached per path and keyed by the revisions of what lies on it, so
+    # editing one lens only recomputes the paths through that lens.
+    def __init__(self, model, wavelength=WAVELENGTH):
+        self.model = model
+        self.wavelength = wavelength
+        self._paths = None
+        self._matrix_cache = {}
+        self._lengths = {}
+        self.recomputed_paths = 0
+        model.subscribe(self.onModelEvent)
+
+    def close(self):
+        self.model.unsubscribe(self.onModelEvent)
+
+    def onModelEvent(self, event, obj_id):
+        if event in (COMPONENT_ADDED, COMPONENT_REMOVED, CONNECTION_ADDED, CONNECTION_REMOVED):
+            self._paths = None
+        elif event == CONNECTION_CHANGED:
+            self._lengths[obj_id] = self._lengths.get(obj_id, 0) + 1
+        # COMPONENT_CHANGED bumps comp.rev, which is part of each path key.
+
+    # -- element matrices --------------------------------------------------
+    def element_matrix(self, element):
+        # (2, 2, 2): tangential (x) and sagittal (y) planes.
+        if element[0] == "space":
+            m = space_matrix(self.model.connections[element[1]].length)
+            return np.stack([m, m])
+        _, comp_id, in_port, out_port = element
+        comp = self.model.components[comp_id]
+        if comp.comp_type == "lens":
+            m = lens_matrix(float_property(comp, "f", math.inf))
+            return np.stack([m, m])
+        if coupling_kind(comp.comp_type, in_port, out_port) in ("r+", "r-"):
+            return self.reflection_matrix(comp, in_port)
+        return np.stack([np.eye(2), np.eye(2)])  # thin optic in transmission
+
+    def reflection_matrix(self, comp, port_name):
+        rc = float_property(comp, "Rc", math.inf)
+        side = 1.0 if port_name in FRONT_PORTS.get(comp.comp_type, ("p1",)) else -1.0
+        alpha = math.radians(float_property(comp, "alpha"))
+        mats = []
+        for effective in (rc * math.cos(alpha), rc / math.cos(alpha) if math.cos(alpha) else math.inf):
+            c = 0.0 if not math.isfinite(effective) or effective == 0 else -2.0 * side / effective
+            mats.append(np.array([[1.0, 0.0], [c, 1.0]]))
+        return np.stack(mats)
+
+    # -- path discovery ----------------------------------------------------
+    def _walk(self):
+        model = self.model
+        paths = []
+        visited = set()
+        for laser in model.components.values():
+            if laser.comp_type != "laser" or "p1" not in laser.ports:
+                continue
+            start = laser.ports["p1"]
+            stack = [(start, [], [])]
+            visited.add((start, "o"))
+            while stack:
+                port_id, elements, stops = stack.pop()
+                extended = False
+                for conn_id in sorted(model.ports[port_id].connection_ids):
+                    peer = model.connections[conn_id].other(port_id)
+                    if (peer, "i") in visited:
+                        continue
+                    visited.add((peer, "i"))
+                    extended = True
+                    comp = model.component_of(peer)
+                    in_port = model.ports[peer].name
+                    elements_in = elements + [("space", conn_id)]
+                    stops_in = stops + [(peer, "i")]
+                    continued = False
+                    for src, out_port, _ in COUPLINGS.get(comp.comp_type, []):
+                        out_id = comp.ports[out_port]
+                        if src != in_port or (out_id, "o") in visited:
+                            continue
+                        visited.add((out_id, "o"))
+                        continued = True
+                        stack.append((out_id, elements_in + [("comp", comp.id, in_port, out_port)],
+                                      stops_in + [(out_id, "o")]))
+                    if not continued:
+                        paths.append(TracePath(laser.id, elements_in, stops_in))
+                if not extended and elements:
+                    paths.append(TracePath(laser.id, elements, stops))
+        return paths
+
+    def _path_key(self, path):
+        key = []
+        for element in path.elements:
+            if element[0] == "space":
+                key.append(("s", element[1], self._lengths.get(element[1], 0)))
+            else:
+                key.append(("c", element[1], self.model.components[element[1]].rev, element[2], element[3]))
+        return tuple(key)
+
+    # -- tracing -----------------------------------------------------------
+    def paths(self):
+        if self._paths is None:
+            self._paths = self._walk()
+        return self._paths
+
+    def trace(self):
+        """Return {(port id, "i"/"o"): (qx, qy)} for every port a beam reaches."""
+        self.recomputed_paths = 0
+        beams = {}
+        live_keys = set()
+        lasers = {}
+        for path in self.paths():
+            if not path.elements:
+                continue
+            key = self._path_key(path)
+            live_keys.add(key)
+            cumulative = self._matrix_cache.get(key)
+            if cumulative is None:
+                mats = np.stack([self.element_matrix(e) for e in path.elements])
+                cumulative = prefix_products(mats)
+                self._matrix_cache[key] = cumulative
+                self.recomputed_paths += 1
+            path.cumulative = cumulative
+            q0 = lasers.get(path.root)
+            if q0 is None:
+                laser = self.model.components[path.root]
+                w0 = float_property(laser, "w0", DEFAULT_WAIST) or DEFAULT_WAIST
+                q0 = q_from_waist(w0, float_property(laser, "z"), self.wavelength)
+                lasers[path.root] = q0
+                beams.setdefault((laser.ports["p1"], "o"), (q0, q0))
+            qs = apply_abcd(cumulative, q0)  # (n, 2)
+            for stop, q in zip(path.stops, qs):
+                beams.setdefault(stop, (complex(q[0]), complex(q[1])))
+        for key in list(self._matrix_cache):
+            if key not in live_keys:
+                del self._matrix_cache[key]
+        return beams
+
+    def report(self):
+        # Human-readable beam sizes per port, using Finesse component names.
+        names = finesse_names(self.model)
+        lines = []
+        for (port_id, direction), (qx, qy) in self.trace().items():
+            port = self.model.ports[port_id]
+            wx, wy = beam_size([qx, qy], self.wavelength)
+            lines.append(f"{names[port.component_id]}.{port.name}.{direction}: "
+                         f"w = {wx * 1e3:.4g} / {wy * 1e3:.4g} mm (x/y)")
+        for cavity in self.cavities():
+            (a, pa), (b, pb) = cavity.mirrors
+            label = f"cavity {names[a]}.{self.model.ports[pa].name} <-> {names[b]}.{self.model.ports[pb].name}"
+            if cavity.q is None:
+                lines.append(label + ": unstable")
+            else:
+                w0x, w0y = cavity.waist()
+                zx, zy = cavity.waist_distance()
+                lines.append(f"{label}: waist {w0x * 1e3:.4g} / {w0y * 1e3:.4g} mm "
+                             f"at {zx:.4g} / {zy:.4g} m from {names[a]}")
+        return "\n".join(lines)
+
+    # -- cavities ----------------------------------------------------------
+    def cavities(self):
+        # Linear cavities: two reflecting surfaces that face each other through
+        # spaces and lenses only. Eigenmodes of all cavities are solved at once.
+        model = self.model
+        found = []
+        seen = set()
+        for comp in model.components.values():
+            if comp.comp_type not in CAVITY_END_TYPES:
+                continue
+            for port_name, port_id in comp.ports.items():
+                chain = self._facing(port_id)
+                if chain is None:
+                    continue
+                end_port, elements = chain
+                pair = frozenset((port_id, end_port))
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                far = model.component_of(end_port)
+                forward = [self.element_matrix(e) for e in elements]
+                back = forward[::-1]
+                reflect_far = self.reflection_matrix(far, model.ports[end_port].name)
+                reflect_near = self.reflection_matrix(comp, port_name)
+                mats = np.stack(forward + [reflect_far] + back + [reflect_near])
+                found.append(((comp.id, port_id), (far.id, end_port), prefix_products(mats)[-1]))
+        if not found:
+            return []
+        trips = np.stack([f[2] for f in found])  # (n, 2, 2, 2)
+        A, B, C, D = trips[..., 0, 0], trips[..., 0, 1], trips[..., 1, 0], trips[..., 1, 1]
+        half_trace = 0.5 * (A + D)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # q = ((A - D) + sqrt((A + D)^2 - 4)) / 2C with the root giving Im(q) > 0.
+            root = np.sqrt((A + D) ** 2 - 4 + 0j)
+            q = (A - D + root) / (2 * C)
+            q = np.where(np.imag(q) < 0, (A - D - root) / (2 * C), q)
+        stable = np.all((np.abs(half_trace) < 1) & (C != 0), axis=1)
+        return [CavityMode(a, b, trip, (complex(qq[0]), complex(qq[1])) if ok else None, self.wavelength)
+                for (a, b, trip), qq, ok in zip(found, q, stable)]
+
+    def _facing(self, port_id):
+        # Follow one connection from a reflecting port through lenses until the
+        # next reflecting surface; returns (its port, [elements]) or None.
+        model = self.model
+        elements = []
+        current = port_id
+        for _ in range(len(model.ports)):
+            conns = model.ports[current].connection_ids
+            if len(conns) != 1:
+                return None
+            conn_id = next(iter(conns))
+            peer = model.connections[conn_id].other(current)
+            elements.append(("space", conn_id))
+            comp = model.component_of(peer)
+            in_port = model.ports[peer].name
+            if comp.comp_type in CAVITY_END_TYPES:
+                return peer, elements
+            if comp.comp_type != "lens":
+                return None
+            out_port = "p2" if in_port == "p1" else "p1"
+            elements.append(("comp", comp.id, in_port, out_port))
+            current = comp.ports[out_port]
+        return None
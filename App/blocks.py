@@ -0,0 +1,260 @@
+import math
+
+from model import (
+    LayoutModel, ComponentRecord, BLOCK_PREFIX, PORT_POSITIONS, COMPONENT_PROPERTIES
+)
+
+##############################################################################
+#                 Reusable Blocks (sub-assemblies by reference)              #
+##############################################################################
+# A block definition is stored once in model.blocks. Each instance is a
+# single component of type "block:<name>" whose ports are the block's
+# exposed ports and whose properties hold only what differs per instance:
+# its own "name"/"angle" and overrides keyed "<member>.<property>".
+# Members become real components only when a layout is flattened for
+# simulation or an instance is ungrouped.
+MEMBER_SIZE = 80.0  # footprint of one member on the canvas (pixmaps.ICON_SIZE)
+
+def block_type(name):
+    return BLOCK_PREFIX + name
+
+def is_block_type(comp_type):
+    return comp_type.startswith(BLOCK_PREFIX)
+
+def block_name(comp_type):
+    return comp_type[len(BLOCK_PREFIX):]
+
+def definition_of(model, comp):
+    return model.blocks.get(block_name(comp.comp_type))
+
+def has_instances(model):
+    return bool(model.blocks) and any(is_block_type(comp.comp_type) for comp in model.components.values())
+
+class BlockMember:
+    __slots__ = ("key", "comp_type", "x", "y", "angle", "label", "properties")
+    def __init__(self, key, comp_type, x, y, angle=0.0, label="", properties=None):
+        self.key = key
+        self.comp_type = comp_type
+        self.x = float(x)
+        self.y = float(y)
+        self.angle = float(angle)
+        self.label = label
+        self.properties = dict(properties) if properties else {}
+
+class BlockDefinition:
+    """Members, internal connections and exposed ports of one block.
+
+    Member positions are relative to the block's top-left corner; exposed
+    ports map an instance port name to (member index, member port name).
+    Definitions are never modified once added to a model.
+    """
+    def __init__(self, name, members, connections=(), exposed=None):
+        self.name = name
+        self.members = list(members)
+        self.connections = [tuple(conn) for conn in connections]  # (index a, port a, index b, port b, length)
+        self.exposed = dict(exposed or {})
+        self.index = {member.key: i for i, member in enumerate(self.members)}
+        self.width = max((m.x for m in self.members), default=0.0) + MEMBER_SIZE
+        self.height = max((m.y for m in self.members), default=0.0) + MEMBER_SIZE
+
+    def member_port_position(self, index, port_name):
+        # Position of a member port relative to the block, following the member's rotation.
+        member = self.members[index]
+        nx, ny = PORT_POSITIONS.get(member.comp_type, {}).get(port_name, (0.5, 0.5))
+        cos_a = math.cos(math.radians(member.angle))
+        sin_a = math.sin(math.radians(member.angle))
+        px, py = nx * MEMBER_SIZE, ny * MEMBER_SIZE
+        return member.x + px * cos_a - py * sin_a, member.y + px * sin_a + py * cos_a
+
+    def port_positions(self):
+        # Exposed port -> position normalised to the block's footprint, like PORT_POSITIONS.
+        positions = {}
+        for port_name, (index, member_port) in self.exposed.items():
+            x, y = self.member_port_position(index, member_port)
+            positions[port_name] = (x / self.width, y / self.height)
+        return positions
+
+    def to_record(self):
+        members = [[m.key, m.comp_type, m.x, m.y, m.angle, m.label, dict(m.properties)] for m in self.members]
+        exposed = [[port_name, index, member_port] for port_name, (index, member_port) in self.exposed.items()]
+        return ["B", self.name, members, [list(conn) for conn in self.connections], exposed]
+
+    @classmethod
+    def from_record(cls, record):
+        _, name, members, connections, exposed = record
+        return cls(name, [BlockMember(*member) for member in members], connections,
+                   {port_name: (index, member_port) for port_name, index, member_port in exposed})
+
+def instance_property_defs(definition):
+    # Property definitions for an instance: each member property can be overridden.
+    defs = {"name": COMPONENT_PROPERTIES["mirror"]["name"]}
+    for member in definition.members:
+        for key, prop in COMPONENT_PROPERTIES.get(member.comp_type, {}).items():
+            if key in ("name", "angle", "node"):
+                continue
+            defs[f"{member.key}.{key}"] = dict(prop, label=f"{member.key}: {prop['label']}",
+                                               default=member.properties.get(key, prop.get("default", "")))
+    defs["angle"] = COMPONENT_PROPERTIES["mirror"]["angle"]
+    return defs
+
+def member_records(definition, overrides, prefix):
+    """Transient records for the members of one instance, named <prefix>_<key>.
+
+    Overrides are applied and detector nodes are pointed at the renamed
+    members, so each record can be rendered or copied on its own.
+    """
+    from netlist import DETECTOR_TYPES
+    records = []
+    for index, member in enumerate(definition.members):
+        properties = dict(member.properties)
+        for key, value in overrides.items():
+            owner, _, prop = key.partition(".")
+            if owner == member.key and prop:
+                properties[prop] = value
+        properties["name"] = f"{prefix}_{member.key}"
+        if member.comp_type in DETECTOR_TYPES:
+            properties["node"] = _member_node(definition, index, properties.get("node"), prefix)
+        records.append(ComponentRecord(None, member.comp_type, member.x, member.y, member.angle,
+                                       member.label, properties))
+    return records
+
+def _member_node(definition, index, node, prefix):
+    node = str(node or "").strip()
+    if node:
+        owner, dot, rest = node.partition(".")
+        return f"{prefix}_{owner}{dot}{rest}" if owner in definition.index else node
+    for a, port_a, b, port_b, _ in definition.connections:
+        if index in (a, b):
+            other, other_port = (b, port_b) if a == index else (a, port_a)
+            return f"{prefix}_{definition.members[other].key}.{other_port}.o"
+    return ""
+
+def _add_members(target, definition, inst, prefix):
+    # Adds the members of inst to target around the instance's position and
+    # rotation; returns exposed port name -> new port id.
+    cos_a = math.cos(math.radians(inst.angle))
+    sin_a = math.sin(math.radians(inst.angle))
+    comp_ids = []
+    for member, record in zip(definition.members, member_records(definition, inst.properties, prefix)):
+        x = inst.x + member.x * cos_a - member.y * sin_a
+        y = inst.y + member.x * sin_a + member.y * cos_a
+        comp_ids.append(target.add_component(member.comp_type, x, y, member.angle + inst.angle,
+                                             member.label, record.properties))
+    for a, port_a, b, port_b, length in definition.connections:
+        target.connect(target.port(comp_ids[a], port_a).id, target.port(comp_ids[b], port_b).id, length=length)
+    return {port_name: target.port(comp_ids[index], member_port).id
+            for port_name, (index, member_port) in definition.exposed.items()}
+
+##############################################################################
+#                    Grouping, Ungrouping and Flattening                     #
+##############################################################################
+def group_into_block(model, comp_ids, name):
+    """Replace the given components with an instance of a new block called name.
+
+    Connections among them become internal; every member port without an
+    internal connection is exposed as <member>_<port>, and connections to
+    the rest of the layout are moved onto the instance.
+    """
+    from netlist import base_name
+    if not name or block_type(name) in (comp.comp_type for comp in model.components.values()) \
+            or name in model.blocks:
+        raise ValueError(f"Block name {name!r} is empty or already used")
+    comp_ids = [comp_id for comp_id in comp_ids if not is_block_type(model.components[comp_id].comp_type)]
+    if not comp_ids:
+        raise ValueError("Select at least one component that is not a block")
+    comps = [model.components[comp_id] for comp_id in comp_ids]
+    left = min(comp.x for comp in comps)
+    top = min(comp.y for comp in comps)
+    index = {}
+    members = []
+    for comp in comps:
+        key = base_name(comp)
+        while key in (m.key for m in members):
+            key = f"{key}_{comp.id}"
+        index[comp.id] = len(members)
+        properties = {k: v for k, v in comp.properties.items() if k != "name"}
+        members.append(BlockMember(key, comp.comp_type, comp.x - left, comp.y - top, comp.angle,
+                                   comp.label, properties))
+    connections = []
+    external = []  # (member index, member port, far port id, length)
+    internal_ports = set()
+    for conn_id in sorted(set().union(*(model.component_connections(comp_id) for comp_id in comp_ids))):
+        conn = model.connections[conn_id]
+        port_a, port_b = model.ports[conn.port_a], model.ports[conn.port_b]
+        inside_a, inside_b = port_a.component_id in index, port_b.component_id in index
+        if inside_a and inside_b:
+            connections.append((index[port_a.component_id], port_a.name, index[port_b.component_id], port_b.name,
+                                conn.length))
+            internal_ports.update((conn.port_a, conn.port_b))
+        else:
+            inner, outer = (port_a, port_b) if inside_a else (port_b, port_a)
+            external.append((index[inner.component_id], inner.name, outer.id, conn.length))
+    exposed = {}
+    for comp in comps:
+        for port_name, port_id in comp.ports.items():
+            if port_id not in internal_ports:
+                exposed[f"{members[index[comp.id]].key}_{port_name}"] = (index[comp.id], port_name)
+    by_member_port = {value: port_name for port_name, value in exposed.items()}
+    definition = BlockDefinition(name, members, connections, exposed)
+    model.define_block(definition)
+    for comp_id in comp_ids:
+        model.remove_component(comp_id)
+    inst = model.add_component(block_type(name), left, top, label=name)
+    for member_index, member_port, far_port, length in external:
+        model.connect(model.port(inst, by_member_port[(member_index, member_port)]).id, far_port, length=length)
+    return inst
+
+def explode_instance(model, comp_id):
+    """Replace a block instance with real copies of its members; returns their ids."""
+    from netlist import finesse_names
+    inst = model.components[comp_id]
+    definition = definition_of(model, inst)
+    if definition is None:
+        raise KeyError(f"{inst.comp_type} is not defined")
+    prefix = finesse_names(model)[comp_id]
+    external = []
+    for port_name, port_id in inst.ports.items():
+        for conn_id in model.ports[port_id].connection_ids:
+            conn = model.connections[conn_id]
+            external.append((port_name, conn.other(port_id), conn.length))
+    first_new = model.next_id()
+    model.remove_component(comp_id)
+    port_map = _add_members(model, definition, inst, prefix)
+    for port_name, far_port, length in external:
+        model.connect(port_map[port_name], far_port, length=length)
+    return [new_id for new_id in model.components if new_id >= first_new]
+
+def flatten(model):
+    """The layout with every block instance expanded, for simulation.
+
+    Returns model itself when there are no instances. Otherwise a new
+    LayoutModel where plain components, ports and connections keep their
+    IDs and members get fresh IDs above model.next_id(). Member names
+    match the netlist (<instance name>_<member>).
+    """
+    if not has_instances(model):
+        return model
+    from netlist import finesse_names
+    names = finesse_names(model)
+    flat = LayoutModel()
+    flat.reserve_ids(model.next_id())
+    instances = []
+    for comp in model.components.values():
+        if is_block_type(comp.comp_type):
+            instances.append(comp)
+        else:
+            flat.add_component(comp.comp_type, comp.x, comp.y, comp.angle, comp.label, comp.properties,
+                               comp_id=comp.id, port_ids=comp.ports)
+    member_port = {}
+    for inst in instances:
+        definition = definition_of(model, inst)
+        if definition is None:
+            continue
+        for port_name, port_id in _add_members(flat, definition, inst, names[inst.id]).items():
+            member_port[inst.ports[port_name]] = port_id
+    for conn in model.connections.values():
+        port_a = member_port.get(conn.port_a, conn.port_a)
+        port_b = member_port.get(conn.port_b, conn.port_b)
+        if port_a in flat.ports and port_b in flat.ports:
+            flat.connect(port_a, port_b, conn_id=conn.id, length=conn.length)
+    return flat
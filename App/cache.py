@@ -0,0 +1,67 @@
+import os
+import json
+
+##############################################################################
+#                          On-disk Cache Locations                           #
+##############################################################################
+# Override with OPTICSGPT_CACHE_DIR (e.g. to keep CI caches inside the workspace).
+DEFAULT_CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "opticsgpt")
+
+def cache_root():
+    # Read on every call, so setting OPTICSGPT_CACHE_DIR after import (tests) takes effect.
+    return os.environ.get("OPTICSGPT_CACHE_DIR") or DEFAULT_CACHE_ROOT
+
+def cache_path(*parts):
+    """Return a directory under the cache root, creating it if needed."""
+    path = os.path.join(cache_root(), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+##############################################################################
+#                     Small LRU Cache of JSON Values on Disk                 #
+##############################################################################
+class JsonCache:
+    """One JSON file per key under cache_path(name), at most max_entries files.
+
+    A hit refreshes the file's modification time; put() evicts the least
+    recently used files once the limit is passed. Keys should be hex digests.
+    """
+    def __init__(self, name, max_entries=256):
+        self.directory = cache_path(name)
+        self.max_entries = max_entries
+
+    def _file(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        path = self._file(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def put(self, key, value):
+        path = self._file(key)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(path + ".tmp", path)
+        self._evict()
+
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass  # already evicted by another instance
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                os.remove(entry.path)
@@ -0,0 +1,128 @@
+"""Headless batch tool for saved layouts; never imports Qt.
+
+    python App/cli.py netlist layouts/ -o build/netlists
+    python App/cli.py connections bench.ogl
+    python App/cli.py evaluate layouts/*.ogl --workers 8 > powers.jsonl
+    python App/cli.py evaluate bench.ogl --maxtem 4
+
+Directories expand to the layout files below them. Results stream out in
+input order as the worker pool finishes them; the exit status is 1 if any
+file failed.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from model import connection_text
+from layout_io import load_layout, LAYOUT_EXTENSION
+from netlist import NetlistCompiler
+
+##############################################################################
+#                       Per-file Jobs (run in worker processes)              #
+##############################################################################
+# Output file suffix for each export kind.
+EXPORT_SUFFIXES = {"netlist": ".kat", "connections": ".txt"}
+
+def connection_report(model):
+    # The Connection Details list: one line per connection, in model order.
+    return "\n".join(connection_text(model, conn_id) for conn_id in model.connections)
+
+def export_layout(kind, path):
+    model = load_layout(path)
+    if kind == "netlist":
+        return NetlistCompiler(model).compile()
+    return connection_report(model) + "\n" if model.connections else ""
+
+def evaluate_layout(path, maxtem=None):
+    from blocks import flatten
+    from solver import CarrierSolver
+    t0 = time.perf_counter()
+    model = load_layout(path)
+    powers = CarrierSolver(flatten(model), maxtem=maxtem).solve().detector_powers()
+    return {
+        "components": len(model.components),
+        "connections": len(model.connections),
+        "detectors": powers,
+        "seconds": time.perf_counter() - t0,
+    }
+
+def _job(task):
+    # (kind, path, maxtem) -> (path, result, error); errors are returned, not
+    # raised, so one bad file does not stop the batch (or break pool.map).
+    kind, path, maxtem = task
+    try:
+        result = evaluate_layout(path, maxtem) if kind == "evaluate" else export_layout(kind, path)
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+    return path, result, None
+
+def run_jobs(kind, paths, workers=None, maxtem=None):
+    """Yield (path, result, error) for each path, in order, as they complete."""
+    tasks = [(kind, path, maxtem) for path in paths]
+    if workers == 1 or len(tasks) < 2:
+        yield from map(_job, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_job, tasks)
+
+##############################################################################
+#                                Command Line                                #
+##############################################################################
+def layout_paths(arguments):
+    paths = []
+    for argument in arguments:
+        if os.path.isdir(argument):
+            for root, dirs, files in os.walk(argument):
+                dirs.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.endswith((LAYOUT_EXTENSION, LAYOUT_EXTENSION + ".gz")))
+        else:
+            paths.append(argument)
+    return paths
+
+def output_name(path, kind):
+    name = os.path.basename(path)
+    for extension in (LAYOUT_EXTENSION + ".gz", LAYOUT_EXTENSION):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+            break
+    return name + EXPORT_SUFFIXES[kind]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("netlist", "connections", "evaluate"),
+                        help="export Finesse netlists, export connection reports, or solve detector powers")
+    parser.add_argument("layouts", nargs="+", help="layout files or directories")
+    parser.add_argument("-o", "--output-dir",
+                        help="write one file per layout here instead of to stdout (exports only)")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--maxtem", type=int,
+                        help="solve with Hermite-Gauss modes up to this order (evaluate only; default: plane waves)")
+    args = parser.parse_args(argv)
+    paths = layout_paths(args.layouts)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    failed = 0
+    for path, result, error in run_jobs(args.command, paths, args.workers, args.maxtem):
+        if error is not None:
+            failed += 1
+            if args.command == "evaluate":
+                print(json.dumps({"path": path, "error": error}), flush=True)
+            print(f"{path}: {error}", file=sys.stderr, flush=True)
+        elif args.command == "evaluate":
+            print(json.dumps(dict(path=path, **result)), flush=True)
+        elif args.output_dir:
+            with open(os.path.join(args.output_dir, output_name(path, args.command)), "w", encoding="utf-8") as f:
+                f.write(result)
+        else:
+            if len(paths) > 1:
+                print(f"==> {path} <==")
+            sys.stdout.write(result)
+            sys.stdout.flush()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+import itertools
+from collections import deque
+
+from model import (
+    COUPLINGS, COMPONENT_ADDED, COMPONENT_REMOVED, COMPONENT_CHANGED,
+    CONNECTION_ADDED, CONNECTION_REMOVED
+)
+from netlist import DETECTOR_TYPES, finesse_names
+
+REPORT_LIMIT = 50  # entries listed per section of report()
+
+##############################################################################
+#                   Detector Node References ("M1.p2.o")                     #
+##############################################################################
+def resolve_node(node, components_by_name):
+    # "M1.p2" or "M1.p2.o" -> (port id, "o"/"i"); ValueError says what is wrong.
+    parts = str(node).strip().split(".")
+    if len(parts) < 2 or len(parts) > 3 or not all(parts):
+        raise ValueError(f"node '{node}' is not of the form name.port[.i|o]")
+    owner = components_by_name.get(parts[0])
+    if owner is None:
+        raise ValueError(f"node '{node}' names no component")
+    if parts[1] not in owner.ports:
+        raise ValueError(f"{parts[0]} has no port {parts[1]}")
+    direction = parts[2] if len(parts) == 3 else "o"
+    if direction not in ("i", "o"):
+        raise ValueError(f"node '{node}' direction must be i or o")
+    return owner.ports[parts[1]], direction
+
+##############################################################################
+#                 Incremental Connectivity Index over the Model              #
+##############################################################################
+class ConnectivityIndex:
+    """Graph queries over a LayoutModel, kept current from its events.
+
+    Components connected through any chain of connections form a cluster.
+    Clusters are merged on connect (smaller into larger) and split on
+    disconnect by searching outward from both ends in lockstep, so each
+    edit costs at most the size of the smaller side.
+
+    Cavities are searched for lazily. Removing a connection only re-searches
+    the cavity it ran through; adding one re-searches its cluster unless
+    both ends already sat in the same cavity.
+    """
+    def __init__(self, model):
+        self.model = model
+        self._ports_of = {}    # component id -> its port ids
+        self._conn_ends = {}   # connection id -> (port a, port b, component a, component b)
+        self._adj = {}         # component id -> {neighbour component id: connection count}
+        self._cluster_of = {}  # component id -> cluster id
+        self._members = {}     # cluster id -> set of component ids
+        self._cavities = {}    # cavity id -> frozenset of field nodes (port id, "i"/"o")
+        self._cavity_of = {}   # field node -> cavity id
+        self._added = []       # connections made since cavities were last found: (port a, port b, component a)
+        self._removed = []     # connections removed since then: (port a, port b)
+        self._searched = False
+        self._cavity_ids = itertools.count(1)
+        self._dangling = set()
+        self._detector_issues = None
+        self._cluster_ids = itertools.count(1)
+        self.rebuild()
+        model.subscribe(self.onModelEvent)
+
+    def close(self):
+        self.model.unsubscribe(self.onModelEvent)
+
+    def rebuild(self):
+        for mapping in (self._ports_of, self._conn_ends, self._adj, self._cluster_of,
+                        self._members, self._cavities, self._cavity_of):
+            mapping.clear()
+        del self._added[:], self._removed[:]
+        self._searched = False
+        self._dangling.clear()
+        self._detector_issues = None
+        for comp_id in self.model.components:
+            self._add_component(comp_id)
+        for conn_id in self.model.connections:
+            self._add_connection(conn_id)
+
+    def onModelEvent(self, event, obj_id):
+        if event == COMPONENT_ADDED:
+            self._add_component(obj_id)
+            self._detector_issues = None
+        elif event == COMPONENT_REMOVED:
+            self._remove_component(obj_id)
+            self._detector_issues = None
+        elif event == COMPONENT_CHANGED:
+            self._detector_issues = None  # names and node references may have changed
+        elif event == CONNECTION_ADDED:
+            self._add_connection(obj_id)
+            self._detector_issues = None
+        elif event == CONNECTION_REMOVED:
+            self._remove_connection(obj_id)
+            self._detector_issues = None
+
+    # -- maintenance -------------------------------------------------------
+    def _add_component(self, comp_id):
+        comp = self.model.components[comp_id]
+        self._ports_of[comp_id] = tuple(comp.ports.values())
+        for port_id in self._ports_of[comp_id]:
+            if not self.model.ports[port_id].connection_ids:
+                self._dangling.add(port_id)
+        self._adj[comp_id] = {}
+        cluster = next(self._cluster_ids)
+        self._cluster_of[comp_id] = cluster
+        self._members[cluster] = {comp_id}
+
+    def _remove_component(self, comp_id):
+        # Its connections were removed (with their own events) beforehand.
+        for port_id in self._ports_of.pop(comp_id, ()):
+            self._dangling.discard(port_id)
+        self._adj.pop(comp_id, None)
+        cluster = self._cluster_of.pop(comp_id, None)
+        if cluster is None:
+            return
+        members = self._members[cluster]
+        members.discard(comp_id)
+        if not members:
+            del self._members[cluster]
+
+    def _add_connection(self, conn_id):
+        conn = self.model.connections[conn_id]
+        comp_a = self.model.ports[conn.port_a].component_id
+        comp_b = self.model.ports[conn.port_b].component_id
+        self._conn_ends[conn_id] = (conn.port_a, conn.port_b, comp_a, comp_b)
+        self._dangling.discard(conn.port_a)
+        self._dangling.discard(conn.port_b)
+        if comp_a != comp_b:
+            self._adj[comp_a][comp_b] = self._adj[comp_a].get(comp_b, 0) + 1
+            self._adj[comp_b][comp_a] = self._adj[comp_b].get(comp_a, 0) + 1
+        self._merge(self._cluster_of[comp_a], self._cluster_of[comp_b])
+        if self._searched:
+            self._added.append((conn.port_a, conn.port_b, comp_a))
+
+    def _remove_connection(self, conn_id):
+        port_a, port_b, comp_a, comp_b = self._conn_ends.pop(conn_id)
+        for port_id in (port_a, port_b):
+            port = self.model.ports.get(port_id)
+            if port is not None and not port.connection_ids:
+                self._dangling.add(port_id)
+        if self._searched:
+            self._removed.append((port_a, port_b))
+        if comp_a == comp_b:
+            return
+        for comp, other in ((comp_a, comp_b), (comp_b, comp_a)):
+            count = self._adj[comp][other] - 1
+            if count:
+                self._adj[comp][other] = count
+            else:
+                del self._adj[comp][other]
+        if comp_b not in self._adj[comp_a]:
+            self._split(comp_a, comp_b)
+
+    def _merge(self, cluster_a, cluster_b):
+        if cluster_a == cluster_b:
+            return
+        if len(self._members[cluster_a]) < len(self._members[cluster_b]):
+            cluster_a, cluster_b = cluster_b, cluster_a
+        absorbed = self._members[cluster_b]
+        for comp_id in absorbed:
+            self._cluster_of[comp_id] = cluster_a
+        self._members[cluster_a].update(absorbed)
+        del self._members[cluster_b]
+
+    def _split(self, comp_a, comp_b):
+        # Breadth-first from both ends, one step each in turn. Meeting means
+        # the cluster is still whole; otherwise the side that runs out first
+        # is the part that came loose.
+        seen = ({comp_a}, {comp_b})
+        queues = (deque([comp_a]), deque([comp_b]))
+        while True:
+            for side in (0, 1):
+                if not queues[side]:
+                    self._detach(seen[side])
+                    return
+                for neighbour in self._adj[queues[side].popleft()]:
+                    if neighbour in seen[1 - side]:
+                        return
+                    if neighbour not in seen[side]:
+                        seen[side].add(neighbour)
+                        queues[side].append(neighbour)
+
+    def _detach(self, comps):
+        old = self._cluster_of[next(iter(comps))]
+        self._members[old].difference_update(comps)
+        cluster = next(self._cluster_ids)
+        self._members[cluster] = comps
+        for comp_id in comps:
+            self._cluster_of[comp_id] = cluster
+
+    # -- queries -----------------------------------------------------------
+    def connected_ports(self, port_id):
+        # Ports on the far side of every connection at port_id.
+        model = self.model
+        return {model.connections[conn_id].other(port_id) for conn_id in model.ports[port_id].connection_ids}
+
+    def is_connected(self, port_a, port_b):
+        return self.model.connection_between(port_a, port_b) is not None
+
+    def dangling_ports(self):
+        return set(self._dangling)
+
+    def cluster_of(self, comp_id):
+        return self._members[self._cluster_of[comp_id]]
+
+    def clusters(self):
+        return list(self._members.values())
+
+    def neighbours(self, comp_id):
+        return set(self._adj[comp_id])
+
+    def cavities(self):
+        """Groups of components light can circulate between, as sorted ID tuples.
+
+        These are the strongly connected parts of the directed field graph:
+        a field leaves a port, crosses a connection into the far port, and
+        the component couples it out again (COUPLINGS). Any loop there is a
+        cavity, however weak its reflections are.
+        """
+        if not self._searched:
+            self._searched = True
+            self._record(self._find_cavities(self._field_nodes(self.model.components)))
+        elif self._added or self._removed:
+            self._update_cavities()
+        model = self.model
+        return [tuple(sorted({model.ports[port_id].component_id for port_id, _ in nodes}))
+                for nodes in self._cavities.values()]
+
+    def _update_cavities(self):
+        # Cavities that lost a connection can only fall apart, so their own
+        # nodes are searched again. A new connection between two cavities
+        # (or into one) can merge them with anything in its cluster.
+        region = set()
+        touched = set()
+        for port_a, port_b in self._removed:
+            for node in ((port_a, "i"), (port_a, "o"), (port_b, "i"), (port_b, "o")):
+                if node in self._cavity_of:
+                    touched.add(self._cavity_of[node])
+        clusters = set()
+        for port_a, port_b, comp_a in self._added:
+            cavity = self._cavity_of.get((port_a, "o"))
+            if cavity is not None and cavity == self._cavity_of.get((port_b, "i")) \
+                    and cavity == self._cavity_of.get((port_b, "o")) == self._cavity_of.get((port_a, "i")):
+                continue
+            if comp_a in self._cluster_of:
+                clusters.add(self._cluster_of[comp_a])
+        del self._added[:], self._removed[:]
+        for cluster in clusters:
+            comps = self._members[cluster]
+            region.update(self._field_nodes(comps))
+            touched.update(self._cavity_of[node] for node in region if node in self._cavity_of)
+        for cavity in touched:
+            nodes = self._cavities.pop(cavity)
+            for node in nodes:
+                del self._cavity_of[node]
+                if node[0] in self.model.ports:
+                    region.add(node)
+        if region:
+            self._record(self._find_cavities(region))
+
+    def _record(self, found):
+        for nodes in found:
+            cavity = next(self._cavity_ids)
+            self._cavities[cavity] = nodes
+            for node in nodes:
+                self._cavity_of[node] = cavity
+
+    def _field_nodes(self, comps):
+        return [(port_id, direction) for comp_id in comps
+                for port_id in self._ports_of[comp_id] for direction in ("i", "o")]
+
+    def _find_cavities(self, nodes):
+        # Iterative Tarjan over the field graph restricted to the given nodes;
+        # returns every strongly connected set of more than one node.
+        model = self.model
+        nodes = set(nodes)
+
+        def successors(node):
+            port_id, direction = node
+            port = model.ports[port_id]
+            if direction == "o":
+                found = [(model.connections[conn_id].other(port_id), "i") for conn_id in port.connection_ids]
+            else:
+                comp = model.components[port.component_id]
+                found = [(comp.ports[dst], "o") for src, dst, _ in COUPLINGS.get(comp.comp_type, ()) if src == port.name]
+            return [child for child in found if child in nodes]
+
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        found = []
+        counter = itertools.count()
+        for root in nodes:
+            if root in index:
+                continue
+            index[root] = low[root] = next(counter)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(successors(root)))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = next(counter)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(successors(child))))
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        scc = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            scc.append(member)
+                            if member == node:
+                                break
+                        if len(scc) > 1:
+                            found.append(frozenset(scc))
+        return found
+
+    def detector_issues(self):
+        """Detector component id -> problem with its node, for detectors that cannot be read out."""
+        if self._detector_issues is not None:
+            return self._detector_issues
+        model = self.model
+        issues = {}
+        by_name = None
+        for comp in model.components.values():
+            if comp.comp_type not in DETECTOR_TYPES:
+                continue
+            node = str(comp.properties.get("node") or "").strip()
+            if not node:
+                if not any(model.ports[port_id].connection_ids for port_id in comp.ports.values()):
+                    issues[comp.id] = "no node set and not connected"
+                continue
+            if by_name is None:
+                by_name = {name: model.components[comp_id] for comp_id, name in finesse_names(model).items()}
+            try:
+                resolve_node(node, by_name)
+            except ValueError as e:
+                issues[comp.id] = str(e)
+        self._detector_issues = issues
+        return issues
+
+    def report(self, label_for=None):
+        model = self.model
+        names = finesse_names(model)
+        label_for = label_for or names.get
+        lines = [f"{len(self._members)} connected group(s), {len(model.connections)} connection(s)"]
+        cavities = self.cavities()
+        lines.append(f"Cavities: {len(cavities)}")
+        for cavity in sorted(cavities)[:REPORT_LIMIT]:
+            lines.append("  " + " - ".join(label_for(comp_id) for comp_id in cavity))
+        issues = self.detector_issues()
+        lines.append(f"Detector problems: {len(issues)}")
+        for comp_id, issue in sorted(issues.items())[:REPORT_LIMIT]:
+            lines.append(f"  {label_for(comp_id)}: {issue}")
+        dangling = sorted(self._dangling)
+        lines.append(f"Unconnected ports: {len(dangling)}")
+        for port_id in dangling[:REPORT_LIMIT]:
+            port = model.ports[port_id]
+            lines.append(f"  {label_for(port.component_id)} {port.name}")
+        return "\n".join(lines)
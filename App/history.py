@@ -0,0 +1,194 @@
+from collections import deque
+from contextlib import contextmanager
+
+from layout_io import apply_journal_op
+
+##############################################################################
+#                    Undo/Redo History as Model Diffs                        #
+##############################################################################
+# Each undo step is the list of journal-format entries (see layout_io) that
+# reverse its edits, recorded by the model just before each edit is made.
+# Undoing replays them backwards; the model records the reverse of those
+# in turn, which becomes the redo step.
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024  # approximate bytes of undo + redo steps
+
+def entry_size(entry):
+    # Rough footprint of one entry: list, ids/floats, and any dict or list payload.
+    size = 56 + 16 * len(entry)
+    for value in entry:
+        if isinstance(value, str):
+            size += 49 + len(value)
+        elif isinstance(value, (dict, list)):
+            size += 64 + 100 * len(value)
+    return size
+
+class HistoryStep:
+    __slots__ = ("text", "entries", "moves_only", "moved", "size")
+    def __init__(self, text):
+        self.text = text
+        self.entries = []
+        self.moves_only = True
+        self.moved = set()  # components whose original position is already recorded
+        self.size = 0
+    def add(self, entry):
+        if entry[0] == "M":
+            if entry[1] in self.moved:
+                return  # the first position recorded is the one to go back to
+            self.moved.add(entry[1])
+        else:
+            self.moves_only = False
+        self.entries.append(entry)
+        self.size += entry_size(entry)
+
+class History:
+    """Undo/redo over a LayoutModel, recorded from the model itself.
+
+    Any edit outside a macro() becomes its own step, except that
+    consecutive moves join the previous move step until seal() is called
+    (the scene seals on mouse release, so one drag is one step). Once undo
+    and redo steps together pass memory_limit, undo steps are dropped oldest
+    first, then redo steps furthest from the current state.
+    """
+    def __init__(self, model, memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.model = model
+        self.memory_limit = memory_limit
+        self._undo = deque()
+        self._redo = []
+        self._size = 0
+        self._macro = None
+        self._macro_depth = 0
+        self._capture = None  # step being recorded while undoing/redoing
+        self._sealed = True
+        self._suspended = 0
+        model.add_recorder(self.record)
+
+    def close(self):
+        self.model.remove_recorder(self.record)
+
+    # -- recording ---------------------------------------------------------
+    def record(self, entry):
+        if self._suspended:
+            return
+        if self._capture is not None:
+            self._capture.add(entry)
+        elif self._macro is not None:
+            self._macro.add(entry)
+        else:
+            if entry[0] == "M" and not self._sealed and self._undo and self._undo[-1].moves_only:
+                step = self._undo[-1]
+                before = step.size
+                step.add(entry)
+                self._size += step.size - before
+                self._trim()
+                return
+            step = HistoryStep(self._describe(entry))
+            step.add(entry)
+            self._push(step)
+            self._sealed = entry[0] != "M"
+
+    @contextmanager
+    def macro(self, text):
+        """Record every edit made inside the block as a single undo step."""
+        if self._macro_depth == 0:
+            self._macro = HistoryStep(text)
+        self._macro_depth += 1
+        try:
+            yield
+        finally:
+            self._macro_depth -= 1
+            if self._macro_depth == 0:
+                step, self._macro = self._macro, None
+                if step.entries:
+                    self._push(step)
+                    self._sealed = True
+
+    @contextmanager
+    def suspended(self):
+        """Edits inside the block are not recorded (loading a file, for instance)."""
+        self._suspended += 1
+        try:
+            yield
+        finally:
+            self._suspended -= 1
+
+    def seal(self):
+        # Ends move merging: the next move starts a new step.
+        self._sealed = True
+
+    def _push(self, step):
+        self._undo.append(step)
+        self._size += step.size
+        for dropped in self._redo:
+            self._size -= dropped.size
+        self._redo = []
+        self._trim()
+
+    def _trim(self):
+        # The step on either side of the current state is always kept.
+        while self._size > self.memory_limit and len(self._undo) > 1:
+            self._size -= self._undo.popleft().size
+        while self._size > self.memory_limit and len(self._redo) > 1:
+            self._size -= self._redo.pop(0).size
+
+    @staticmethod
+    def _describe(entry):
+        return {
+            "-C": "Add component", "C": "Delete component",
+            "-K": "Connect", "K": "Disconnect",
+            "M": "Move", "R": "Rotate", "P": "Edit properties",
+            "L": "Rename", "S": "Change length",
+            "-B": "Define block", "B": "Remove block",
+        }.get(entry[0], "Edit")
+
+    # -- undo / redo -------------------------------------------------------
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo_text(self):
+        return self._undo[-1].text if self._undo else ""
+
+    def redo_text(self):
+        return self._redo[-1].text if self._redo else ""
+
+    def undo(self):
+        if not self._undo:
+            return False
+        step = self._undo.pop()
+        self._size -= step.size
+        self._redo.append(self._replay(step))
+        self._size += self._redo[-1].size
+        self._trim()
+        return True
+
+    def redo(self):
+        if not self._redo:
+            return False
+        step = self._redo.pop()
+        self._size -= step.size
+        self._undo.append(self._replay(step))
+        self._size += self._undo[-1].size
+        self._trim()
+        return True
+
+    def _replay(self, step):
+        self._capture = HistoryStep(step.text)
+        try:
+            with self.model.batch():
+                for entry in reversed(step.entries):
+                    apply_journal_op(self.model, entry)
+        finally:
+            replayed, self._capture = self._capture, None
+        self._sealed = True
+        return replayed
+
+    def clear(self):
+        self._undo.clear()
+        self._redo = []
+        self._size = 0
+        self._sealed = True
+
+    def memory_used(self):
+        return self._size
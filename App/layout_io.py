@@ -0,0 +1,307 @@
+import os
+import gzip
+import json
+import threading
+
+from model import (
+    LayoutModel, component_record, connection_record,
+    COMPONENT_ADDED, COMPONENT_REMOVED, COMPONENT_MOVED, COMPONENT_ROTATED,
+    COMPONENT_CHANGED, CONNECTION_ADDED, CONNECTION_REMOVED, CONNECTION_CHANGED,
+    BLOCK_DEFINED, BLOCK_REMOVED
+)
+
+##############################################################################
+#                           Layout File Format                               #
+##############################################################################
+# One JSON value per line. The first line is a header, followed by compact
+# array records that can be applied one at a time while reading:
+#   ["C", id, comp_type, x, y, angle, label, properties, [port ids]]
+#   ["K", id, port_a, port_b, length]
+#   ["B", name, [members], [internal connections], [exposed ports]]
+# Port ids are listed in PORT_POSITIONS order for the component type (in
+# exposed-port order for block instances). Block definitions come first.
+LAYOUT_FORMAT = "opticsgpt-layout"
+LAYOUT_VERSION = 1
+LAYOUT_EXTENSION = ".ogl"
+JOURNAL_SUFFIX = ".journal"
+COMPACTING_SUFFIX = ".journal.compacting"
+
+def _open(path, mode, gzipped=None):
+    if gzipped if gzipped is not None else path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def _dump(record):
+    return json.dumps(record, separators=(",", ":"))
+
+def snapshot_records(model):
+    # Copies taken on the caller's thread so they can be written from another.
+    records = [definition.to_record() for definition in model.blocks.values()]
+    records.extend(component_record(comp) for comp in model.components.values())
+    records.extend(connection_record(conn) for conn in model.connections.values())
+    return records
+
+def write_layout(path, header, records):
+    tmp_path = path + ".tmp"
+    with _open(tmp_path, "w", gzipped=path.endswith(".gz")) as f:
+        f.write(_dump(header) + "\n")
+        for record in records:
+            f.write(_dump(record) + "\n")
+        f.flush()
+        if hasattr(f, "fileno"):
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def layout_header(model):
+    return {
+        "format": LAYOUT_FORMAT,
+        "version": LAYOUT_VERSION,
+        "next_id": model.next_id(),
+        "components": len(model.components),
+        "connections": len(model.connections),
+    }
+
+def save_layout(model, path):
+    write_layout(path, layout_header(model), snapshot_records(model))
+    for suffix in (JOURNAL_SUFFIX, COMPACTING_SUFFIX):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def read_header(f, path):
+    try:
+        header = json.loads(f.readline())
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("format") != LAYOUT_FORMAT:
+        raise ValueError(f"{path} is not an OpticsGPT layout file")
+    if header.get("version", 0) > LAYOUT_VERSION:
+        raise ValueError(f"{path} uses layout format version {header['version']}, "
+                         f"this build reads up to {LAYOUT_VERSION}")
+    return header
+
+def iter_layout(path):
+    """Yield the header and then each record without reading the whole file."""
+    with _open(path, "r") as f:
+        yield read_header(f, path)
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+# Fewest fields each record / journal entry kind needs (including the kind).
+RECORD_FIELDS = {
+    "C": 9, "K": 4, "B": 5, "-B": 2, "-C": 2, "-K": 2,
+    "M": 4, "R": 3, "P": 3, "L": 3, "S": 3,
+}
+
+def check_record(record):
+    """Raise ValueError unless record has the shape its kind calls for."""
+    kind = record[0] if isinstance(record, list) and record else None
+    if not isinstance(kind, str) or kind not in RECORD_FIELDS:
+        raise ValueError(f"Unknown layout record {record!r}")
+    if len(record) < RECORD_FIELDS[kind] or (kind in ("C", "B") and len(record) != RECORD_FIELDS[kind]):
+        raise ValueError(f"Malformed layout record {record!r}")
+    if kind == "C" and not (isinstance(record[7], dict) and isinstance(record[8], list)):
+        raise ValueError(f"Malformed layout record {record!r}")
+    if kind == "P" and not isinstance(record[2], dict):
+        raise ValueError(f"Malformed layout record {record!r}")
+
+def apply_record(model, record):
+    check_record(record)
+    kind = record[0]
+    if kind == "C":
+        _, comp_id, comp_type, x, y, angle, label, properties, port_ids = record
+        if comp_id in model.components:
+            return
+        names = list(model.port_names(comp_type))
+        model.add_component(comp_type, x, y, angle, label, properties, comp_id=comp_id,
+                            port_ids=dict(zip(names, port_ids)))
+    elif kind == "K":
+        conn_id, port_a, port_b = record[1:4]
+        if conn_id not in model.connections:
+            model.connect(port_a, port_b, conn_id=conn_id, length=record[4] if len(record) > 4 else 0.0)
+    elif kind == "B":
+        if record[1] not in model.blocks:
+            from blocks import BlockDefinition
+            try:
+                definition = BlockDefinition.from_record(record)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Malformed layout record {record!r}") from e
+            model.define_block(definition)
+    else:
+        apply_journal_op(model, record)
+
+def load_layout(path, model=None):
+    """Stream a layout (plus any autosave journal) into model and return it."""
+    model = model if model is not None else LayoutModel()
+    records = iter_layout(path)
+    header = next(records)
+    for record in records:
+        apply_record(model, record)
+    for suffix in (COMPACTING_SUFFIX, JOURNAL_SUFFIX):
+        if os.path.exists(path + suffix):
+            replay_journal(model, path + suffix)
+    model.reserve_ids(header.get("next_id", 1))
+    return model
+
+##############################################################################
+#                     Append-only Autosave Journal                           #
+##############################################################################
+# Journal lines are absolute-state edits, so replaying one twice is harmless:
+#   ["C", ...] / ["K", ...]        as in the layout file
+#   ["-C", id] / ["-K", id]        component / connection removed
+#   ["M", id, x, y]  ["R", id, angle]  ["P", id, properties]  ["L", id, label]
+#   ["S", id, length]              connection (space) length
+#   ["B", ...] / ["-B", name]      block defined / removed
+def apply_journal_op(model, op):
+    check_record(op)
+    kind, obj_id = op[0], op[1]
+    if kind in ("C", "K", "B"):
+        apply_record(model, op)
+    elif kind == "-B":
+        if obj_id in model.blocks:
+            model.remove_block(obj_id)
+    elif kind == "-C":
+        if obj_id in model.components:
+            model.remove_component(obj_id)
+    elif kind == "-K":
+        if obj_id in model.connections:
+            model.disconnect(obj_id)
+    elif kind == "S":
+        if obj_id in model.connections:
+            model.set_connection_length(obj_id, op[2])
+    elif obj_id not in model.components:
+        return
+    elif kind == "M":
+        model.move_component(obj_id, op[2], op[3])
+    elif kind == "R":
+        model.set_angle(obj_id, op[2])
+    elif kind == "P":
+        model.set_properties(obj_id, op[2])
+    elif kind == "L":
+        model.set_label(obj_id, op[2])
+    else:
+        raise ValueError(f"Unknown journal entry {kind!r}")
+
+def replay_journal(model, journal_path):
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                op = json.loads(line)
+            except ValueError:
+                break  # torn final line from an interrupted write
+            apply_journal_op(model, op)
+
+# Compact once the journal holds this many entries since the last snapshot.
+COMPACT_THRESHOLD = 20000
+
+class LayoutJournal:
+    # Records model edits since the last full save and appends them to
+    # <path>.journal on flush(). Repeated moves of a component between two
+    # flushes become one entry, as long as nothing else was recorded for
+    # that component in between. compact() rewrites the layout file from a
+    # snapshot on a background thread while new edits go to a fresh journal.
+    def __init__(self, model, path, compact_threshold=COMPACT_THRESHOLD):
+        self.model = model
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.compact_threshold = compact_threshold
+        self._pending = []
+        self._pending_moves = {}
+        self._entries = 0
+        self._lock = threading.Lock()
+        self._compactor = None
+        model.subscribe(self.onModelEvent)
+
+    def close(self):
+        self.flush()
+        self.model.unsubscribe(self.onModelEvent)
+        self.wait()
+
+    def onModelEvent(self, event, obj_id):
+        model = self.model
+        if event in (COMPONENT_ADDED, COMPONENT_REMOVED, COMPONENT_ROTATED, COMPONENT_CHANGED):
+            # A later move must not be written before this entry (e.g. a re-add by undo).
+            self._pending_moves.pop(obj_id, None)
+        if event == COMPONENT_MOVED:
+            comp = model.components[obj_id]
+            index = self._pending_moves.get(obj_id)
+            if index is not None:
+                self._pending[index] = ["M", obj_id, comp.x, comp.y]
+                return
+            self._pending_moves[obj_id] = len(self._pending)
+            self._pending.append(["M", obj_id, comp.x, comp.y])
+        elif event == COMPONENT_ADDED:
+            self._pending.append(component_record(model.components[obj_id]))
+        elif event == COMPONENT_REMOVED:
+            self._pending.append(["-C", obj_id])
+        elif event == COMPONENT_ROTATED:
+            self._pending.append(["R", obj_id, model.components[obj_id].angle])
+        elif event == COMPONENT_CHANGED:
+            comp = model.components[obj_id]
+            self._pending.append(["P", obj_id, dict(comp.properties)])
+            self._pending.append(["L", obj_id, comp.label])
+        elif event == CONNECTION_ADDED:
+            self._pending.append(connection_record(model.connections[obj_id]))
+        elif event == CONNECTION_REMOVED:
+            self._pending.append(["-K", obj_id])
+        elif event == CONNECTION_CHANGED:
+            self._pending.append(["S", obj_id, model.connections[obj_id].length])
+        elif event == BLOCK_DEFINED:
+            self._pending.append(model.blocks[obj_id].to_record())
+        elif event == BLOCK_REMOVED:
+            self._pending.append(["-B", obj_id])
+
+    def has_pending(self):
+        return bool(self._pending)
+
+    def flush(self):
+        if not self._pending:
+            return 0
+        data = "".join(_dump(op) + "\n" for op in self._pending)
+        count = len(self._pending)
+        self._pending = []
+        self._pending_moves = {}
+        with self._lock:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(data)
+            self._entries += count
+        if self._entries >= self.compact_threshold:
+            self.compact()
+        return len(data)
+
+    def compact(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return False
+        self.flush_pending_only()
+        header = layout_header(self.model)
+        records = snapshot_records(self.model)
+        with self._lock:
+            if os.path.exists(self.journal_path):
+                # Kept until the new snapshot is on disk so a crash loses nothing.
+                os.replace(self.journal_path, self.path + COMPACTING_SUFFIX)
+            self._entries = 0
+        self._compactor = threading.Thread(target=self._write_snapshot, args=(header, records),
+                                           name="layout-compactor", daemon=True)
+        self._compactor.start()
+        return True
+
+    def flush_pending_only(self):
+        threshold, self.compact_threshold = self.compact_threshold, float("inf")
+        try:
+            self.flush()
+        finally:
+            self.compact_threshold = threshold
+
+    def _write_snapshot(self, header, records):
+        write_layout(self.path, header, records)
+        compacting = self.path + COMPACTING_SUFFIX
+        if os.path.exists(compacting):
+            os.remove(compacting)
+
+    def wait(self):
+        if self._compactor is not None:
+            self._compactor.join()
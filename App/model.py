@@ -0,0 +1,428 @@
+import itertools
+from contextlib import contextmanager
+
+##############################################################################
+#                        Component Property Definitions                      #
+##############################################################################
+COMPONENT_PROPERTIES = {
+    "BS": {  # new beam splitter
+        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
+        "R": {"label": "Reflectivity", "required": False, "default": "", "type": "float"},
+        "T": {"label": "Transmissivity", "required": False, "default": "", "type": "float"},
+        "L": {"label": "Loss", "required": False, "default": "", "type": "float"},
+        "phi": {"label": "Microscopic tuning (°)", "required": False, "default": "", "type": "float"},
+        "alpha": {"label": "Angle of incidence (°)", "required": False, "default": "", "type": "float"},
+        "Rc": {"label": "Radius of curvature (m)", "required": False, "default": "inf", "type": "float"},
+        "xbeta": {"label": "Misalignment yaw (rad)", "required": False, "default": "0", "type": "float"},
+        "ybeta": {"label": "Misalignment pitch (rad)", "required": False, "default": "0", "type": "float"},
+        "plane": {"label": "Plane of incidence", "required": False, "default": "xz", "type": "str"},
+        "misaligned": {"label": "Misaligned (True/False)", "required": False, "default": False, "type": "bool"},
+        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
+    },
+    "beamsplitter_old": {  # old beam splitter
+        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
+        "R": {"label": "Reflectivity", "required": False, "default": "", "type": "float"},
+        "T": {"label": "Transmissivity", "required": False, "default": "", "type": "float"},
+        "L": {"label": "Loss", "required": False, "default": "", "type": "float"},
+        "phi": {"label": "Microscopic tuning (°)", "required": False, "default": "", "type": "float"},
+        "alpha": {"label": "Angle of incidence (°)", "required": False, "default": "", "type": "float"},
+        "Rc": {"label": "Radius of curvature (m)", "required": False, "default": "inf", "type": "float"},
+        "xbeta": {"label": "Misalignment yaw (rad)", "required": False, "default": "0", "type": "float"},
+        "ybeta": {"label": "Misalignment pitch (rad)", "required": False, "default": "0", "type": "float"},
+        "plane": {"label": "Plane of incidence", "required": False, "default": "xz", "type": "str"},
+        "misaligned": {"label": "Misaligned (True/False)", "required": False, "default": False, "type": "bool"},
+        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
+    },
+    "mirror": {
+        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
+        "R": {"label": "Reflectivity", "required": False, "default": 0.5, "type": "float"},
+        "T": {"label": "Transmittance", "required": False, "default": 0.5, "type": "float"},
+        "L": {"label": "Loss", "required": False, "default": 0.0, "type": "float"},
+        "phi": {"label": "Tuning (°)", "required": False, "default": 0.0, "type": "float"},
+        "Rc": {"label": "Radius of curvature (m)", "required": False, "default": "inf", "type": "float"},
+        "xbeta": {"label": "Misalignment yaw (rad)", "required": False, "default": "0", "type": "float"},
+        "ybeta": {"label": "Misalignment pitch (rad)", "required": False, "default": "0", "type": "float"},
+        "misaligned": {"label": "Misaligned (True/False)", "required": False, "default": False, "type": "bool"},
+        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
+    },
+    "laser": {
+        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
+        "P": {"label": "Power (W)", "required": False, "default": 1, "type": "float"},
+        "f": {"label": "Frequency offset (Hz)", "required": False, "default": 0, "type": "float"},
+        "phase": {"label": "Phase offset", "required": False, "default": 0, "type": "float"},
+        "signals_only": {"label": "Signals only (True/False)", "required": False, "default": False, "type": "bool"},
+        "w0": {"label": "Beam waist radius (m)", "required": False, "default": "", "type": "float"},
+        "z": {"label": "Distance to waist (m)", "required": False, "default": "", "type": "float"},
+        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
+    },
+    "lens": {
+        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
+        "f": {"label": "Focal length (m)", "required": False, "default": "inf", "type": "float"},
+        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
+    },
+    "power_detector": {
+        "name": {"label": "Name", "required": True, "default": "", "type": "str"},
+        "node": {"label": "Node", "required": True, "default": "", "type": "str"},
+        "angle": {"label": "Angle (°)", "required": False, "default": "0", "type": "float"}
+    },
+}
+
+##############################################################################
+#                     Port Positions (normalised to pixmap)                  #
+##############################################################################
+PORT_POSITIONS = {
+    "BS": {
+        "p1": (0.0, 0.45),
+        "p2": (0.0, 0.55),
+        "p3": (1.0, 0.45),
+        "p4": (1.0, 0.55),
+    },
+    "beamsplitter_old": {
+        "p1": (0.5, 0.0),
+        "p2": (0.5, 1.0),
+        "p3": (0.0, 0.5),
+        "p4": (1.0, 0.5),
+    },
+    "lens": {
+        "p1": (0.0, 0.5),
+        "p2": (1.0, 0.5),
+    },
+    "mirror": {
+        "p1": (0.0, 0.5),
+        "p2": (1.0, 0.5),
+    },
+    "laser": {
+        "p1": (1.0, 0.5),
+    },
+    "power_detector": {
+        "p1": (0.0, 0.5),
+    },
+}
+
+##############################################################################
+#                    Port Couplings (light paths through parts)              #
+##############################################################################
+# Per component type: (source port, destination port, coupling kind).
+# Kinds: "r+" front reflection, "r-" back reflection, "t" transmission, "1" pass-through.
+COUPLINGS = {
+    "mirror": [("p1", "p1", "r+"), ("p2", "p2", "r-"), ("p1", "p2", "t"), ("p2", "p1", "t")],
+    "BS": [("p1", "p2", "r+"), ("p2", "p1", "r+"), ("p3", "p4", "r-"), ("p4", "p3", "r-"),
+           ("p1", "p3", "t"), ("p3", "p1", "t"), ("p2", "p4", "t"), ("p4", "p2", "t")],
+    "lens": [("p1", "p2", "1"), ("p2", "p1", "1")],
+}
+COUPLINGS["beamsplitter_old"] = COUPLINGS["BS"]
+
+##############################################################################
+#                     Layout Records (headless, Qt-free)                     #
+##############################################################################
+class ComponentRecord:
+    __slots__ = ("id", "comp_type", "label", "properties", "x", "y", "angle", "ports", "rev")
+    def __init__(self, comp_id, comp_type, x=0.0, y=0.0, angle=0.0, label="", properties=None):
+        self.id = comp_id
+        self.comp_type = comp_type
+        self.label = label
+        self.properties = dict(properties) if properties else {}
+        self.x = float(x)
+        self.y = float(y)
+        self.angle = float(angle)
+        self.ports = {}  # port name -> port id, in PORT_POSITIONS order
+        self.rev = 0
+
+class PortRecord:
+    __slots__ = ("id", "component_id", "name", "connection_ids")
+    def __init__(self, port_id, component_id, name):
+        self.id = port_id
+        self.component_id = component_id
+        self.name = name
+        self.connection_ids = set()
+
+class ConnectionRecord:
+    __slots__ = ("id", "port_a", "port_b", "length")
+    def __init__(self, conn_id, port_a, port_b, length=0.0):
+        self.id = conn_id
+        self.port_a = port_a
+        self.port_b = port_b
+        self.length = float(length)  # free-space distance in metres
+    def other(self, port_id):
+        return self.port_b if port_id == self.port_a else self.port_a
+
+# Components of type BLOCK_PREFIX + name are instances of model.blocks[name].
+BLOCK_PREFIX = "block:"
+
+def component_record(comp):
+    return ["C", comp.id, comp.comp_type, comp.x, comp.y, comp.angle, comp.label,
+            dict(comp.properties), list(comp.ports.values())]
+
+def connection_record(conn):
+    return ["K", conn.id, conn.port_a, conn.port_b, conn.length]
+
+def _edge_key(port_a, port_b):
+    return (port_a, port_b) if port_a < port_b else (port_b, port_a)
+
+##############################################################################
+#                               Layout Model                                 #
+##############################################################################
+# Events passed to subscribers as listener(event, obj_id).
+COMPONENT_ADDED = "component_added"
+COMPONENT_REMOVED = "component_removed"
+COMPONENT_MOVED = "component_moved"
+COMPONENT_ROTATED = "component_rotated"
+COMPONENT_CHANGED = "component_changed"  # properties or label
+CONNECTION_ADDED = "connection_added"
+CONNECTION_REMOVED = "connection_removed"
+CONNECTION_CHANGED = "connection_changed"  # length
+BLOCK_DEFINED = "block_defined"  # obj_id is the block name
+BLOCK_REMOVED = "block_removed"
+# Bracket the events of a bulk edit (obj_id is None), so views can refresh once.
+BATCH_STARTED = "batch_started"
+BATCH_FINISHED = "batch_finished"
+
+class LayoutModel:
+    """Headless layout: components, ports and connections keyed by stable integer IDs.
+
+    IDs come from a single counter and are never reused, so they can be
+    stored in files, undo history and caches. The Qt scene is a view over
+    this model and follows it through subscribe(). Recorders added with
+    add_recorder() are handed the journal-format entry that reverses each
+    edit, just before the edit is made.
+    """
+    def __init__(self):
+        self.components = {}
+        self.ports = {}
+        self.connections = {}
+        self._edges = {}  # (lower port id, higher port id) -> connection id
+        self.rev = 0
+        self._next_id = 1
+        self._listeners = []
+        self._recorders = []
+        self._batch_depth = 0
+        self.blocks = {}  # block name -> definition (see blocks.py), shared by all its instances
+
+    # -- observers ---------------------------------------------------------
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    def add_recorder(self, recorder):
+        self._recorders.append(recorder)
+    def remove_recorder(self, recorder):
+        if recorder in self._recorders:
+            self._recorders.remove(recorder)
+    def _record(self, inverse):
+        for recorder in self._recorders:
+            recorder(inverse)
+    def _emit(self, event, obj_id):
+        self.rev += 1
+        for listener in list(self._listeners):
+            listener(event, obj_id)
+
+    @contextmanager
+    def batch(self):
+        """Group the edits made inside the block between BATCH_STARTED and BATCH_FINISHED."""
+        self._batch_depth += 1
+        if self._batch_depth == 1:
+            self._emit(BATCH_STARTED, None)
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._emit(BATCH_FINISHED, None)
+
+    def in_batch(self):
+        return self._batch_depth > 0
+
+    def _allocate_id(self, requested=None):
+        if requested is None:
+            new_id = self._next_id
+        else:
+            new_id = int(requested)
+            if new_id in self.components or new_id in self.ports or new_id in self.connections:
+                raise ValueError(f"ID {new_id} is already in use")
+        self._next_id = max(self._next_id, new_id + 1)
+        return new_id
+
+    # -- components --------------------------------------------------------
+    def add_component(self, comp_type, x=0.0, y=0.0, angle=0.0, label="", properties=None,
+                      comp_id=None, port_ids=None):
+        comp = ComponentRecord(self._allocate_id(comp_id), comp_type, x, y, angle, label, properties)
+        self.components[comp.id] = comp
+        port_ids = port_ids or {}
+        for pname in self.port_names(comp_type):
+            port = PortRecord(self._allocate_id(port_ids.get(pname)), comp.id, pname)
+            self.ports[port.id] = port
+            comp.ports[pname] = port.id
+        if self._recorders:
+            self._record(["-C", comp.id])
+        self._emit(COMPONENT_ADDED, comp.id)
+        return comp.id
+
+    def remove_component(self, comp_id):
+        comp = self.components[comp_id]
+        for port_id in comp.ports.values():
+            for conn_id in list(self.ports[port_id].connection_ids):
+                self.disconnect(conn_id)
+        if self._recorders:
+            self._record(component_record(comp))
+        for port_id in comp.ports.values():
+            del self.ports[port_id]
+        del self.components[comp_id]
+        self._emit(COMPONENT_REMOVED, comp_id)
+
+    def move_component(self, comp_id, x, y):
+        comp = self.components[comp_id]
+        if comp.x == x and comp.y == y:
+            return
+        if self._recorders:
+            self._record(["M", comp_id, comp.x, comp.y])
+        comp.x = float(x)
+        comp.y = float(y)
+        self._emit(COMPONENT_MOVED, comp_id)
+
+    def set_angle(self, comp_id, angle):
+        comp = self.components[comp_id]
+        if comp.angle == angle:
+            return
+        if self._recorders:
+            self._record(["R", comp_id, comp.angle])
+        comp.angle = float(angle)
+        comp.rev += 1
+        self._emit(COMPONENT_ROTATED, comp_id)
+
+    def set_properties(self, comp_id, properties):
+        comp = self.components[comp_id]
+        if comp.properties == properties:
+            return
+        if self._recorders:
+            self._record(["P", comp_id, comp.properties])  # replaced below, never mutated
+        comp.properties = dict(properties)
+        comp.rev += 1
+        self._emit(COMPONENT_CHANGED, comp_id)
+
+    def set_label(self, comp_id, label):
+        comp = self.components[comp_id]
+        if comp.label == label:
+            return
+        if self._recorders:
+            self._record(["L", comp_id, comp.label])
+        comp.label = label
+        comp.rev += 1
+        self._emit(COMPONENT_CHANGED, comp_id)
+
+    # -- blocks ------------------------------------------------------------
+    def define_block(self, definition):
+        if definition.name in self.blocks:
+            raise ValueError(f"Block {definition.name!r} is already defined")
+        self.blocks[definition.name] = definition
+        if self._recorders:
+            self._record(["-B", definition.name])
+        self._emit(BLOCK_DEFINED, definition.name)
+
+    def remove_block(self, name):
+        comp_type = BLOCK_PREFIX + name
+        if any(comp.comp_type == comp_type for comp in self.components.values()):
+            raise ValueError(f"Block {name!r} still has instances")
+        definition = self.blocks.pop(name)
+        if self._recorders:
+            self._record(definition.to_record())
+        self._emit(BLOCK_REMOVED, name)
+
+    # -- connections -------------------------------------------------------
+    def connect(self, port_a, port_b, conn_id=None, length=0.0):
+        if port_a == port_b:
+            raise ValueError("Cannot connect a port to itself")
+        if port_a not in self.ports or port_b not in self.ports:
+            raise KeyError(f"Unknown port in connection {port_a} - {port_b}")
+        if self.connection_between(port_a, port_b) is not None:
+            raise ValueError(f"Ports {port_a} and {port_b} are already connected")
+        conn = ConnectionRecord(self._allocate_id(conn_id), port_a, port_b, length)
+        self.connections[conn.id] = conn
+        self._edges[_edge_key(port_a, port_b)] = conn.id
+        if self._recorders:
+            self._record(["-K", conn.id])
+        self.ports[port_a].connection_ids.add(conn.id)
+        self.ports[port_b].connection_ids.add(conn.id)
+        self._emit(CONNECTION_ADDED, conn.id)
+        return conn.id
+
+    def set_connection_length(self, conn_id, length):
+        conn = self.connections[conn_id]
+        if conn.length == length:
+            return
+        if self._recorders:
+            self._record(["S", conn_id, conn.length])
+        conn.length = float(length)
+        self._emit(CONNECTION_CHANGED, conn_id)
+
+    def disconnect(self, conn_id):
+        conn = self.connections.pop(conn_id)
+        if self._recorders:
+            self._record(connection_record(conn))
+        del self._edges[_edge_key(conn.port_a, conn.port_b)]
+        self.ports[conn.port_a].connection_ids.discard(conn_id)
+        self.ports[conn.port_b].connection_ids.discard(conn_id)
+        self._emit(CONNECTION_REMOVED, conn_id)
+
+    def next_id(self):
+        return self._next_id
+
+    def reserve_ids(self, next_id):
+        # Keep IDs from a saved session unused, even ones whose objects were deleted.
+        self._next_id = max(self._next_id, int(next_id))
+
+    # -- queries -----------------------------------------------------------
+    def port_names(self, comp_type):
+        if comp_type.startswith(BLOCK_PREFIX):
+            definition = self.blocks.get(comp_type[len(BLOCK_PREFIX):])
+            if definition is None:
+                raise KeyError(f"Block {comp_type[len(BLOCK_PREFIX):]!r} is not defined")
+            return definition.exposed.keys()
+        return PORT_POSITIONS.get(comp_type, {}).keys()
+
+    def port(self, comp_id, port_name):
+        return self.ports[self.components[comp_id].ports[port_name]]
+
+    def component_of(self, port_id):
+        return self.components[self.ports[port_id].component_id]
+
+    def connection_between(self, port_a, port_b):
+        return self._edges.get(_edge_key(port_a, port_b))
+
+    def component_connections(self, comp_id):
+        conn_ids = set()
+        for port_id in self.components[comp_id].ports.values():
+            conn_ids.update(self.ports[port_id].connection_ids)
+        return conn_ids
+
+    def clear(self):
+        for comp_id in list(self.components):
+            self.remove_component(comp_id)
+        for name in list(self.blocks):
+            self.remove_block(name)
+
+##############################################################################
+#                        Display Labels / Connection Text                    #
+##############################################################################
+def display_label(label, comp_type, properties):
+    label = label if label else comp_type
+    changed = []
+    for key, value in properties.items():
+        if key in ("name", "angle"):
+            continue
+        changed.append(f"{key}={value}")
+    if changed:
+        label += " (" + ", ".join(changed) + ")"
+    return label
+
+def component_display_label(comp):
+    return display_label(comp.label, comp.comp_type, comp.properties)
+
+def connection_text(model, conn_id, label_for=None):
+    label_for = label_for or (lambda comp_id: component_display_label(model.components[comp_id]))
+    conn = model.connections[conn_id]
+    portA = model.ports[conn.port_a]
+    portB = model.ports[conn.port_b]
+    labelA = label_for(portA.component_id)
+    labelB = label_for(portB.component_id)
+    return f"{labelA} {portA.name} - connected to {labelB} {portB.name}"
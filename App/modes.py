@@ -0,0 +1,243 @@
+import math
+from collections import deque
+
+import numpy as np
+
+from model import COUPLINGS
+from beamtrace import BeamTracer, DEFAULT_WAIST, FRONT_PORTS, apply_abcd, beam_size, q_from_waist
+from solver import WAVELENGTH, float_property
+
+##############################################################################
+#             Hermite-Gauss Mode Coupling (tilt, curvature, mismatch)        #
+##############################################################################
+# Each (port, direction) has a Gaussian basis. As in Finesse, stable cavity
+# eigenmodes are traced through the layout first and the lasers' beams
+# fill in the rest, so light circulating in a cavity stays in one basis and
+# mismatch only appears where a beam enters it. Mode functions omit the
+# Gouy phase, which spaces apply instead,
+# so a component's coupling matrix only has to map the image of its input
+# basis (through the component's ABCD matrix) onto its output basis, with
+# the tilt phase exp(-i k delta x) on reflection (delta = 2 * beta).
+# As in Finesse's default phase configuration, HG00 carries no Gouy phase
+# and every coupling matrix is rotated so that k00,00 is real.
+QUADRATURE_POINTS = 96  # Gauss-Hermite nodes per overlap integral
+SAME_BASIS_TOLERANCE = 1e-12  # relative q difference treated as no mismatch
+
+def mode_indices(maxtem):
+    # HG modes (n, m) with n + m <= maxtem, ordered by total order: 00, 10, 01, 20, 11, 02, ...
+    return [(n, order - n) for order in range(maxtem + 1) for n in range(order, -1, -1)]
+
+def hermite_functions(y, count):
+    # h_n(y) = H_n(y) / sqrt(2^n n!) for n < count, by the stable three-term recurrence.
+    h = np.empty((count,) + y.shape)
+    h[0] = 1.0
+    if count > 1:
+        h[1] = math.sqrt(2.0) * y
+    for n in range(1, count - 1):
+        h[n + 1] = math.sqrt(2.0 / (n + 1)) * y * h[n] - math.sqrt(n / (n + 1)) * h[n - 1]
+    return np.moveaxis(h, 0, -2)  # (..., count, points)
+
+def mode_functions(x, q, count, wavelength=WAVELENGTH):
+    # u_n(x; q) for n < count at points x (..., points), Gouy phase omitted.
+    w = beam_size(q, wavelength)[..., None]
+    k = 2 * np.pi / wavelength
+    envelope = (2 / np.pi) ** 0.25 / np.sqrt(w) * np.exp(-1j * k * x ** 2 / (2 * q[..., None]))
+    return hermite_functions(np.sqrt(2.0) * x / w, count) * envelope[..., None, :]
+
+def knm_1d(q_in, q_out, delta, maxtem, wavelength=WAVELENGTH):
+    """Overlaps <u_m(q_out)| exp(-i k delta x) |u_n(q_in)> for n, m <= maxtem.
+
+    q_in, q_out and delta are arrays of the same shape (...); the result is
+    (..., maxtem + 1, maxtem + 1), indexed [m, n].
+    """
+    q_in = np.asarray(q_in, dtype=complex)
+    q_out = np.asarray(q_out, dtype=complex)
+    delta = np.asarray(delta, dtype=float)
+    nodes, weights = np.polynomial.hermite.hermgauss(QUADRATURE_POINTS)
+    w_in = beam_size(q_in, wavelength)
+    w_out = beam_size(q_out, wavelength)
+    # Scale the nodes to the product of the two Gaussian envelopes.
+    scale = 1.0 / np.sqrt(1.0 / w_in ** 2 + 1.0 / w_out ** 2)
+    x = scale[..., None] * nodes
+    k = 2 * np.pi / wavelength
+    measure = scale[..., None] * weights * np.exp(nodes ** 2) * np.exp(-1j * k * delta[..., None] * x)
+    u_in = mode_functions(x, q_in, maxtem + 1, wavelength)
+    u_out = mode_functions(x, q_out, maxtem + 1, wavelength)
+    return np.einsum("...mp,...np,...p->...mn", np.conj(u_out), u_in, measure)
+
+def knm(qx_in, qx_out, qy_in, qy_out, delta_x, delta_y, maxtem, wavelength=WAVELENGTH):
+    # 2D coupling (..., modes, modes) over mode_indices(maxtem), with k00,00 made real.
+    kx = knm_1d(qx_in, qx_out, delta_x, maxtem, wavelength)
+    ky = knm_1d(qy_in, qy_out, delta_y, maxtem, wavelength)
+    n, m = np.array(mode_indices(maxtem)).T
+    k = kx[..., n[:, None], n[None, :]] * ky[..., m[:, None], m[None, :]]
+    k00 = k[..., :1, :1]
+    return k * np.where(k00 != 0, np.conj(k00) / np.maximum(np.abs(k00), 1e-300), 1.0)
+
+def gouy_phase(q):
+    return np.arctan2(np.real(q), np.imag(q))
+
+def _same_basis(a, b):
+    return abs(a - b) <= SAME_BASIS_TOLERANCE * max(abs(a), abs(b))
+
+class ModeCoupling:
+    """Coupling matrices for the carrier solver's higher-order-mode solve.
+
+    Matrices are cached per component coupling and per connection
+    direction, keyed by what they depend on (the component's rev, the
+    bases, the length), so after a tilt only that optic's matrices are
+    recomputed; all stale ones are computed together in one NumPy batch.
+    """
+    def __init__(self, model, maxtem, wavelength=WAVELENGTH):
+        self.model = model
+        self.maxtem = maxtem
+        self.wavelength = wavelength
+        self.modes = mode_indices(maxtem)
+        self.tracer = BeamTracer(model, wavelength)
+        self._default_q = q_from_waist(DEFAULT_WAIST, 0.0, wavelength)
+        self._beams = {}
+        self._component_cache = {}  # (comp id, src, dst) -> (key, matrix)
+        self._space_cache = {}      # (conn id, from port) -> (key, gouy diagonal, mismatch matrix or None)
+        self.recomputed = 0         # matrices computed by the last update()
+
+    def close(self):
+        self.tracer.close()
+
+    def update(self):
+        # Re-trace the bases; call once before assembling a system.
+        self._beams = self.trace_bases()
+        self.recomputed = 0
+
+    def trace_bases(self):
+        """{(port id, "i"/"o"): (qx, qy)}, traced from cavities first, then lasers.
+
+        Each seed is propagated breadth-first along the solver's couplings
+        and stops at nodes an earlier seed already reached.
+        """
+        model = self.model
+        seeds = [((cavity.mirrors[0][1], "o"), cavity.q) for cavity in self.tracer.cavities() if cavity.stable]
+        for laser in model.components.values():
+            if laser.comp_type == "laser" and "p1" in laser.ports:
+                w0 = float_property(laser, "w0", DEFAULT_WAIST) or DEFAULT_WAIST
+                q = q_from_waist(w0, float_property(laser, "z"), self.wavelength)
+                seeds.append(((laser.ports["p1"], "o"), (q, q)))
+        bases = {}
+        for seed, q in seeds:
+            if seed in bases:
+                continue
+            bases[seed] = q
+            queue = deque([seed])
+            while queue:
+                node = queue.popleft()
+                for successor, element in self._successors(*node):
+                    if successor in bases:
+                        continue
+                    q = apply_abcd(self.tracer.element_matrix(element), np.array(bases[node]))
+                    bases[successor] = (complex(q[0]), complex(q[1]))
+                    queue.append(successor)
+        return bases
+
+    def _successors(self, port_id, direction):
+        # (next node, ABCD element) for light at port_id travelling in direction.
+        model = self.model
+        if direction == "o":
+            for conn_id in sorted(model.ports[port_id].connection_ids):
+                yield (model.connections[conn_id].other(port_id), "i"), ("space", conn_id)
+            return
+        comp = model.component_of(port_id)
+        port_name = model.ports[port_id].name
+        for src, dst, _ in COUPLINGS.get(comp.comp_type, []):
+            if src == port_name:
+                yield (comp.ports[dst], "o"), ("comp", comp.id, src, dst)
+
+    def basis(self, port_id, direction):
+        # (qx, qy) at a port; light never reaches untraced ones, any basis will do.
+        return self._beams.get((port_id, direction), (self._default_q, self._default_q))
+
+    # -- components --------------------------------------------------------
+    def tilt(self, comp, src, kind):
+        # Deflection (x, y) in radians of a beam reflected at src.
+        if kind not in ("r+", "r-"):
+            return 0.0, 0.0
+        side = 1.0 if src in FRONT_PORTS.get(comp.comp_type, ("p1",)) else -1.0
+        xbeta = float_property(comp, "xbeta")
+        ybeta = float_property(comp, "ybeta")
+        if comp.comp_type != "mirror":
+            # Pitch deflects a beam reflected at angle of incidence alpha by 2 * beta * cos(alpha).
+            ybeta *= math.cos(math.radians(float_property(comp, "alpha")))
+        return 2 * side * xbeta, 2 * side * ybeta
+
+    def component_matrices(self, comps, src, dst, kind):
+        """(len(comps), modes, modes) for one coupling of each of comps."""
+        result = [None] * len(comps)
+        stale = []
+        for i, comp in enumerate(comps):
+            q_in = self.basis(comp.ports[src], "i")
+            q_out = self.basis(comp.ports[dst], "o")
+            key = (comp.rev, q_in, q_out)
+            cached = self._component_cache.get((comp.id, src, dst))
+            if cached is not None and cached[0] == key:
+                result[i] = cached[1]
+            else:
+                abcd = self.tracer.element_matrix(("comp", comp.id, src, dst))
+                image = apply_abcd(abcd, np.array(q_in))
+                stale.append((i, key, image, q_out, self.tilt(comp, src, kind)))
+        if stale:
+            images = np.array([s[2] for s in stale])
+            outs = np.array([s[3] for s in stale])
+            tilts = np.array([s[4] for s in stale])
+            matrices = knm(images[:, 0], outs[:, 0], images[:, 1], outs[:, 1], tilts[:, 0], tilts[:, 1],
+                           self.maxtem, self.wavelength)
+            for (i, key, _, _, _), matrix in zip(stale, matrices):
+                self._component_cache[(comps[i].id, src, dst)] = (key, matrix)
+                result[i] = matrix
+            self.recomputed += len(stale)
+        return np.stack(result) if result else np.zeros((0, len(self.modes), len(self.modes)), dtype=complex)
+
+    # -- spaces ------------------------------------------------------------
+    def space_blocks(self, conns, from_ports):
+        """Per connection, light leaving from_ports[i]: (gouy, mismatch).
+
+        gouy is (len(conns), modes) of relative Gouy phase factors. mismatch
+        is None when every arrival basis is the propagated one, otherwise
+        (len(conns), modes, modes) with identity where there is no mismatch.
+        """
+        n, m = np.array(self.modes).T
+        entries = []
+        stale = []  # (index, key, diagonal, propagated q, arrival q)
+        for i, (conn, port_a) in enumerate(zip(conns, from_ports)):
+            q_a = self.basis(port_a, "o")
+            q_b = self.basis(conn.other(port_a), "i")
+            key = (conn.length, q_a, q_b)
+            cached = self._space_cache.get((conn.id, port_a))
+            if cached is None or cached[0] != key:
+                q_end = (q_a[0] + conn.length, q_a[1] + conn.length)
+                diagonal = np.exp(1j * (n * (gouy_phase(q_end[0]) - gouy_phase(q_a[0]))
+                                        + m * (gouy_phase(q_end[1]) - gouy_phase(q_a[1]))))
+                cached = (key, diagonal, None)
+                if not (_same_basis(q_end[0], q_b[0]) and _same_basis(q_end[1], q_b[1])):
+                    stale.append((i, key, diagonal, q_end, q_b))
+                self._space_cache[(conn.id, port_a)] = cached
+            entries.append(cached)
+        if stale:
+            q_end = np.array([s[3] for s in stale])
+            q_b = np.array([s[4] for s in stale])
+            zeros = np.zeros(len(stale))
+            matrices = knm(q_end[:, 0], q_b[:, 0], q_end[:, 1], q_b[:, 1], zeros, zeros,
+                           self.maxtem, self.wavelength)
+            for (i, key, diagonal, _, _), matrix in zip(stale, matrices):
+                entries[i] = self._space_cache[(conns[i].id, from_ports[i])] = (key, diagonal, matrix)
+            self.recomputed += len(stale)
+        gouy = np.array([entry[1] for entry in entries]).reshape(len(conns), len(self.modes))
+        if all(entry[2] is None for entry in entries):
+            return gouy, None
+        identity = np.eye(len(self.modes), dtype=complex)
+        return gouy, np.stack([identity if entry[2] is None else entry[2] for entry in entries])
+
+    def prune(self):
+        # Drop matrices of components and connections that no longer exist.
+        model = self.model
+        self._component_cache = {key: value for key, value in self._component_cache.items()
+                                  if key[0] in model.components}
+        self._space_cache = {key: value for key, value in self._space_cache.items()
+                             if key[0] in model.connections}
@@ -0,0 +1,281 @@
+import re
+import math
+
+from model import (
+    COMPONENT_PROPERTIES,
+    COMPONENT_ADDED, COMPONENT_REMOVED, COMPONENT_CHANGED,
+    CONNECTION_ADDED, CONNECTION_REMOVED, CONNECTION_CHANGED
+)
+from profiling import PROFILER
+from blocks import is_block_type, block_name, definition_of, member_records
+
+##############################################################################
+#                     Finesse Netlist from the Layout Model                  #
+##############################################################################
+# Finesse element keyword and the prefix used when a component has no name.
+FINESSE_ELEMENTS = {
+    "laser": ("laser", "L"),
+    "mirror": ("mirror", "M"),
+    "BS": ("beamsplitter", "BS"),
+    "beamsplitter_old": ("beamsplitter", "BS"),
+    "lens": ("lens", "f"),
+    "power_detector": ("power_detector_dc", "pd"),
+}
+DETECTOR_TYPES = ("power_detector",)
+# Editor-only keys that are not Finesse parameters (laser w0/z become a gauss command).
+NON_FINESSE_KEYS = ("name", "angle", "node", "w0", "z")
+# Boolean flags are only written when set, matching Finesse's defaults.
+FLAG_KEYS = ("misaligned", "signals_only")
+
+def format_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "inf" if value > 0 else "-inf"
+        return repr(value)
+    return str(value)
+
+def sanitize_name(text):
+    name = re.sub(r"\W", "_", text.strip())
+    if name and name[0].isdigit():
+        name = "_" + name
+    return name
+
+def component_parameters(comp):
+    # Current values, falling back to COMPONENT_PROPERTIES defaults; empty values are omitted.
+    defs = COMPONENT_PROPERTIES.get(comp.comp_type, {})
+    params = []
+    for key, definition in defs.items():
+        if key in NON_FINESSE_KEYS:
+            continue
+        value = comp.properties.get(key, definition.get("default", ""))
+        if value is None or value == "":
+            continue
+        if key in FLAG_KEYS:
+            if str(value).lower() in ("true", "1"):
+                params.append(f"{key}=true")
+            continue
+        params.append(f"{key}={format_value(value)}")
+    for key, value in comp.properties.items():
+        if key not in defs and key not in NON_FINESSE_KEYS and value not in (None, ""):
+            params.append(f"{key}={format_value(value)}")
+    return params
+
+def base_name(comp):
+    name = sanitize_name(str(comp.properties.get("name") or "")) or sanitize_name(comp.label)
+    if not name:
+        fallback = block_name(comp.comp_type) if is_block_type(comp.comp_type) else comp.comp_type
+        prefix = FINESSE_ELEMENTS.get(comp.comp_type, (None, sanitize_name(fallback)))[1]
+        name = f"{prefix}{comp.id}"
+    return name
+
+def finesse_names(model):
+    # Same names NetlistCompiler emits: duplicates after the first get _<id>.
+    names = {}
+    taken = set()
+    for comp_id in sorted(model.components):
+        name = base_name(model.components[comp_id])
+        names[comp_id] = name if name not in taken else f"{name}_{comp_id}"
+        taken.add(name)
+    return names
+
+# Model events that can change the generated script.
+NETLIST_EVENTS = (
+    COMPONENT_ADDED, COMPONENT_REMOVED, COMPONENT_CHANGED,
+    CONNECTION_ADDED, CONNECTION_REMOVED, CONNECTION_CHANGED,
+)
+
+class NetlistCompiler:
+    # Keeps one cached script fragment per component and per connection and
+    # follows model events, so compile() only re-renders what changed.
+    # Detector ports are not optical ports: a connection to a power_detector
+    # gives the detector its node (when "node" is empty) instead of a space.
+    def __init__(self, model):
+        self.model = model
+        self._base_names = {}
+        self._name_owners = {}
+        self._comp_fragments = {}
+        self._conn_fragments = {}
+        self._conn_ends = {conn_id: self._endComponents(conn) for conn_id, conn in model.connections.items()}
+        self._dirty_comps = set(model.components)
+        self._dirty_conns = set(model.connections)
+        self._text = None
+        self.recompiled = 0  # fragments rendered by the last compile()
+        for comp_id, comp in model.components.items():
+            self._claimName(comp_id, self.baseName(comp))
+        model.subscribe(self.onModelEvent)
+
+    def close(self):
+        self.model.unsubscribe(self.onModelEvent)
+
+    # -- names -------------------------------------------------------------
+    def baseName(self, comp):
+        return base_name(comp)
+
+    def _claimName(self, comp_id, name):
+        self._base_names[comp_id] = name
+        self._name_owners.setdefault(name, set()).add(comp_id)
+
+    def _releaseName(self, comp_id):
+        name = self._base_names.pop(comp_id, None)
+        if name is None:
+            return set()
+        owners = self._name_owners[name]
+        owners.discard(comp_id)
+        if not owners:
+            del self._name_owners[name]
+        return set(owners)
+
+    def componentName(self, comp_id):
+        # Duplicate names keep the oldest component's name; later ones get _<id>.
+        name = self._base_names[comp_id]
+        if min(self._name_owners[name]) == comp_id:
+            return name
+        return f"{name}_{comp_id}"
+
+    # -- invalidation ------------------------------------------------------
+    def _touchComponent(self, comp_id):
+        self._dirty_comps.add(comp_id)
+        for conn_id in self.model.component_connections(comp_id):
+            self._dirty_conns.add(conn_id)
+            # The far end may be a detector whose node names this component.
+            conn = self.model.connections[conn_id]
+            for port_id in (conn.port_a, conn.port_b):
+                self._dirty_comps.add(self.model.ports[port_id].component_id)
+
+    def onModelEvent(self, event, obj_id):
+        # Moves and rotations do not appear in the script, so they keep the cached text.
+        if event not in NETLIST_EVENTS:
+            return
+        model = self.model
+        self._text = None
+        if event == COMPONENT_ADDED:
+            self._claimName(obj_id, self.baseName(model.components[obj_id]))
+            self._touchComponent(obj_id)
+        elif event == COMPONENT_CHANGED:
+            new_name = self.baseName(model.components[obj_id])
+            if new_name == self._base_names.get(obj_id):
+                # Spaces and detector nodes only refer to the name, so only this line changes.
+                self._dirty_comps.add(obj_id)
+                return
+            for other in self._releaseName(obj_id) | self._name_owners.get(new_name, set()):
+                self._touchComponent(other)
+            self._claimName(obj_id, new_name)
+            self._touchComponent(obj_id)
+        elif event == COMPONENT_REMOVED:
+            for other in self._releaseName(obj_id):
+                self._touchComponent(other)
+            self._dirty_comps.discard(obj_id)
+            self._comp_fragments.pop(obj_id, None)
+        elif event in (CONNECTION_ADDED, CONNECTION_CHANGED):
+            self._dirty_conns.add(obj_id)
+            self._conn_ends[obj_id] = self._endComponents(model.connections[obj_id])
+            self._dirty_comps.update(self._conn_ends[obj_id])
+        elif event == CONNECTION_REMOVED:
+            self._dirty_conns.discard(obj_id)
+            self._conn_fragments.pop(obj_id, None)
+            # A detector may have taken its node from this connection.
+            for comp_id in self._conn_ends.pop(obj_id, ()):
+                if comp_id in model.components:
+                    self._dirty_comps.add(comp_id)
+
+    def _endComponents(self, conn):
+        return (self.model.ports[conn.port_a].component_id, self.model.ports[conn.port_b].component_id)
+
+    # -- rendering ---------------------------------------------------------
+    def portNode(self, port_id):
+        port = self.model.ports[port_id]
+        comp = self.model.components[port.component_id]
+        if is_block_type(comp.comp_type):
+            definition = definition_of(self.model, comp)
+            index, member_port = definition.exposed[port.name]
+            return f"{self.componentName(comp.id)}_{definition.members[index].key}.{member_port}"
+        return f"{self.componentName(comp.id)}.{port.name}"
+
+    def _exposesDetector(self, comp, port_name):
+        definition = definition_of(self.model, comp)
+        return definition.members[definition.exposed[port_name][0]].comp_type in DETECTOR_TYPES
+
+    def detectorNode(self, comp):
+        node = str(comp.properties.get("node") or "").strip()
+        if node:
+            return node if node.count(".") >= 2 else node + ".o"
+        for port_id in comp.ports.values():
+            for conn_id in self.model.ports[port_id].connection_ids:
+                other = self.model.connections[conn_id].other(port_id)
+                if self.model.component_of(other).comp_type not in DETECTOR_TYPES:
+                    return self.portNode(other) + ".o"
+        return ""
+
+    def renderBlock(self, comp, name):
+        # Members are named <instance>_<member>; internal connections become spaces.
+        definition = definition_of(self.model, comp)
+        if definition is None:
+            return f"# {comp.comp_type} {name}: block is not defined"
+        records = member_records(definition, comp.properties, name)
+        lines = [f"# block {definition.name} {name}"]
+        lines.extend(self.renderComponent(record, record.properties["name"]) for record in records)
+        for k, (a, port_a, b, port_b, length) in enumerate(definition.connections):
+            if records[a].comp_type in DETECTOR_TYPES or records[b].comp_type in DETECTOR_TYPES:
+                continue
+            lines.append(f"space s{name}_{k} portA={records[a].properties['name']}.{port_a} "
+                         f"portB={records[b].properties['name']}.{port_b} L={format_value(length)}")
+        return "\n".join(lines)
+
+    def renderComponent(self, comp, name=None):
+        name = name or self.componentName(comp.id)
+        if is_block_type(comp.comp_type):
+            return self.renderBlock(comp, name)
+        element = FINESSE_ELEMENTS.get(comp.comp_type)
+        if element is None:
+            return f"# {comp.comp_type} {name}: no Finesse equivalent"
+        if comp.comp_type in DETECTOR_TYPES:
+            node = self.detectorNode(comp)
+            if not node:
+                return f"# {element[0]} {name}: no node set"
+            return f"{element[0]} {name} node={node}"
+        line = " ".join([element[0], name] + component_parameters(comp))
+        if comp.comp_type == "laser" and comp.properties.get("w0") not in (None, ""):
+            z = comp.properties.get("z")
+            line += (f"\ngauss g{name} {name}.p1.o w0={format_value(comp.properties['w0'])} "
+                     f"z={format_value(z if z not in (None, '') else 0.0)}")
+        return line
+
+    def renderConnection(self, conn):
+        ports = (self.model.ports[conn.port_a], self.model.ports[conn.port_b])
+        for port in ports:
+            comp = self.model.components[port.component_id]
+            if is_block_type(comp.comp_type):
+                if definition_of(self.model, comp) is None or self._exposesDetector(comp, port.name):
+                    return None
+            elif comp.comp_type in DETECTOR_TYPES or comp.comp_type not in FINESSE_ELEMENTS:
+                return None
+        return (f"space s{conn.id} portA={self.portNode(conn.port_a)} "
+                f"portB={self.portNode(conn.port_b)} L={format_value(conn.length)}")
+
+    def compile(self):
+        if self._text is not None and not self._dirty_comps and not self._dirty_conns:
+            self.recompiled = 0
+            return self._text
+        model = self.model
+        self.recompiled = len(self._dirty_comps) + len(self._dirty_conns)
+        PROFILER.count("netlist.compiles")
+        PROFILER.count("netlist.fragments", self.recompiled)
+        for comp_id in self._dirty_comps:
+            comp = model.components.get(comp_id)
+            if comp is not None:
+                self._comp_fragments[comp_id] = self.renderComponent(comp)
+        for conn_id in self._dirty_conns:
+            conn = model.connections.get(conn_id)
+            if conn is not None:
+                self._conn_fragments[conn_id] = self.renderConnection(conn)
+        self._dirty_comps.clear()
+        self._dirty_conns.clear()
+        optics, detectors = [], []
+        for comp_id, comp in model.components.items():
+            (detectors if comp.comp_type in DETECTOR_TYPES else optics).append(self._comp_fragments[comp_id])
+        spaces = [f for f in (self._conn_fragments[c] for c in model.connections) if f is not None]
+        sections = [["# Generated by OpticsGPT layout editor"], optics, spaces, detectors]
+        self._text = "\n".join(line for section in sections for line in section) + "\n"
+        return self._text
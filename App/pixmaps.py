@@ -0,0 +1,105 @@
+import os
+import glob
+
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtCore import Qt
+
+from cache import cache_path
+
+##############################################################################
+#                          Component Pixmap Library                          #
+##############################################################################
+COMPONENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "components")
+
+# Palette entries and the image each one uses from COMPONENTS_DIR.
+COMPONENT_IMAGES = {
+    "lens": "b-lens2.png",
+    "BS": "b-bspcube.png",
+    "beamsplitter_old": "b-bsp.png",
+    "mirror": "b-mir.png",
+    "laser": "c-laser1.png",
+    "power_detector": "e-pd1.png",
+    "faraday_isolator": "c-isolator.png",
+}
+
+ICON_SIZE = 80
+# Pre-scaled variants kept on disk; the 80 px one is what items are built from.
+ZOOM_SIZES = (40, 80, 160)
+
+class PixmapLibrary:
+    # Images are found under COMPONENTS_DIR on first use, scaled once per
+    # size and shared by every OpticalComponent of the same type. Scaled
+    # variants are cached on disk, keyed by the source file's mtime.
+    def __init__(self, directory=COMPONENTS_DIR, images=COMPONENT_IMAGES, disk_cache=True):
+        self.directory = directory
+        self.images = dict(images)
+        self.disk_cache = disk_cache
+        self._files = None
+        self._pixmaps = {}
+
+    # Mapping-style access so the library can stand in for the old images dict.
+    def __contains__(self, comp_type):
+        return comp_type in self.images
+    def keys(self):
+        return self.images.keys()
+    def get(self, comp_type, default=None):
+        if comp_type not in self.images:
+            return default
+        return self.pixmap(comp_type)
+
+    def files(self):
+        if self._files is None:
+            self._files = {
+                os.path.basename(path): path
+                for path in glob.glob(os.path.join(self.directory, "*.png"))
+            }
+        return self._files
+
+    def sizeForZoom(self, zoom):
+        wanted = ICON_SIZE * zoom
+        for size in ZOOM_SIZES:
+            if size >= wanted:
+                return size
+        return ZOOM_SIZES[-1]
+
+    def pixmap(self, comp_type, size=ICON_SIZE):
+        key = (comp_type, size)
+        pixmap = self._pixmaps.get(key)
+        if pixmap is None:
+            pixmap = self._load(self.images.get(comp_type, comp_type + ".png"), size)
+            self._pixmaps[key] = pixmap
+        return pixmap
+
+    def _load(self, filename, size):
+        path = self.files().get(filename)
+        if path is None:
+            print(f"Warning: could not find image {filename} in {self.directory}")
+            return QPixmap()
+        cached = None
+        if self.disk_cache:
+            stem = os.path.splitext(filename)[0]
+            cached = os.path.join(cache_path("pixmaps"), f"{stem}@{size}-{int(os.path.getmtime(path))}.png")
+            if os.path.exists(cached):
+                pixmap = QPixmap(cached)
+                if not pixmap.isNull():
+                    return pixmap
+        pixmap = QPixmap(path)
+        if pixmap.isNull():
+            print(f"Warning: could not load image at {path}")
+            return pixmap
+        pixmap = pixmap.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if cached is not None:
+            self._prune(os.path.basename(cached))
+            pixmap.save(cached, "PNG")
+        return pixmap
+
+    def _prune(self, keep):
+        # Drop variants of the same image and size left over from an older source file.
+        prefix = keep.rsplit("-", 1)[0] + "-"
+        directory = cache_path("pixmaps")
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name != keep:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
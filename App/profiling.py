@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+##############################################################################
+#                 Opt-in Counters, Latency Histograms and Traces             #
+##############################################################################
+# Off unless OPTICSGPT_PROFILE=1 or enabled from the View menu. While off,
+# an instrumented call costs one attribute check.
+TRACE_CAPACITY = 200000  # most recent spans kept for export
+# Histogram bucket upper bounds in seconds: 1 us to ~17 s, doubling.
+BUCKET_BOUNDS = tuple(1e-6 * 2 ** i for i in range(25))
+
+class Histogram:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the given fraction, capped at the maximum seen.
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+class Profiler:
+    def __init__(self, enabled=False, trace_capacity=TRACE_CAPACITY):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.events = deque(maxlen=trace_capacity)  # (name, start s, duration s, thread id)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.events.clear()
+            self._origin = time.perf_counter()
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def start(self):
+        # For spans that end in another call (or thread); pair with finish().
+        return time.perf_counter() if self.enabled else None
+
+    def finish(self, name, started):
+        if started is None or not self.enabled:
+            return
+        self.record(name, started, time.perf_counter() - started)
+
+    def record(self, name, started, duration):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(duration)
+        self.events.append((name, started, duration, threading.get_ident()))
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started, time.perf_counter() - started)
+
+    def summary(self, limit=None):
+        """(name, count, mean s, p50 s, p95 s, max s) sorted by total time."""
+        with self._lock:
+            rows = [(name, h.count, h.mean(), h.percentile(0.5), h.percentile(0.95), h.max, h.total)
+                    for name, h in self.histograms.items()]
+        rows.sort(key=lambda row: row[-1], reverse=True)
+        return [row[:-1] for row in rows[:limit]]
+
+    def chrome_trace(self):
+        """The recorded spans and counters in Chrome trace-event format (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": (started - self._origin) * 1e6, "dur": duration * 1e6,
+                   "pid": pid, "tid": tid, "cat": name.split(".", 1)[0]}
+                  for name, started, duration, tid in list(self.events)]
+        now = (time.perf_counter() - self._origin) * 1e6
+        with self._lock:
+            counters = dict(self.counters)
+        events.extend({"name": name, "ph": "C", "ts": now, "pid": pid, "tid": 0, "args": {"value": value}}
+                      for name, value in counters.items())
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+PROFILER = Profiler(enabled=os.environ.get("OPTICSGPT_PROFILE", "") not in ("", "0"))
+
+def profiled(name):
+    """Decorator timing each call of the wrapped function under name while profiling is on."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(name, started, time.perf_counter() - started)
+        return wrapper
+    return decorate
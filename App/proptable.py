@@ -0,0 +1,206 @@
+import numpy as np
+
+from model import COMPONENT_PROPERTIES
+from netlist import format_value
+
+##############################################################################
+#                 Columnar Property Table for Bulk Editing                   #
+##############################################################################
+# Bounds checked by PropertyTable.validate(), inclusive.
+PROPERTY_BOUNDS = {
+    "R": (0.0, 1.0),
+    "T": (0.0, 1.0),
+    "L": (0.0, 1.0),
+    "P": (0.0, np.inf),
+}
+# Keys whose sum may not exceed one (energy conservation).
+POWER_FRACTIONS = ("R", "T", "L")
+TRUE_TEXT = ("true", "1", "yes")
+FALSE_TEXT = ("false", "0", "no", "")
+
+def _normalised_text(texts):
+    return np.char.lower(np.char.strip(np.asarray(texts, dtype=str)))
+
+def parse_floats(texts):
+    """Parse an array of strings to float64; "" (unset) becomes NaN.
+
+    Raises ValueError naming the values that are not numbers.
+    """
+    text = _normalised_text(texts)
+    text = np.where(text == "", "nan", text)
+    text = np.where(np.char.endswith(text, "infty"), np.char.replace(text, "infty", "inf"), text)
+    try:
+        return text.astype(np.float64)
+    except ValueError:
+        pass
+    bad = []
+    for value in text.tolist():
+        try:
+            float(value)
+        except ValueError:
+            bad.append(repr(value))
+    raise ValueError(f"not a number: {', '.join(bad[:10])}")
+
+def parse_bools(texts):
+    text = _normalised_text(texts)
+    true = np.isin(text, TRUE_TEXT)
+    bad = ~(true | np.isin(text, FALSE_TEXT))
+    if bad.any():
+        raise ValueError(f"expected True or False, not {', '.join(map(repr, text[bad][:10].tolist()))}")
+    return true
+
+def is_default(definition, value):
+    """True if value equals definition's default, compared as its type (0.0 is "0")."""
+    kind = definition.get("type", "str")
+    default = PropertyTable._as_text(definition.get("default", ""))
+    if kind in ("float", "int"):
+        try:
+            value, default = parse_floats([PropertyTable._as_text(value), default])
+        except ValueError:
+            return False
+        return bool(value == default)
+    if kind == "bool":
+        try:
+            value, default = parse_bools([PropertyTable._as_text(value), default])
+        except ValueError:
+            return False
+        return bool(value == default)
+    return str(value) == default
+
+def stored_properties(values, prop_defs):
+    # The dialog's values minus unset ones and defaults, as display_label expects.
+    return {key: value for key, value in values.items()
+            if value is not None and value != "" and not is_default(prop_defs.get(key, {}), value)}
+
+class PropertyTable:
+    """Properties of components of one type, held as one NumPy column per key.
+
+    Float columns use NaN for "unset", bool columns are bool arrays and text
+    columns are object arrays. Edits parse and validate whole columns at
+    once; apply() writes only the rows that changed back to the model,
+    storing values that differ from the defaults as edit_properties does.
+    """
+    def __init__(self, model, comp_ids):
+        comps = [model.components[comp_id] for comp_id in comp_ids]
+        types = {comp.comp_type for comp in comps}
+        if len(types) != 1:
+            raise ValueError("a property table holds components of exactly one type")
+        self.model = model
+        self.comp_type = types.pop()
+        self.ids = list(comp_ids)
+        self.defs = {key: definition for key, definition in COMPONENT_PROPERTIES.get(self.comp_type, {}).items()
+                     if key != "angle"}
+        self.keys = list(self.defs)
+        self.columns = {}
+        self.defaults = {}
+        for key, definition in self.defs.items():
+            default = definition.get("default", "")
+            texts = [self._as_text(comp.properties.get(key, default)) for comp in comps]
+            self.columns[key] = self._parse(key, texts)
+            self.defaults[key] = self._parse(key, [self._as_text(default)])[0]
+        self._original = {key: column.copy() for key, column in self.columns.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _as_text(value):
+        return "" if value is None else format_value(value) if not isinstance(value, str) else value
+
+    def kind(self, key):
+        return self.defs[key].get("type", "str")
+
+    def _parse(self, key, texts):
+        kind = self.kind(key)
+        if kind in ("float", "int"):
+            return parse_floats(texts)
+        if kind == "bool":
+            return parse_bools(texts)
+        return np.array([str(text) for text in texts], dtype=object)
+
+    def text(self, row, key):
+        value = self.columns[key][row]
+        kind = self.kind(key)
+        if kind in ("float", "int"):
+            return "" if np.isnan(value) else format_value(float(value))
+        if kind == "bool":
+            return "True" if value else "False"
+        return value
+
+    def set_values(self, key, rows, texts):
+        """Set column key at rows (None for every row); texts is one string or one per row."""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.intp)
+        if isinstance(texts, str):
+            values = np.repeat(self._parse(key, [texts]), len(rows))
+        else:
+            values = self._parse(key, texts)
+        self.columns[key][rows] = values
+
+    def validate(self):
+        """(row, key, message) for every invalid cell."""
+        problems = []
+        for key, (low, high) in PROPERTY_BOUNDS.items():
+            if key not in self.columns or self.kind(key) != "float":
+                continue
+            column = self.columns[key]
+            for row in np.flatnonzero((column < low) | (column > high)):
+                problems.append((int(row), key, f"{key} must be between {format_value(low)} and {format_value(high)}"))
+        fractions = [key for key in POWER_FRACTIONS if key in self.columns]
+        if len(fractions) > 1:
+            total = np.nansum(np.stack([self.columns[key] for key in fractions]), axis=0)
+            for row in np.flatnonzero(total > 1 + 1e-9):
+                problems.append((int(row), fractions[0], f"{'+'.join(fractions)} exceeds 1"))
+        if "name" in self.columns:
+            names = self.columns["name"].astype(str)
+            _, inverse, counts = np.unique(names, return_inverse=True, return_counts=True)
+            duplicated = (counts[inverse] > 1) & (names != "")
+            for row in np.flatnonzero(duplicated):
+                problems.append((int(row), "name", f"name '{names[row]}' is used more than once"))
+        return problems
+
+    def changed_rows(self):
+        changed = np.zeros(len(self), dtype=bool)
+        for key, column in self.columns.items():
+            original = self._original[key]
+            if self.kind(key) in ("float", "int"):
+                changed |= ~((column == original) | (np.isnan(column) & np.isnan(original)))
+            else:
+                changed |= column != original
+        return np.flatnonzero(changed)
+
+    def changes(self):
+        """Component id -> new properties dict, for the rows that were edited."""
+        rows = self.changed_rows()
+        if not len(rows):
+            return {}
+        stored = {}
+        for key, column in self.columns.items():
+            values = column[rows]
+            default = self.defaults[key]
+            if self.kind(key) in ("float", "int"):
+                keep = ~np.isnan(values) & (values != default)
+            elif self.kind(key) == "bool":
+                keep = values != default
+            else:
+                keep = (values != default) & (values != "")
+            stored[key] = (keep.tolist(), values.tolist())
+        result = {}
+        for i, row in enumerate(rows.tolist()):
+            comp_id = self.ids[row]
+            properties = {key: value for key, value in self.model.components[comp_id].properties.items()
+                          if key not in self.columns}
+            for key, (keep, values) in stored.items():
+                if keep[i]:
+                    properties[key] = values[i]
+            result[comp_id] = properties
+        return result
+
+    def apply(self):
+        """Write the edited rows to the model as one batch; returns how many changed."""
+        changes = self.changes()
+        with self.model.batch():
+            for comp_id, properties in changes.items():
+                if comp_id in self.model.components:
+                    self.model.set_properties(comp_id, properties)
+        self._original = {key: column.copy() for key, column in self.columns.items()}
+        return len(changes)
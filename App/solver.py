@@ -0,0 +1,286 @@
+import math
+import cmath
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+from model import (
+    COMPONENT_PROPERTIES, COUPLINGS,
+    COMPONENT_ADDED, COMPONENT_REMOVED, COMPONENT_CHANGED,
+    CONNECTION_ADDED, CONNECTION_REMOVED, CONNECTION_CHANGED
+)
+from netlist import DETECTOR_TYPES, finesse_names
+from connectivity import resolve_node
+from profiling import PROFILER
+
+##############################################################################
+#                     Plane-wave Carrier Solver (sparse)                     #
+##############################################################################
+# Unknowns are the outgoing field amplitudes b at every port, with |b|^2 in
+# watts. Connections propagate b into the incoming field a at the far port,
+# a = P b, and each component scatters a back out, b = S a + s, where s
+# holds the laser sources. So (I - S P) b = s is solved once per carrier
+# frequency. Conventions follow Finesse: reflection r*exp(+-2i*phi) on the
+# front/back side and transmission i*t. As in Finesse, space lengths are
+# taken as whole multiples of the wavelength: a space only applies the
+# phase of the carrier's frequency offset, and cavities are tuned by phi.
+# With maxtem set, every port carries Hermite-Gauss modes up to that order
+# and each coupling becomes a block built by modes.ModeCoupling, so tilts
+# (xbeta/ybeta), curvature and beam mismatch move power between modes.
+WAVELENGTH = 1064e-9
+SPEED_OF_LIGHT = 299792458.0
+
+def float_property(comp, key, fallback=0.0):
+    value = comp.properties.get(key)
+    if value is None or value == "":
+        value = COMPONENT_PROPERTIES.get(comp.comp_type, {}).get(key, {}).get("default", "")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return fallback
+
+def bool_property(comp, key):
+    value = comp.properties.get(key, False)
+    return value is True or str(value).lower() in ("true", "1")
+
+def reflectivities(comps):
+    # Vectorised R/T with Finesse-style fill-in when only some of R, T, L are set.
+    R = np.array([float_property(c, "R", math.nan) for c in comps])
+    T = np.array([float_property(c, "T", math.nan) for c in comps])
+    L = np.nan_to_num(np.array([float_property(c, "L", 0.0) for c in comps]))
+    R = np.where(np.isnan(R), np.where(np.isnan(T), 0.5 * (1 - L), 1 - T - L), R)
+    T = np.where(np.isnan(T), 1 - R - L, T)
+    return np.sqrt(np.clip(R, 0, 1)), np.sqrt(np.clip(T, 0, 1))
+
+class CarrierSolution:
+    def __init__(self, solver, outgoing, incoming, width=1):
+        self.solver = solver
+        self.outgoing = outgoing  # frequency offset -> b vector (one column per source set)
+        self.incoming = incoming
+        self.width = width
+
+    def port_power(self, port_id, direction="o", columns=False):
+        # Power summed over carrier frequencies and modes; columns=True keeps
+        # one value per right-hand-side column (batched source settings).
+        rows = self.solver.mode_rows(port_id)
+        fields = self.outgoing if direction == "o" else self.incoming
+        power = sum(((np.abs(v[rows]) ** 2).sum(axis=0) for v in fields.values()), np.zeros(self.width))
+        return power if columns else float(power[0])
+
+    def detector_powers(self, columns=False):
+        powers = {}
+        for name, (port_id, direction) in self.solver.detectors().items():
+            if port_id is None:
+                powers[name] = np.full(self.width, np.nan) if columns else None
+            else:
+                powers[name] = self.port_power(port_id, direction, columns)
+        return powers
+
+class CarrierSolver:
+    # Keeps the assembled system and its LU factorisation between solves.
+    # Laser P/phase edits only rebuild the source vector; any other optical
+    # edit (R/T/L/phi, connections, lengths, laser frequency) refactorises.
+    def __init__(self, model, wavelength=WAVELENGTH, maxtem=None):
+        self.model = model
+        self.wavelength = wavelength
+        self.maxtem = maxtem
+        self.modes = None
+        self.mode_count = 1
+        if maxtem is not None:
+            from modes import ModeCoupling
+            self.modes = ModeCoupling(model, maxtem, wavelength)
+            self.mode_count = len(self.modes.modes)
+        self.port_index = {}
+        self._factors = {}
+        self._matrix_dirty = True
+        self._detectors = None
+        self.factorisations = 0
+        model.subscribe(self.onModelEvent)
+
+    def close(self):
+        self.model.unsubscribe(self.onModelEvent)
+        if self.modes is not None:
+            self.modes.close()
+
+    def onModelEvent(self, event, obj_id):
+        if event in (COMPONENT_CHANGED, COMPONENT_ADDED, COMPONENT_REMOVED):
+            self._detectors = None  # names or nodes may have changed
+        if event == COMPONENT_CHANGED:
+            comp = self.model.components[obj_id]
+            if comp.comp_type == "laser":
+                # With modes, w0/z set the bases everything is expressed in.
+                if self.modes is not None or float_property(comp, "f") not in self._factors:
+                    self._matrix_dirty = True
+                return
+            if comp.comp_type in DETECTOR_TYPES:
+                return
+        if event in (COMPONENT_ADDED, COMPONENT_REMOVED, COMPONENT_CHANGED,
+                     CONNECTION_ADDED, CONNECTION_REMOVED, CONNECTION_CHANGED):
+            self._matrix_dirty = True
+
+    # -- assembly ----------------------------------------------------------
+    def _index_ports(self):
+        self.port_index = {port_id: i for i, port_id in enumerate(self.model.ports)}
+
+    def mode_rows(self, port_id):
+        # Rows of a port's fields in the solution vectors, one per mode.
+        start = self.port_index[port_id] * self.mode_count
+        return slice(start, start + self.mode_count)
+
+    def _block_entries(self, rows, cols, blocks):
+        # Per-port (rows, cols) and (len, modes, modes) blocks -> flat COO entries.
+        count = self.mode_count
+        offsets = np.arange(count)
+        r = np.broadcast_to(rows[:, None, None] * count + offsets[None, :, None], blocks.shape)
+        c = np.broadcast_to(cols[:, None, None] * count + offsets[None, None, :], blocks.shape)
+        return r.ravel(), c.ravel(), blocks.ravel()
+
+    def scattering_matrix(self):
+        model = self.model
+        n = len(self.port_index)
+        rows, cols, vals = [], [], []
+        by_type = {}
+        for comp in model.components.values():
+            if comp.comp_type in COUPLINGS:
+                by_type.setdefault(comp.comp_type, []).append(comp)
+        for comp_type, comps in by_type.items():
+            if comp_type == "lens":
+                r = t = phase = np.zeros(len(comps))
+            else:
+                r, t = reflectivities(comps)
+                phi = np.radians([float_property(c, "phi") for c in comps])
+                alpha = np.radians([float_property(c, "alpha") for c in comps])
+                phase = 2 * phi * np.cos(alpha)
+                misaligned = np.array([bool_property(c, "misaligned") for c in comps])
+                r = np.where(misaligned, 0.0, r)
+            coeff = {"r+": r * np.exp(1j * phase), "r-": r * np.exp(-1j * phase),
+                     "t": 1j * t, "1": np.ones(len(comps), dtype=complex)}
+            for src, dst, kind in COUPLINGS[comp_type]:
+                dst_index = np.array([self.port_index[c.ports[dst]] for c in comps])
+                src_index = np.array([self.port_index[c.ports[src]] for c in comps])
+                values = np.asarray(coeff[kind], dtype=complex)
+                if self.modes is not None:
+                    blocks = values[:, None, None] * self.modes.component_matrices(comps, src, dst, kind)
+                    dst_index, src_index, values = self._block_entries(dst_index, src_index, blocks)
+                rows.append(dst_index)
+                cols.append(src_index)
+                vals.append(values)
+        n *= self.mode_count
+        if not rows:
+            return sp.csr_matrix((n, n), dtype=complex)
+        return sp.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(n, n))
+
+    def propagation_matrix(self, frequency_offset):
+        model = self.model
+        conns = list(model.connections.values())
+        n = len(self.port_index) * self.mode_count
+        if not conns:
+            return sp.csr_matrix((n, n), dtype=complex)
+        a = np.array([self.port_index[c.port_a] for c in conns])
+        b = np.array([self.port_index[c.port_b] for c in conns])
+        lengths = np.array([c.length for c in conns])
+        phase = np.exp(-2j * np.pi * frequency_offset * lengths / SPEED_OF_LIGHT)
+        if self.modes is None:
+            return sp.csr_matrix((np.concatenate([phase, phase]), (np.concatenate([a, b]), np.concatenate([b, a]))),
+                                 shape=(n, n))
+        rows, cols, vals = [], [], []
+        for start, end, leaving in ((a, b, [c.port_a for c in conns]), (b, a, [c.port_b for c in conns])):
+            gouy, mismatch = self.modes.space_blocks(conns, leaving)
+            if mismatch is None:
+                # Diagonal: each mode keeps its order, picking up its Gouy phase.
+                offsets = np.arange(self.mode_count)
+                rows.append((end[:, None] * self.mode_count + offsets).ravel())
+                cols.append((start[:, None] * self.mode_count + offsets).ravel())
+                vals.append((phase[:, None] * gouy).ravel())
+            else:
+                r, c, v = self._block_entries(end, start, phase[:, None, None] * mismatch * gouy[:, None, :])
+                rows.append(r)
+                cols.append(c)
+                vals.append(v)
+        return sp.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n))
+
+    def lasers(self):
+        return [c for c in self.model.components.values() if c.comp_type == "laser" and "p1" in c.ports]
+
+    def _factorise(self):
+        self._index_ports()
+        self._factors = {}
+        if self.modes is not None:
+            self.modes.update()
+            self.modes.prune()
+        S = self.scattering_matrix()
+        n = len(self.port_index) * self.mode_count
+        for f in sorted({float_property(c, "f") for c in self.lasers()}):
+            P = self.propagation_matrix(f)
+            system = (sp.identity(n, dtype=complex, format="csc") - (S @ P).tocsc())
+            try:
+                lu = spla.splu(system)
+            except RuntimeError as e:
+                raise ValueError(f"Layout has a lossless closed cavity; carrier field is undefined ({e})")
+            self._factors[f] = (lu, P)
+            self.factorisations += 1
+            PROFILER.count("solver.factorisations")
+        self._matrix_dirty = False
+
+    def source_vectors(self, overrides=None):
+        # overrides: {laser component id: (power array, phase-degrees array)} for
+        # batched evaluation; each batch point becomes one right-hand-side column.
+        overrides = overrides or {}
+        n = len(self.port_index) * self.mode_count
+        width = max([len(np.atleast_1d(v[0])) for v in overrides.values()] + [1])
+        sources = {}
+        for laser in self.lasers():
+            f = float_property(laser, "f")
+            power, phase = overrides.get(laser.id, (float_property(laser, "P", 1.0), float_property(laser, "phase")))
+            amplitude = np.sqrt(np.clip(np.broadcast_to(np.asarray(power, dtype=float), (width,)), 0, None))
+            amplitude = amplitude * np.exp(1j * np.radians(np.broadcast_to(np.asarray(phase, dtype=float), (width,))))
+            vec = sources.setdefault(f, np.zeros((n, width), dtype=complex))
+            vec[self.mode_rows(laser.ports["p1"]).start] += amplitude  # HG00 of the laser's beam
+        return sources
+
+    def solve(self, overrides=None):
+        if self._matrix_dirty:
+            self._factorise()
+        outgoing, incoming = {}, {}
+        width = 1
+        for f, rhs in self.source_vectors(overrides).items():
+            lu, P = self._factors[f]
+            b = lu.solve(rhs)
+            outgoing[f] = b
+            incoming[f] = P @ b
+            width = rhs.shape[1]
+        return CarrierSolution(self, outgoing, incoming, width)
+
+    # -- detectors ---------------------------------------------------------
+    def detectors(self):
+        # detector name -> (port id, "o"/"i"), resolved from the "node"
+        # property ("M1.p2" or "M1.p2.o") or from the detector's own wiring.
+        if self._detectors is not None:
+            return self._detectors
+        model = self.model
+        names = finesse_names(model)
+        by_name = {name: model.components[comp_id] for comp_id, name in names.items()}
+        result = {}
+        for comp in model.components.values():
+            if comp.comp_type not in DETECTOR_TYPES:
+                continue
+            target = None
+            node = str(comp.properties.get("node") or "").strip()
+            if node:
+                try:
+                    target = resolve_node(node, by_name)
+                except ValueError:
+                    pass
+            else:
+                for port_id in comp.ports.values():
+                    if model.ports[port_id].connection_ids:
+                        target = (port_id, "i")  # light arriving at the detector
+                        break
+            result[names[comp.id]] = target if target is not None else (None, "o")
+        self._detectors = result
+        return result
+
+def detector_powers(model, maxtem=None):
+    return CarrierSolver(model, maxtem=maxtem).solve().detector_powers()
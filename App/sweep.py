@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model import COMPONENT_PROPERTIES, LayoutModel
+from layout_io import snapshot_records, apply_record
+from solver import CarrierSolver, WAVELENGTH, float_property
+from cache import cache_path
+
+##############################################################################
+#                        Parameter Sweeps (cached, parallel)                 #
+##############################################################################
+# Bump when the solver or the result layout changes so old cache entries are ignored.
+SWEEP_CACHE_VERSION = 2
+# Laser parameters that only change the solver's right-hand side.
+SOURCE_PARAMETERS = ("P", "phase")
+# Matrix-changing points per process-pool task; below one chunk the sweep runs in-process.
+CHUNK_SIZE = 64
+
+def sweepable_parameters(comp_type):
+    # The numeric fields PropertiesDialog shows for this type (angle is layout-only).
+    return [key for key, definition in COMPONENT_PROPERTIES.get(comp_type, {}).items()
+            if definition.get("type") == "float" and key != "angle"]
+
+class SweepAxis:
+    __slots__ = ("comp_id", "key", "values")
+    def __init__(self, comp_id, key, values):
+        self.comp_id = comp_id
+        self.key = key
+        self.values = np.asarray(values, dtype=float)
+    def spec(self):
+        return [self.comp_id, self.key, self.values.tolist()]
+
+class SweepResult:
+    def __init__(self, axes, detectors, powers, cached=False):
+        self.axes = axes
+        self.detectors = list(detectors)
+        self.powers = powers  # shape: [len(axis) for axis in axes] + [len(detectors)]
+        self.cached = cached
+
+    def detector(self, name):
+        return self.powers[..., self.detectors.index(name)]
+
+def canonical_layout(model):
+    # Everything that affects the optics; positions and rotations are left out.
+    comps = [[c.id, c.comp_type, c.label, sorted((k, repr(v)) for k, v in c.properties.items()),
+              list(c.ports.values())]
+             for c in sorted(model.components.values(), key=lambda c: c.id)]
+    conns = [[k.id, k.port_a, k.port_b, repr(k.length)]
+             for k in sorted(model.connections.values(), key=lambda k: k.id)]
+    return {"components": comps, "connections": conns}
+
+def sweep_key(model, axes, wavelength=WAVELENGTH, maxtem=None):
+    payload = {
+        "version": SWEEP_CACHE_VERSION,
+        "wavelength": repr(wavelength),
+        "layout": canonical_layout(model),
+        "axes": [axis.spec() for axis in axes],
+    }
+    if maxtem is not None:
+        payload["maxtem"] = maxtem
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _is_source_axis(model, axis):
+    return model.components[axis.comp_id].comp_type == "laser" and axis.key in SOURCE_PARAMETERS
+
+def _evaluate(records, wavelength, matrix_axes, combos, source_axes, maxtem=None):
+    # Worker entry point: rebuild the layout, then for each combination of
+    # matrix-axis values refactorise once and solve every source-axis point
+    # as one batch of right-hand-side columns.
+    model = LayoutModel()
+    for record in records:
+        apply_record(model, record)
+    solver = CarrierSolver(model, wavelength, maxtem)
+    source_grid = list(itertools.product(*[values for _, _, values in source_axes])) or [()]
+    overrides = {}
+    for (comp_id, key, _), values in zip(source_axes, zip(*source_grid)):
+        laser = model.components[comp_id]
+        power_phase = overrides.setdefault(comp_id, [np.full(len(source_grid), float_property(laser, "P", 1.0)),
+                                                     np.full(len(source_grid), float_property(laser, "phase"))])
+        power_phase[SOURCE_PARAMETERS.index(key)] = np.asarray(values, dtype=float)
+    names, rows = None, []
+    for combo in combos:
+        for (comp_id, key, _), value in zip(matrix_axes, combo):
+            props = dict(model.components[comp_id].properties)
+            props[key] = float(value)
+            model.set_properties(comp_id, props)
+        powers = solver.solve({k: tuple(v) for k, v in overrides.items()}).detector_powers(columns=True)
+        names = list(powers)
+        rows.append(np.array([powers[name] for name in names]).T if names else np.zeros((len(source_grid), 0)))
+    return names or [], np.array(rows)
+
+def run_sweep(model, axes, wavelength=WAVELENGTH, max_workers=None, use_cache=True, maxtem=None):
+    """Evaluate detector powers over the grid spanned by one or more SweepAxis.
+
+    maxtem: highest Hermite-Gauss mode order to solve with (None: plane waves).
+    """
+    key = sweep_key(model, axes, wavelength, maxtem)
+    cache_file = os.path.join(cache_path("sweeps"), key + ".npz")
+    if use_cache and os.path.exists(cache_file):
+        with np.load(cache_file, allow_pickle=False) as data:
+            return SweepResult(axes, data["detectors"].tolist(), data["powers"], cached=True)
+    matrix_idx = [i for i, axis in enumerate(axes) if not _is_source_axis(model, axis)]
+    source_idx = [i for i, axis in enumerate(axes) if _is_source_axis(model, axis)]
+    matrix_axes = [axes[i].spec() for i in matrix_idx]
+    source_axes = [axes[i].spec() for i in source_idx]
+    combos = list(itertools.product(*[axes[i].values.tolist() for i in matrix_idx])) or [()]
+    records = snapshot_records(model)
+    chunks = [combos[i:i + CHUNK_SIZE] for i in range(0, len(combos), CHUNK_SIZE)]
+    if len(chunks) == 1 or max_workers == 1:
+        parts = [_evaluate(records, wavelength, matrix_axes, chunk, source_axes, maxtem) for chunk in chunks]
+    else:
+        # Spawned, not forked: the GUI sweeps from a QThread, and forking a
+        # multithreaded process can deadlock the workers.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            futures = [pool.submit(_evaluate, records, wavelength, matrix_axes, chunk, source_axes, maxtem)
+                       for chunk in chunks]
+            parts = [future.result() for future in futures]
+    detectors = parts[0][0]
+    # rows: (matrix combo, source point, detector) -> reorder to the axes' order.
+    flat = np.concatenate([p[1] for p in parts], axis=0)
+    shape = [len(axes[i].values) for i in matrix_idx] + [len(axes[i].values) for i in source_idx]
+    powers = flat.reshape(shape + [len(detectors)])
+    order = matrix_idx + source_idx
+    powers = np.transpose(powers, [order.index(i) for i in range(len(axes))] + [len(axes)])
+    if use_cache:
+        tmp_file = cache_file + ".tmp.npz"
+        np.savez_compressed(tmp_file, detectors=np.array(detectors, dtype=str), powers=powers)
+        os.replace(tmp_file, cache_file)
+    return SweepResult(axes, detectors, powers)
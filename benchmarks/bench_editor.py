@@ -0,0 +1,152 @@
+"""Editor scalability benchmark: editing operations on synthetic layouts.
+
+Runs headless with the offscreen Qt platform. Each layout size runs in a
+fresh interpreter so memory figures are not skewed by earlier sizes:
+
+    python benchmarks/bench_editor.py --sizes 100,1000,10000,50000 > editor.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "App")
+COMPONENT_TYPES = ("laser", "mirror", "mirror", "BS", "lens", "power_detector")
+
+def rss_bytes():
+    # Resident set size from /proc where available; ru_maxrss (a peak) otherwise.
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - t0, result
+
+def measure_once(size, connections_per_component, selection, drag_steps, render_px, seed):
+    sys.path.insert(0, APP_DIR)
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtGui import QImage, QPainter
+    from PyQt5.QtCore import QRectF, QT_VERSION_STR
+    import app
+
+    rng = random.Random(seed)
+    qapp = QApplication([])
+    window = app.OpticalSetupGUI()  # never shown: no assistant warm-up, no paint events
+    model, scene = window.model, window.scene
+    extent = max(1000.0, (size ** 0.5) * 120.0)
+    result = {"size": size, "qt": QT_VERSION_STR}
+
+    # Placement goes through the model, as a click on the canvas does.
+    rss_before = rss_bytes()
+    elapsed, ids = timed(lambda: [model.add_component(rng.choice(COMPONENT_TYPES),
+                                                      rng.uniform(0, extent), rng.uniform(0, extent))
+                                  for _ in range(size)])
+    result["place_s"] = elapsed
+    result["place_us_per_component"] = elapsed / size * 1e6
+    result["memory_bytes_per_component"] = (rss_bytes() - rss_before) / size
+
+    ports = list(model.ports)
+    wanted = int(size * connections_per_component)
+
+    def connect_random():
+        made = 0
+        for _ in range(wanted * 2):
+            if made == wanted:
+                break
+            port_a, port_b = rng.sample(ports, 2)
+            if model.connection_between(port_a, port_b) is None:
+                model.connect(port_a, port_b)
+                made += 1
+        return made
+    elapsed, made = timed(connect_random)
+    result["connections"] = made
+    result["connect_s"] = elapsed
+
+    picked = rng.sample(ids, min(selection, size))
+    items = [scene.component_items[comp_id] for comp_id in picked]
+    result["selection"] = len(items)
+
+    # Multi-item drag: every frame moves each selected item (itemChange ->
+    # model + line scheduler), then the scheduler flushes once, as its timer would.
+    def drag():
+        for _ in range(drag_steps):
+            for item in items:
+                item.moveBy(3.0, 2.0)
+            scene.line_scheduler.flush()
+        window.history.seal()
+    elapsed, _ = timed(drag)
+    result["drag_s"] = elapsed
+    result["drag_ms_per_frame"] = elapsed / drag_steps * 1e3
+
+    def rotate():
+        for item in items:
+            item.setAngle(item.rotation_angle + 90)
+        scene.line_scheduler.flush()
+    result["rotate_s"], _ = timed(rotate)
+
+    result["update_connection_details_s"], _ = timed(window.update_connection_details)
+    result["netlist_s"], _ = timed(window.update_netlist)
+
+    def render():
+        source = scene.itemsBoundingRect()
+        image = QImage(render_px, render_px, QImage.Format_ARGB32_Premultiplied)
+        image.fill(0)
+        painter = QPainter(image)
+        scene.render(painter, QRectF(0, 0, render_px, render_px), source)
+        painter.end()
+        return image
+    result["render_s"], _ = timed(render)
+
+    scene.clearSelection()
+    for item in items:
+        item.setSelected(True)
+    connections_before = len(model.connections)
+    result["delete_selected_s"], _ = timed(window.delete_selected)
+    result["deleted_connections"] = connections_before - len(model.connections)
+    result["undo_delete_s"], _ = timed(window.history.undo)
+    result["history_bytes"] = window.history.memory_used()
+    result["rss_bytes"] = rss_bytes()
+    window.close()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000,50000",
+                        help="comma-separated component counts")
+    parser.add_argument("--connections", type=float, default=1.0,
+                        help="random connections per component")
+    parser.add_argument("--selection", type=int, default=1000,
+                        help="components dragged, rotated and deleted")
+    parser.add_argument("--drag-steps", type=int, default=20)
+    parser.add_argument("--render-px", type=int, default=2048)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure_once(args.child, args.connections, args.selection,
+                                      args.drag_steps, args.render_px, args.seed)))
+        return
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    runs = []
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        command = [sys.executable, os.path.abspath(__file__), "--child", str(size),
+                   "--connections", str(args.connections), "--selection", str(args.selection),
+                   "--drag-steps", str(args.drag_steps), "--render-px", str(args.render_px),
+                   "--seed", str(args.seed)]
+        out = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    summary = {"python": sys.version.split()[0], "seed": args.seed,
+               "connections_per_component": args.connections, "runs": runs}
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
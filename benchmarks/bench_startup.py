@@ -0,0 +1,75 @@
+"""Startup benchmark: import time and time-to-first-paint of the editor.
+
+Runs headless with the offscreen Qt platform. Each repeat is a fresh
+interpreter so module caches do not hide import cost:
+
+    python benchmarks/bench_startup.py --repeat 5 > startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "App")
+
+def measure_once():
+    t0 = time.perf_counter()
+    sys.path.insert(0, APP_DIR)
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+    qt_import = time.perf_counter() - t0
+    import app
+    app_import = time.perf_counter() - t0
+    qapp = QApplication([])
+    window = app.OpticalSetupGUI()
+    constructed = time.perf_counter() - t0
+    result = {}
+
+    class FirstPaint(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and "first_paint_s" not in result:
+                # Record once the paint has been handled.
+                QTimer.singleShot(0, lambda: result.setdefault("first_paint_s", time.perf_counter() - t0))
+                QTimer.singleShot(0, qapp.quit)
+            return False
+
+    watcher = FirstPaint()
+    window.view.viewport().installEventFilter(watcher)
+    window.show()
+    QTimer.singleShot(10000, qapp.quit)  # safety net
+    qapp.exec_()
+    result.update({
+        "qt_import_s": qt_import,
+        "app_import_s": app_import,
+        "window_constructed_s": constructed,
+        "openai_imported_before_paint": "openai" in sys.modules,
+    })
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure_once()))
+        return
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    runs = []
+    for _ in range(args.repeat):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                             env=env, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    summary = {"python": sys.version.split()[0], "repeat": args.repeat, "runs": runs}
+    for key in ("qt_import_s", "app_import_s", "window_constructed_s", "first_paint_s"):
+        values = [r[key] for r in runs if key in r]
+        if values:
+            summary[key + "_median"] = statistics.median(values)
+    summary["openai_imported_before_paint"] = any(r["openai_imported_before_paint"] for r in runs)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "App"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # Sweep results, block pictures and assistant answers go to a fresh directory per test.
+    path = tmp_path / "cache"
+    monkeypatch.setenv("OPTICSGPT_CACHE_DIR", str(path))
+    return path
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+@pytest.fixture
+def standin():
+    # A local stand-in for the OpenAI Assistants API; see standin.py.
+    import standin
+    server = standin.start()
+    yield server
+    server.shutdown()
+    server.server_close()
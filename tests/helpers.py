@@ -0,0 +1,22 @@
+from model import LayoutModel
+
+def layout_state(model):
+    # Everything a saved layout keeps, in a form that compares equal across reloads.
+    comps = {c.id: (c.comp_type, c.label, sorted((k, repr(v)) for k, v in c.properties.items()),
+                    c.x, c.y, c.angle, sorted(c.ports.items()))
+             for c in model.components.values()}
+    conns = {k.id: (k.port_a, k.port_b, k.length) for k in model.connections.values()}
+    blocks = {name: block.to_record() for name, block in model.blocks.items()}
+    return comps, conns, blocks
+
+def fabry_perot(R1=0.9, T1=0.1, R2=0.9, T2=0.1, length=1.0, **etm):
+    # laser -> ITM -> length -> ETM -> power detector "trans".
+    model = LayoutModel()
+    laser = model.add_component("laser", 0, 0, properties={"name": "Laser", "P": 1.0})
+    itm = model.add_component("mirror", 200, 0, properties={"name": "ITM", "R": R1, "T": T1})
+    etm = model.add_component("mirror", 400, 0, properties=dict({"name": "ETM", "R": R2, "T": T2}, **etm))
+    pd = model.add_component("power_detector", 600, 0, properties={"name": "trans"})
+    model.connect(model.port(laser, "p1").id, model.port(itm, "p1").id, length=1.0)
+    model.connect(model.port(itm, "p2").id, model.port(etm, "p1").id, length=length)
+    model.connect(model.port(etm, "p2").id, model.port(pd, "p1").id)
+    return model, {"laser": laser, "itm": itm, "etm": etm, "pd": pd}
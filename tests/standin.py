@@ -0,0 +1,99 @@
+"""Minimal local stand-in for the parts of the OpenAI Assistants API the app uses.
+
+Each stream sends server.words as message deltas, then completes the run.
+server.stall > 0 makes the stream go silent for that long after the first
+delta. Every POST is recorded in server.requests as (path, json body).
+"""
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def _message(message_id, role, content=()):
+    return {"id": message_id, "object": "thread.message", "created_at": 0, "thread_id": "thread_1",
+            "role": role, "content": list(content), "status": "completed", "attachments": [], "metadata": {},
+            "assistant_id": None, "run_id": None, "completed_at": None, "incomplete_at": None,
+            "incomplete_details": None}
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _event(self, name, data):
+        self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        server.requests.append((self.path, body))
+        if self.path.endswith("/threads"):
+            return self._json({"id": "thread_1", "object": "thread", "created_at": 0, "metadata": {},
+                               "tool_resources": None})
+        if self.path.endswith("/messages"):
+            return self._json(_message("msg_user", "user"))
+        if self.path.endswith("/cancel"):
+            server.cancelled += 1
+            return self._json({"id": "run_1", "object": "thread.run", "status": "cancelling"})
+        if not self.path.endswith("/runs"):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        run = {"id": "run_1", "object": "thread.run", "status": "queued", "thread_id": "thread_1",
+               "assistant_id": body.get("assistant_id")}
+        try:
+            self._event("thread.run.created", run)
+            self._event("thread.message.created", dict(_message("msg_1", "assistant"), status="in_progress"))
+            for i, word in enumerate(server.words):
+                self._event("thread.message.delta", {
+                    "id": "msg_1", "object": "thread.message.delta",
+                    "delta": {"content": [{"index": 0, "type": "text", "text": {"value": word}}]}})
+                if i == 0 and server.stall:
+                    end = time.monotonic() + server.stall
+                    while time.monotonic() < end and not server.stopping:
+                        time.sleep(0.02)
+            self._event("thread.run.completed", dict(run, status="completed"))
+            self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, words):
+        super().__init__(("127.0.0.1", 0), StandinHandler)
+        self.requests = []
+        self.words = list(words)
+        self.stall = 0.0
+        self.cancelled = 0
+        self.stopping = False
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def shutdown(self):
+        self.stopping = True
+        super().shutdown()
+
+    def messages(self):
+        # Contents of the user messages posted so far, in order.
+        return [body["content"] for path, body in self.requests if path.endswith("/messages")]
+
+def start(words=("Hello ", "Jane ", "Doe.")):
+    server = StandinServer(words)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,29 @@
+import time
+
+from assistant import AssistantSession, AssistantRequest
+
+def run_request(server, timeout=5.0):
+    # Runs the request on the calling thread and collects what it emits.
+    request = AssistantRequest(AssistantSession(base_url=server.base_url, api_key="test"), "hi", timeout=timeout)
+    emitted = {"delta": [], "completed": [], "failed": []}
+    request.delta.connect(emitted["delta"].append)
+    request.completed.connect(emitted["completed"].append)
+    request.failed.connect(emitted["failed"].append)
+    t0 = time.monotonic()
+    request.run()
+    return emitted, time.monotonic() - t0
+
+def test_request_streams_deltas(qapp, standin):
+    emitted, _ = run_request(standin)
+    assert emitted["delta"] == ["Hello ", "Jane ", "Doe."]
+    assert emitted["completed"] == ["Hello Jane Doe."]
+    assert emitted["failed"] == []
+    assert standin.messages() == ["hi"]
+
+def test_stalled_stream_times_out_at_the_deadline(qapp, standin):
+    standin.stall = 30.0
+    emitted, elapsed = run_request(standin, timeout=1.0)
+    assert emitted["failed"] == ["Timed out."]
+    assert emitted["completed"] == []
+    assert elapsed < 3.0
+    assert standin.cancelled == 1  # the run is cancelled server-side too
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from assistant_context import LayoutContext, netlist_lines
+from helpers import fabry_perot
+from netlist import NetlistCompiler
+
+def test_first_message_carries_the_netlist_then_only_diffs():
+    model, ids = fabry_perot()
+    context = LayoutContext(NetlistCompiler(model))
+    lines, digest = context.snapshot()
+    first = context.message("hi", lines)
+    assert first.startswith("Current optical layout") and all(line in first for line in lines)
+    context.mark_sent(lines)
+    assert context.message("again", context.snapshot()[0]) == "again"
+    model.set_properties(ids["etm"], {"name": "ETM", "R": 0.5})
+    changed, changed_digest = context.snapshot()
+    removed, added = context.diff(changed)
+    assert len(removed) == len(added) == 1 and added[0].startswith("mirror ETM")
+    assert changed_digest != digest
+    assert context.message("now?", changed).startswith("Layout changes since my last message")
+
+def test_generated_header_is_not_context():
+    assert netlist_lines("# Generated by X\nl L1 P=1\n\n") == ["l L1 P=1"]
+
+# -- against the local stand-in server ----------------------------------------
+def wait_until(app, condition, timeout=10.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out waiting for the assistant"
+        app.processEvents()
+        time.sleep(0.005)
+
+def make_widget(server, model):
+    from assistant import AssistantWidget
+    widget = AssistantWidget(base_url=server.base_url)
+    widget.session.api_key = "test"
+    widget.attach_layout(NetlistCompiler(model))
+    return widget
+
+def ask(app, widget, text):
+    widget.input_line.setText(text)
+    widget.send_message()
+    wait_until(app, lambda: widget.request is None)
+
+def test_widget_sends_context_and_memoizes_answers(qapp, standin):
+    model, ids = fabry_perot()
+    widget = make_widget(standin, model)
+    ask(qapp, widget, "what is this?")
+    first = standin.messages()[-1]
+    assert first.startswith("Current optical layout") and "mirror ETM" in first
+    model.set_properties(ids["etm"], {"name": "ETM", "R": 0.5})
+    ask(qapp, widget, "and now?")
+    second = standin.messages()[-1]
+    assert second.startswith("Layout changes since my last message")
+    assert "laser Laser" not in second  # unchanged lines are not repeated
+    assert len(standin.messages()) == 2
+
+    # A new conversation about the original layout reuses the first answer.
+    fresh, _ = fabry_perot()
+    other = make_widget(standin, fresh)
+    ask(qapp, other, "what is this?")
+    assert len(standin.messages()) == 2
+    assert "Assistant (cached): Hello Jane Doe." in other.conversation.toPlainText()
+
+    # The cached exchange reaches the thread with the next question that is sent.
+    ask(qapp, other, "why?")
+    follow_up = standin.messages()[-1]
+    assert "User: what is this?\nAssistant: Hello Jane Doe." in follow_up
+    assert "Current optical layout" in follow_up and follow_up.endswith("why?")
+
+def test_same_prompt_later_in_a_conversation_is_not_reused(qapp, standin):
+    model, _ = fabry_perot()
+    widget = make_widget(standin, model)
+    ask(qapp, widget, "what is this?")
+    ask(qapp, widget, "thanks")
+    ask(qapp, widget, "what is this?")  # the earlier exchanges may change the answer
+    assert len(standin.messages()) == 3
+
+def test_cache_can_be_switched_off(qapp, standin, monkeypatch):
+    monkeypatch.setenv("OPTICSGPT_ASSISTANT_CACHE", "0")
+    model, _ = fabry_perot()
+    for _ in range(2):
+        ask(qapp, make_widget(standin, model), "what is this?")
+    assert len(standin.messages()) == 2
@@ -0,0 +1,76 @@
+import math
+
+import numpy as np
+import pytest
+
+from helpers import fabry_perot
+from model import LayoutModel
+from beamtrace import BeamTracer, prefix_products, space_matrix, lens_matrix, apply_abcd, q_from_waist
+from solver import WAVELENGTH
+
+def set_property(model, comp_id, key, value):
+    model.set_properties(comp_id, dict(model.components[comp_id].properties, **{key: value}))
+
+def lens_line(model, name, y, f, spaces=(0.5, 1.5)):
+    # laser -> space -> lens -> space -> detector
+    laser = model.add_component("laser", 0, y, properties={"name": f"L{name}", "P": 1.0, "w0": 1e-3})
+    lens = model.add_component("lens", 200, y, properties={"name": f"f{name}", "f": f})
+    pd = model.add_component("power_detector", 400, y, properties={"name": f"pd{name}"})
+    model.connect(model.port(laser, "p1").id, model.port(lens, "p1").id, length=spaces[0])
+    model.connect(model.port(lens, "p2").id, model.port(pd, "p1").id, length=spaces[1])
+    return laser, lens, pd
+
+def test_prefix_scan_matches_sequential_products():
+    rng = np.random.default_rng(1)
+    mats = rng.normal(size=(13, 2, 2, 2))
+    expected = [mats[0]]
+    for m in mats[1:]:
+        expected.append(np.matmul(m, expected[-1]))
+    assert prefix_products(mats) == pytest.approx(np.array(expected))
+
+def test_traced_q_matches_the_naive_abcd_product():
+    model = LayoutModel()
+    _, _, pd = lens_line(model, "a", 0, 0.8)
+    qx, qy = BeamTracer(model).trace()[(model.port(pd, "p1").id, "i")]
+    m = space_matrix(1.5) @ lens_matrix(0.8) @ space_matrix(0.5)
+    expected = apply_abcd(m, q_from_waist(1e-3))
+    assert qx == pytest.approx(expected) and qy == pytest.approx(expected)
+
+def test_editing_a_component_recomputes_only_paths_through_it():
+    model = LayoutModel()
+    _, lens_a, pd_a = lens_line(model, "a", 0, 0.8)
+    _, _, pd_b = lens_line(model, "b", 300, 2.0)
+    tracer = BeamTracer(model)
+    before = tracer.trace()
+    assert tracer.recomputed_paths == 2
+    tracer.trace()
+    assert tracer.recomputed_paths == 0
+    set_property(model, lens_a, "f", 0.4)
+    after = tracer.trace()
+    assert tracer.recomputed_paths == 1
+    end_a, end_b = (model.port(pd_a, "p1").id, "i"), (model.port(pd_b, "p1").id, "i")
+    assert after[end_a] != before[end_a] and after[end_b] == before[end_b]
+    model.set_connection_length(next(iter(model.component_connections(pd_b))), 3.0)
+    tracer.trace()
+    assert tracer.recomputed_paths == 1
+
+def test_cavity_eigenmode_matches_the_two_mirror_result():
+    # Concave ITM (Rc < 0 seen from p2) and ETM (Rc > 0 seen from p1).
+    L, R1, R2 = 1.0, 2.0, 3.0
+    model, ids = fabry_perot(length=L, Rc=R2)
+    set_property(model, ids["itm"], "Rc", -R1)
+    (cavity,) = BeamTracer(model).cavities()
+    assert cavity.mirrors[0][0] == ids["itm"]
+    g1, g2 = 1 - L / R1, 1 - L / R2
+    denominator = g1 + g2 - 2 * g1 * g2
+    z1 = L * g2 * (1 - g1) / denominator
+    w0 = math.sqrt(L * WAVELENGTH / math.pi * math.sqrt(g1 * g2 * (1 - g1 * g2)) / denominator)
+    assert cavity.stable
+    assert cavity.waist_distance() == pytest.approx([z1, z1])
+    assert cavity.waist() == pytest.approx([w0, w0])
+
+def test_unstable_cavity_has_no_eigenmode():
+    model, ids = fabry_perot(length=5.0, Rc=2.0)
+    set_property(model, ids["itm"], "Rc", -2.0)
+    (cavity,) = BeamTracer(model).cavities()
+    assert not cavity.stable and cavity.waist() is None
@@ -0,0 +1,79 @@
+import pytest
+
+from helpers import layout_state, fabry_perot
+from blocks import group_into_block, explode_instance, flatten, block_type, has_instances
+from history import History
+from layout_io import save_layout, load_layout, snapshot_records, apply_record
+from model import LayoutModel
+from netlist import NetlistCompiler
+from solver import detector_powers
+
+def netlist_lines(model):
+    return sorted(NetlistCompiler(model).compile().splitlines())
+
+@pytest.fixture
+def grouped():
+    model, ids = fabry_perot(R2=0.99, T2=0.01)
+    before = netlist_lines(model)
+    powers = detector_powers(model)
+    inst = group_into_block(model, [ids["itm"], ids["etm"]], "arm")
+    return model, ids, inst, before, powers
+
+def test_grouping_keeps_the_netlist_and_the_physics(grouped):
+    model, ids, inst, before, powers = grouped
+    assert model.components[inst].comp_type == block_type("arm")
+    assert ids["itm"] not in model.components
+    assert len(model.connections) == 2  # laser and detector now attach to the instance
+    lines = NetlistCompiler(model).compile()
+    assert "arm_ITM" in lines and "arm_ETM" in lines
+    assert detector_powers(flatten(model)) == pytest.approx(powers)
+
+def test_instance_overrides_apply_to_its_members(grouped):
+    model, ids, inst, _, _ = grouped
+    other = model.add_component(block_type("arm"), 0, 500, properties={"name": "Y", "ITM.R": 0.5})
+    assert "Y_ITM R=0.5" in NetlistCompiler(model).compile()
+    assert model.components[other].ports.keys() == model.components[inst].ports.keys()
+
+def test_explode_restores_the_members(grouped):
+    model, ids, inst, before, powers = grouped
+    new_ids = explode_instance(model, inst)
+    assert len(new_ids) == 2
+    assert not has_instances(model)
+    assert detector_powers(model) == pytest.approx(powers)
+
+def test_flatten_without_instances_is_the_model_itself():
+    model, _ = fabry_perot()
+    assert flatten(model) is model
+
+def test_group_rejects_a_used_name(grouped):
+    model, ids, _, _, _ = grouped
+    with pytest.raises(ValueError):
+        group_into_block(model, [ids["laser"]], "arm")
+
+def test_blocks_survive_save_load_and_snapshots(grouped, tmp_path):
+    model = grouped[0]
+    path = str(tmp_path / "blocks.ogl")
+    save_layout(model, path)
+    assert layout_state(load_layout(path)) == layout_state(model)
+    copy = LayoutModel()
+    for record in snapshot_records(model):
+        apply_record(copy, record)
+    assert netlist_lines(copy) == netlist_lines(model)
+
+def test_group_and_ungroup_undo_and_redo():
+    model, ids = fabry_perot()
+    start = layout_state(model)
+    history = History(model)
+    with history.macro("Group"), model.batch():
+        inst = group_into_block(model, [ids["itm"], ids["etm"]], "arm")
+    grouped_state = layout_state(model)
+    with history.macro("Ungroup"), model.batch():
+        explode_instance(model, inst)
+    history.undo()
+    assert layout_state(model) == grouped_state
+    history.undo()
+    assert layout_state(model) == start
+    assert not model.blocks
+    history.redo()
+    history.redo()
+    assert not has_instances(model)
@@ -0,0 +1,22 @@
+import os
+
+import cache
+from cache import JsonCache, cache_path
+
+def test_cache_follows_the_environment(cache_dir, tmp_path, monkeypatch):
+    assert cache_path("x") == os.path.join(str(cache_dir), "x")
+    monkeypatch.setenv("OPTICSGPT_CACHE_DIR", str(tmp_path / "elsewhere"))
+    assert cache.cache_root() == str(tmp_path / "elsewhere")
+    assert os.path.isdir(cache_path("y"))
+
+def test_json_cache_evicts_least_recently_used(cache_dir):
+    store = JsonCache("lru", max_entries=2)
+    store.put("a", 1)
+    store.put("b", 2)
+    for name in ("a.json", "b.json"):  # make "a" clearly the older one
+        os.utime(os.path.join(store.directory, name), (1000 if name == "a.json" else 2000,) * 2)
+    assert store.get("a") == 1  # a hit refreshes "a"
+    store.put("c", 3)
+    assert store.get("b") is None
+    assert (store.get("a"), store.get("c")) == (1, 3)
+    assert store.directory.startswith(str(cache_dir))
@@ -0,0 +1,57 @@
+import pytest
+from PyQt5.QtCore import Qt
+
+import cli
+from helpers import fabry_perot
+from layout_io import save_layout
+
+@pytest.fixture
+def layouts(tmp_path):
+    model, ids = fabry_perot()
+    model.set_label(ids["itm"], "input")
+    good = tmp_path / "layouts"
+    good.mkdir()
+    save_layout(model, str(good / "cavity.ogl"))
+    save_layout(model, str(good / "cavity2.ogl.gz"))
+    bad = tmp_path / "bad"
+    bad.mkdir()
+    for name, record in (("short", '["M"]'), ("bare", "5"), ("kind", '["Q", 1]')):
+        with open(bad / f"{name}.ogl", "w", encoding="utf-8") as f:
+            f.write('{"format": "opticsgpt-layout", "version": 1}\n' + record + "\n")
+    (bad / "missing.ogl").write_text("")
+    return good, bad
+
+def test_exports_match_the_gui(qapp, layouts, tmp_path):
+    from app import OpticalSetupGUI
+    good, _ = layouts
+    out = tmp_path / "out"
+    assert cli.main(["netlist", str(good), "-o", str(out), "-j", "1"]) == 0
+    assert cli.main(["connections", str(good), "-o", str(out), "-j", "1"]) == 0
+    window = OpticalSetupGUI()
+    try:
+        window.load_layout_file(str(good / "cavity.ogl"))
+        rows = window.connection_model
+        gui_connections = [rows.data(rows.index(row), Qt.DisplayRole) for row in range(rows.rowCount())]
+        assert (out / "cavity.kat").read_text() == window.netlist_compiler.compile()
+        assert (out / "cavity.txt").read_text() == "\n".join(gui_connections) + "\n"
+        assert (out / "cavity2.kat").read_text() == (out / "cavity.kat").read_text()
+    finally:
+        window.close()
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_malformed_files_are_reported_and_the_batch_continues(layouts, workers):
+    good, bad = layouts
+    paths = cli.layout_paths([str(good), str(bad)])
+    results = list(cli.run_jobs("connections", paths, workers=workers))
+    assert [path for path, _, _ in results] == paths
+    errors = {path: error for path, result, error in results if error is not None}
+    assert set(errors) == {str(bad / name) for name in ("bare.ogl", "kind.ogl", "missing.ogl", "short.ogl")}
+    assert all(error.startswith("ValueError") for error in errors.values())
+
+def test_exit_status_is_non_zero_when_a_file_fails(layouts, capsys):
+    good, bad = layouts
+    assert cli.main(["evaluate", str(good), "-j", "1"]) == 0
+    capsys.readouterr()
+    assert cli.main(["evaluate", str(good / "cavity.ogl"), str(bad / "short.ogl"), "-j", "1"]) == 1
+    out, err = capsys.readouterr()
+    assert '"error"' in out and "short.ogl" in err
@@ -0,0 +1,57 @@
+import random
+
+from PyQt5.QtCore import Qt
+
+from helpers import fabry_perot
+from model import LayoutModel, connection_text
+
+def rows(list_model):
+    return [list_model.data(list_model.index(row), Qt.DisplayRole) for row in range(list_model.rowCount())]
+
+def expected(model):
+    return sorted(connection_text(model, conn_id) for conn_id in model.connections)
+
+def check(list_model, model):
+    assert list_model.rowCount() == len(model.connections)
+    assert sorted(rows(list_model)) == expected(model)
+    assert all(list_model._row_of[conn_id] == row for row, conn_id in enumerate(list_model._rows))
+
+def test_rows_follow_connect_and_disconnect(qapp):
+    from app import ConnectionListModel
+    random.seed(3)
+    model = LayoutModel()
+    comps = [model.add_component("mirror", 0, 0, properties={"name": f"M{i}"}) for i in range(12)]
+    list_model = ConnectionListModel(model)
+    for _ in range(200):
+        free = [model.port(c, p).id for c in comps for p in ("p1", "p2")
+                if not model.ports[model.port(c, p).id].connection_ids]
+        if len(free) >= 2 and (not model.connections or random.random() < 0.6):
+            a, b = random.sample(free, 2)
+            if model.component_of(a) is not model.component_of(b):
+                model.connect(a, b, length=random.random())
+        elif model.connections:
+            model.disconnect(random.choice(list(model.connections)))
+        check(list_model, model)
+
+def test_batches_end_in_one_consistent_state(qapp):
+    from app import ConnectionListModel
+    model, ids = fabry_perot()
+    list_model = ConnectionListModel(model)
+    resets = []
+    list_model.modelReset.connect(lambda: resets.append(1))
+    with model.batch():
+        model.remove_component(ids["itm"])
+        model.set_label(ids["etm"], "end")
+    assert resets == [1]
+    check(list_model, model)
+
+def test_editing_a_component_updates_its_rows(qapp):
+    from app import ConnectionListModel
+    model, ids = fabry_perot()
+    list_model = ConnectionListModel(model)
+    changed = []
+    list_model.dataChanged.connect(lambda first, last, roles: changed.append((first.row(), last.row())))
+    model.set_properties(ids["etm"], {"name": "ETM", "R": 0.5})
+    assert len(changed) == 2  # the ETM's two connections
+    assert sum("R=0.5" in text for text in rows(list_model)) == 2
+    check(list_model, model)
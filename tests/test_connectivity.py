@@ -0,0 +1,91 @@
+import random
+
+from model import LayoutModel
+from connectivity import ConnectivityIndex
+
+def summary(index):
+    return (
+        sorted(sorted(cluster) for cluster in index.clusters()),
+        sorted(index.cavities()),
+        index.dangling_ports(),
+        index.detector_issues(),
+    )
+
+def chain(model, count, comp_type="mirror"):
+    comps = [model.add_component(comp_type, 100 * i, 0, properties={"name": f"M{i}"}) for i in range(count)]
+    conns = [model.connect(model.port(a, "p2").id, model.port(b, "p1").id) for a, b in zip(comps, comps[1:])]
+    return comps, conns
+
+def test_random_edits_match_a_fresh_index():
+    rng = random.Random(7)
+    model = LayoutModel()
+    types = ["mirror", "mirror", "BS", "lens", "laser", "power_detector"]
+    for i in range(12):
+        model.add_component(types[i % len(types)], properties={"name": f"c{i}"})
+    index = ConnectivityIndex(model)
+    ports = list(model.ports)
+    for step in range(400):
+        if model.connections and rng.random() < 0.45:
+            model.disconnect(rng.choice(list(model.connections)))
+        else:
+            port_a, port_b = rng.sample(ports, 2)
+            if model.connection_between(port_a, port_b) is None:
+                model.connect(port_a, port_b)
+        if step % 3 == 0:  # let updates pile up between queries as well
+            assert summary(index) == summary(ConnectivityIndex(model))
+    assert summary(index) == summary(ConnectivityIndex(model))
+
+def test_disconnecting_splits_a_cluster():
+    model = LayoutModel()
+    comps, conns = chain(model, 4, "lens")
+    index = ConnectivityIndex(model)
+    assert index.clusters() == [set(comps)]
+    model.disconnect(conns[1])
+    assert sorted(map(sorted, index.clusters())) == [comps[:2], comps[2:]]
+    assert index.neighbours(comps[1]) == {comps[0]}
+    assert summary(index) == summary(ConnectivityIndex(model))
+
+def test_cavity_loop_opens_and_closes():
+    model = LayoutModel()
+    comps, conns = chain(model, 3, "lens")
+    index = ConnectivityIndex(model)
+    assert index.cavities() == []
+    m1 = model.add_component("mirror", -100, 0, properties={"name": "ITM"})
+    m2 = model.add_component("mirror", 300, 0, properties={"name": "ETM"})
+    model.connect(model.port(m1, "p2").id, model.port(comps[0], "p1").id)
+    end = model.connect(model.port(comps[-1], "p2").id, model.port(m2, "p1").id)
+    assert index.cavities() == [tuple(sorted(comps + [m1, m2]))]
+    model.disconnect(end)
+    assert index.cavities() == []
+    model.connect(model.port(comps[-1], "p2").id, model.port(m2, "p1").id)
+    assert index.cavities() == [tuple(sorted(comps + [m1, m2]))]
+    assert summary(index) == summary(ConnectivityIndex(model))
+
+def test_dangling_ports_follow_connections():
+    model = LayoutModel()
+    comps, conns = chain(model, 2)
+    index = ConnectivityIndex(model)
+    assert index.dangling_ports() == {model.port(comps[0], "p1").id, model.port(comps[1], "p2").id}
+    model.disconnect(conns[0])
+    assert index.dangling_ports() == {port for comp in comps for port in model.components[comp].ports.values()}
+    model.remove_component(comps[0])
+    assert index.dangling_ports() == set(model.components[comps[1]].ports.values())
+
+def test_detector_issues():
+    model = LayoutModel()
+    comps, _ = chain(model, 2)
+    pd = model.add_component("power_detector", properties={"name": "pd"})
+    index = ConnectivityIndex(model)
+    assert index.detector_issues() == {pd: "no node set and not connected"}
+    model.set_properties(pd, {"name": "pd", "node": "nowhere.p1"})
+    assert "names no component" in index.detector_issues()[pd]
+    model.set_properties(pd, {"name": "pd", "node": "M1.p9"})
+    assert index.detector_issues() == {pd: "M1 has no port p9"}
+    model.set_properties(pd, {"name": "pd", "node": "M1.p2.o"})
+    assert index.detector_issues() == {}
+    model.set_properties(pd, {"name": "pd"})
+    model.connect(model.port(comps[1], "p2").id, model.port(pd, "p1").id)
+    assert index.detector_issues() == {}
+    model.set_properties(comps[1], {"name": "END"})  # renaming the target breaks a node reference
+    model.set_properties(pd, {"name": "pd", "node": "M1.p2"})
+    assert "names no component" in index.detector_issues()[pd]
@@ -0,0 +1,100 @@
+from helpers import layout_state, fabry_perot
+from model import LayoutModel
+from history import History
+
+def test_undo_and_redo_each_edit_kind():
+    model, ids = fabry_perot()
+    history = History(model)
+    conn = next(iter(model.component_connections(ids["etm"])))
+    edits = [
+        lambda: model.move_component(ids["itm"], 5, 5),
+        lambda: model.set_angle(ids["itm"], 45),
+        lambda: model.set_properties(ids["etm"], {"name": "ETM", "R": 0.5}),
+        lambda: model.set_label(ids["etm"], "end"),
+        lambda: model.set_connection_length(conn, 7.0),
+        lambda: model.disconnect(conn),
+        lambda: model.remove_component(ids["laser"]),
+    ]
+    states = [layout_state(model)]
+    for edit in edits:
+        with history.macro("Edit"):  # as the editor does; a delete also records its connections
+            edit()
+        states.append(layout_state(model))
+    for expected in reversed(states[:-1]):
+        assert history.undo()
+        assert layout_state(model) == expected
+    assert not history.can_undo()
+    for expected in states[1:]:
+        assert history.redo()
+        assert layout_state(model) == expected
+
+def test_macro_is_one_step():
+    model, ids = fabry_perot()
+    before = layout_state(model)
+    history = History(model)
+    with history.macro("Edit properties"):
+        model.set_properties(ids["itm"], {"name": "ITM", "R": 0.2})
+        model.set_angle(ids["itm"], 30)
+        with history.macro("nested"):
+            model.move_component(ids["itm"], 1, 2)
+    assert history.undo_text() == "Edit properties"
+    history.undo()
+    assert layout_state(model) == before
+    assert not history.can_undo()
+
+def test_one_drag_is_one_move_step():
+    model = LayoutModel()
+    comp = model.add_component("mirror", 0, 0)
+    history = History(model)
+    for x in range(1, 10):
+        model.move_component(comp, x, x)
+    history.seal()
+    model.move_component(comp, 100, 100)
+    history.undo()
+    assert (model.components[comp].x, model.components[comp].y) == (9, 9)
+    history.undo()
+    assert (model.components[comp].x, model.components[comp].y) == (0, 0)
+    assert not history.can_undo()
+
+def test_delete_undo_restores_connections():
+    model, ids = fabry_perot()
+    before = layout_state(model)
+    history = History(model)
+    with history.macro("Delete"):
+        model.remove_component(ids["etm"])
+    assert not any(ids["etm"] == c for c in model.components)
+    history.undo()
+    assert layout_state(model) == before
+
+def test_new_edit_clears_redo():
+    model = LayoutModel()
+    comp = model.add_component("mirror", 0, 0)
+    history = History(model)
+    model.set_angle(comp, 10)
+    history.undo()
+    assert history.can_redo()
+    model.set_angle(comp, 20)
+    assert not history.can_redo()
+
+def test_memory_limit_drops_oldest_steps():
+    model = LayoutModel()
+    comp = model.add_component("mirror", 0, 0)
+    history = History(model, memory_limit=2000)
+    for i in range(200):
+        model.set_label(comp, f"label {i}")
+    assert history.memory_used() <= 2000
+    while history.undo():
+        pass
+    assert model.components[comp].label != ""  # the oldest steps were dropped
+
+def test_memory_limit_covers_the_redo_stack():
+    model = LayoutModel()
+    history = History(model, memory_limit=4000)
+    comps = [model.add_component("mirror", i, 0, properties={"name": f"M{i}"}) for i in range(100)]
+    assert history.memory_used() <= 4000
+    # Undoing an add records the whole component for redo, so the redo stack outgrows the undo stack.
+    while history.undo():
+        assert history.memory_used() <= 4000
+    remaining = len(model.components)
+    assert 0 < remaining < len(comps)  # the oldest adds were dropped from the undo stack
+    assert history.redo() and len(model.components) == remaining + 1
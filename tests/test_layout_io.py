@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+from helpers import layout_state, fabry_perot
+from model import LayoutModel
+from history import History
+from layout_io import LayoutJournal, save_layout, load_layout, replay_journal, snapshot_records, apply_record
+
+def journal_replayed(path):
+    model = LayoutModel()
+    replay_journal(model, path + ".journal")
+    return model
+
+def test_save_load_round_trip(tmp_path):
+    model, ids = fabry_perot()
+    model.set_label(ids["itm"], "input")
+    for name in ("a.ogl", "b.ogl.gz"):
+        path = str(tmp_path / name)
+        save_layout(model, path)
+        assert layout_state(load_layout(path)) == layout_state(model)
+
+def test_snapshot_records_rebuild_the_model():
+    model, _ = fabry_perot()
+    copy = LayoutModel()
+    for record in snapshot_records(model):
+        apply_record(copy, record)
+    assert layout_state(copy) == layout_state(model)
+
+def test_journal_replays_edits(tmp_path):
+    path = str(tmp_path / "j.ogl")
+    model = LayoutModel()
+    journal = LayoutJournal(model, path)
+    a = model.add_component("mirror", 0, 0, properties={"name": "A"})
+    b = model.add_component("mirror", 100, 0, properties={"name": "B"})
+    conn = model.connect(model.port(a, "p2").id, model.port(b, "p1").id, length=2.0)
+    for x in range(5):
+        model.move_component(a, x, 2 * x)
+    model.set_angle(b, 90)
+    model.set_properties(a, {"name": "A", "R": 0.5})
+    model.set_connection_length(conn, 3.0)
+    journal.flush()
+    model.remove_component(b)
+    journal.close()
+    assert layout_state(journal_replayed(path)) == layout_state(model)
+
+def test_journal_orders_moves_after_a_re_add(tmp_path):
+    path = str(tmp_path / "j.ogl")
+    model = LayoutModel()
+    comp = model.add_component("mirror", 0, 0, properties={"name": "M"})
+    history = History(model)
+    journal = LayoutJournal(model, path)
+    model.move_component(comp, 10, 10)
+    history.seal()
+    model.remove_component(comp)
+    history.undo()  # re-adds the component under its old id, at (10, 10)
+    model.move_component(comp, 50, 50)
+    journal.close()
+    replayed = journal_replayed(path)
+    assert (replayed.components[comp].x, replayed.components[comp].y) == (50, 50)
+    assert layout_state(replayed) == layout_state(model)
+
+@pytest.mark.parametrize("record", [
+    ["M"], 5, [], [7, 1], ["C", 1, "mirror"], ["K", 1, 2],
+    ["C", 1, "mirror", 0, 0, 0, "", {}, 5], ["P", 1, [1]], ["B", "blk", 1, [], []], ["X", 1],
+])
+def test_malformed_records_raise_value_error(record):
+    model, _ = fabry_perot()
+    with pytest.raises(ValueError):
+        apply_record(model, record)
+
+def test_malformed_file_raises_value_error(tmp_path):
+    model, _ = fabry_perot()
+    path = str(tmp_path / "bad.ogl")
+    save_layout(model, path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('["M"]\n')
+    with pytest.raises(ValueError):
+        load_layout(path)
+
+@pytest.fixture
+def window(qapp, monkeypatch):
+    import app
+    monkeypatch.setattr(app.QMessageBox, "warning", lambda *args: None)
+    window = app.OpticalSetupGUI()
+    yield window
+    window.close()
+
+def test_failed_open_keeps_the_current_layout(window, tmp_path):
+    good = str(tmp_path / "good.ogl")
+    model, _ = fabry_perot()
+    save_layout(model, good)
+    window.load_layout_file(good)
+    window.model.move_component(next(iter(window.model.components)), 5, 5)
+    before = layout_state(window.model)
+    bad = str(tmp_path / "bad.ogl")
+    with open(bad, "w", encoding="utf-8") as f:
+        f.write('{"format": "opticsgpt-layout", "version": 1}\n[5]\n')
+    window.load_layout_file(bad)
+    assert layout_state(window.model) == before
+    assert window.layout_path == good and window.journal.path == good
+    window.save_layout()
+    assert layout_state(load_layout(good)) == before
+
+def test_save_flushes_the_journal_instead_of_rewriting(window, tmp_path):
+    path = str(tmp_path / "j.ogl")
+    model, _ = fabry_perot()
+    save_layout(model, path)
+    window.load_layout_file(path)
+    mtime = os.stat(path).st_mtime_ns
+    comp_id = next(iter(window.model.components))
+    window.model.move_component(comp_id, 42, 43)
+    window.save_layout()
+    assert os.stat(path).st_mtime_ns == mtime
+    assert os.path.getsize(path + ".journal") > 0
+    assert layout_state(load_layout(path)) == layout_state(window.model)
@@ -0,0 +1,52 @@
+import pytest
+
+def geometry(line):
+    l = line.line()
+    return (round(l.x1(), 6), round(l.y1(), 6), round(l.x2(), 6), round(l.y2(), 6))
+
+@pytest.fixture
+def chain(qapp):
+    # A - B - C - D, connected in a row.
+    from app import OpticalSetupGUI
+    window = OpticalSetupGUI()
+    model = window.model
+    comps = [model.add_component("mirror", 200 * i, 0, properties={"name": f"M{i}"}) for i in range(4)]
+    for left, right in zip(comps, comps[1:]):
+        model.connect(model.port(left, "p2").id, model.port(right, "p1").id, length=1.0)
+    window.scene.line_scheduler.flush()
+    yield window, comps
+    window.close()
+
+def test_moving_a_selection_updates_each_line_once(chain, monkeypatch):
+    import app
+    window, comps = chain
+    calls = {}
+    for name in ("updateLinePosition", "translateBy"):
+        original = getattr(app.ConnectionLine, name)
+        def counted(self, *args, _name=name, _original=original):
+            calls.setdefault(id(self), []).append(_name)
+            return _original(self, *args)
+        monkeypatch.setattr(app.ConnectionLine, name, counted)
+    items = window.scene.connection_items
+    first, middle, last = [items[conn_id] for conn_id in window.model.connections]
+    # Several drag steps of M0 and M1 together before one frame.
+    for step in range(1, 6):
+        for comp_id in comps[:2]:
+            comp = window.model.components[comp_id]
+            window.model.move_component(comp_id, comp.x + 3, comp.y + 7)
+    window.scene.line_scheduler.flush()
+    assert calls[id(first)] == ["translateBy"]  # both ends moved by the same delta
+    assert calls[id(middle)] == ["updateLinePosition"]
+    assert id(last) not in calls  # untouched
+
+def test_fast_path_matches_a_full_recompute(chain):
+    window, comps = chain
+    for comp_id in comps[:2]:
+        window.model.move_component(comp_id, window.model.components[comp_id].x + 40, 55)
+    window.model.set_angle(comps[3], 90)  # rotated: must be recomputed, not translated
+    window.scene.line_scheduler.flush()
+    lines = list(window.scene.connection_items.values())
+    fast = [geometry(line) for line in lines]
+    for line in lines:
+        line.updateLinePosition()
+    assert fast == [geometry(line) for line in lines]
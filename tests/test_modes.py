@@ -0,0 +1,103 @@
+import math
+
+import numpy as np
+import pytest
+
+from beamtrace import q_from_waist
+from helpers import fabry_perot
+from model import LayoutModel
+from modes import mode_indices, knm, knm_1d
+from solver import CarrierSolver, WAVELENGTH
+
+def set_property(model, comp_id, key, value):
+    props = dict(model.components[comp_id].properties)
+    props[key] = value
+    model.set_properties(comp_id, props)
+
+def transmitted(model, maxtem):
+    return CarrierSolver(model, maxtem=maxtem).solve().detector_powers()["trans"]
+
+# -- overlaps -------------------------------------------------------------------
+def test_mode_order():
+    assert mode_indices(2) == [(0, 0), (1, 0), (0, 1), (2, 0), (1, 1), (0, 2)]
+
+def test_same_basis_without_tilt_is_the_identity():
+    q = np.array([q_from_waist(1e-3, 0.3)])
+    k = knm(q, q, q, q, np.zeros(1), np.zeros(1), 6)[0]
+    assert np.abs(k - np.eye(len(mode_indices(6)))).max() < 1e-12
+
+def test_mismatch_overlap_matches_the_analytic_value():
+    q1, q2 = q_from_waist(1e-3, 0.0), q_from_waist(0.6e-3, 0.5)
+    k00 = knm_1d(np.array([q1]), np.array([q2]), np.zeros(1), 0)[0, 0, 0]
+    assert abs(k00) ** 2 == pytest.approx(2 * math.sqrt(q1.imag * q2.imag) / abs(q2.conjugate() - q1))
+
+def test_coupling_matrices_are_unitary_in_the_limit():
+    q1, q2 = q_from_waist(1e-3, 0.0), q_from_waist(0.9e-3, 0.2)
+    k = knm_1d(np.array([q1]), np.array([q2]), np.array([5e-5]), 40)[0]
+    # Power leaving HG0 is kept once enough output modes are included.
+    assert np.sum(np.abs(k[:, 0]) ** 2) == pytest.approx(1.0, abs=1e-9)
+
+# -- tilt -----------------------------------------------------------------------
+def tilted_reflection(beta, w0=1e-3):
+    # Laser waist on the mirror; "refl" sees the reflected beam.
+    model = LayoutModel()
+    laser = model.add_component("laser", 0, 0, properties={"name": "L", "w0": w0, "z": -1.0})
+    mirror = model.add_component("mirror", 200, 0, properties={"name": "M", "R": 1.0, "T": 0.0, "xbeta": beta})
+    model.add_component("power_detector", 0, 200, properties={"name": "refl", "node": "M.p1.o"})
+    model.connect(model.port(laser, "p1").id, model.port(mirror, "p1").id, length=1.0)
+    return model, mirror
+
+@pytest.mark.parametrize("beta", [2e-5, 1e-4, 2e-4])
+def test_tilt_loss_from_the_fundamental_mode(beta):
+    w0 = 1e-3
+    model, _ = tilted_reflection(beta, w0)
+    theta0 = WAVELENGTH / (math.pi * w0)  # far-field divergence angle
+    refl = CarrierSolver(model, maxtem=0).solve().detector_powers()["refl"]
+    assert refl == pytest.approx(math.exp(-(2 * beta / theta0) ** 2), rel=1e-9)
+
+def test_tilted_light_is_kept_in_higher_order_modes():
+    model, _ = tilted_reflection(1e-4)
+    powers = [CarrierSolver(model, maxtem=k).solve().detector_powers()["refl"] for k in (0, 4, 8)]
+    assert powers[0] < powers[1] < powers[2] <= 1.0 + 1e-12
+    assert powers[2] == pytest.approx(1.0, abs=1e-6)
+
+# -- cavities -------------------------------------------------------------------
+def test_plane_wave_solve_is_unchanged_without_maxtem():
+    model, ids = fabry_perot(Rc=2.5, xbeta=1e-5)
+    assert transmitted(model, None) == pytest.approx(1.0)
+
+def test_mode_matched_cavity_matches_the_plane_wave_result():
+    model, ids = fabry_perot(Rc=2.5)
+    zr = math.sqrt(1.0 * (2.5 - 1.0))  # flat ITM, waist on it
+    w0 = math.sqrt(zr * WAVELENGTH / math.pi)
+    set_property(model, ids["laser"], "w0", w0)
+    set_property(model, ids["laser"], "z", -1.0)  # laser 1 m before the waist
+    for maxtem in (0, 2, 6):
+        assert transmitted(model, maxtem) == pytest.approx(1.0)
+
+@pytest.mark.parametrize("Rc", [2.5, 3.0])
+def test_mismatched_cavity_converges_in_maxtem(Rc):
+    model, ids = fabry_perot(Rc=Rc)  # default 1 mm laser waist, cavity waist ~0.6 mm
+    zr = math.sqrt(1.0 * (Rc - 1.0))
+    q_laser, q_cavity = q_from_waist(1e-3) + 1.0, 1j * zr
+    overlap = 4 * q_laser.imag * q_cavity.imag / abs(q_cavity.conjugate() - q_laser) ** 2
+    powers = [transmitted(model, maxtem) for maxtem in (0, 2, 4, 6, 8)]
+    assert powers[0] == pytest.approx(overlap, rel=1e-6)  # only HG00 resonates
+    assert abs(powers[-1] - powers[-2]) < 1e-4
+    assert abs(powers[-1] - powers[0]) < 0.01
+
+def test_tilted_cavity_loses_power_and_converges():
+    model, ids = fabry_perot(Rc=2.5)
+    aligned = transmitted(model, 6)
+    set_property(model, ids["etm"], "xbeta", 5e-5)
+    powers = [transmitted(model, maxtem) for maxtem in (4, 6, 8)]
+    assert powers[-1] < aligned - 0.05
+    assert abs(powers[-1] - powers[-2]) < 1e-3
+
+def test_tilt_edit_recomputes_only_that_optic():
+    model, ids = fabry_perot(Rc=2.5)
+    solver = CarrierSolver(model, maxtem=4)
+    solver.solve()
+    set_property(model, ids["etm"], "xbeta", 1e-6)
+    solver.solve()
+    assert solver.modes.recomputed == 4  # the ETM's two reflections and two transmissions
@@ -0,0 +1,56 @@
+from helpers import fabry_perot
+from model import LayoutModel
+from netlist import NetlistCompiler
+
+def lines(compiler):
+    return compiler.compile().splitlines()
+
+def from_scratch(model):
+    return NetlistCompiler(model).compile()
+
+def test_names_come_from_name_label_or_type():
+    model = LayoutModel()
+    named = model.add_component("mirror", properties={"name": "ITM 1"})
+    labelled = model.add_component("mirror", label="end")
+    bare = model.add_component("lens")
+    compiler = NetlistCompiler(model)
+    assert [compiler.componentName(c) for c in (named, labelled, bare)] == ["ITM_1", "end", f"f{bare}"]
+
+def test_duplicate_names_keep_the_oldest_and_follow_renames():
+    model = LayoutModel()
+    a = model.add_component("mirror", properties={"name": "M"})
+    b = model.add_component("mirror", properties={"name": "M"})
+    model.connect(model.port(a, "p2").id, model.port(b, "p1").id, length=1.0)
+    compiler = NetlistCompiler(model)
+    text = compiler.compile()
+    assert f"M_{b}.p1" in text and "portA=M.p2" in text
+    model.remove_component(a)
+    assert compiler.componentName(b) == "M"
+    assert compiler.compile() == from_scratch(model)
+
+def test_detector_takes_its_node_from_the_connection():
+    model, ids = fabry_perot()
+    compiler = NetlistCompiler(model)
+    assert "power_detector_dc trans node=ETM.p2.o" in lines(compiler)
+    assert not any(line.startswith("space") and "trans" in line for line in lines(compiler))
+    model.set_properties(ids["etm"], dict(model.components[ids["etm"]].properties, name="END"))
+    assert "power_detector_dc trans node=END.p2.o" in lines(compiler)
+    model.set_properties(ids["pd"], {"name": "trans", "node": "ITM.p1"})
+    assert "power_detector_dc trans node=ITM.p1.o" in lines(compiler)
+
+def test_property_edit_recompiles_one_fragment():
+    model, ids = fabry_perot()
+    compiler = NetlistCompiler(model)
+    compiler.compile()
+    model.set_properties(ids["itm"], dict(model.components[ids["itm"]].properties, R=0.5, T=0.5))
+    text = compiler.compile()
+    assert compiler.recompiled == 1
+    assert "mirror ITM R=0.5 T=0.5" in text and text == from_scratch(model)
+
+def test_moves_and_rotations_keep_the_cached_text():
+    model, ids = fabry_perot()
+    compiler = NetlistCompiler(model)
+    text = compiler.compile()
+    model.move_component(ids["itm"], 10, 20)
+    model.set_angle(ids["etm"], 45)
+    assert compiler.compile() is text and compiler.recompiled == 0
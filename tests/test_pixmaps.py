@@ -0,0 +1,49 @@
+import os
+
+import pytest
+from PyQt5.QtGui import QColor, QPixmap
+
+from pixmaps import PixmapLibrary
+
+@pytest.fixture
+def images(qapp, tmp_path):
+    directory = tmp_path / "components"
+    directory.mkdir()
+    source = QPixmap(200, 100)
+    source.fill(QColor("red"))
+    assert source.save(str(directory / "m.png"), "PNG")
+    return directory
+
+def cached_files(cache_dir):
+    directory = cache_dir / "pixmaps"
+    return sorted(os.listdir(directory)) if directory.exists() else []
+
+def test_images_are_found_and_scaled_on_first_use(images, cache_dir):
+    library = PixmapLibrary(directory=str(images), images={"mirror": "m.png"})
+    assert library._files is None and cached_files(cache_dir) == []
+    pixmap = library.pixmap("mirror")
+    assert (pixmap.width(), pixmap.height()) == (80, 40)
+    assert library.pixmap("mirror") is pixmap
+    assert library.pixmap("mirror", 40).width() == 40
+    assert library.get("unknown") is None
+
+def test_disk_cache_is_reused_by_a_new_library(images, cache_dir):
+    PixmapLibrary(directory=str(images), images={"mirror": "m.png"}).pixmap("mirror")
+    (cached,) = cached_files(cache_dir)
+    assert cached.startswith("m@80-")
+    # A marker colour in the cached file shows the second library read it instead of rescaling.
+    marker = QPixmap(80, 40)
+    marker.fill(QColor("blue"))
+    marker.save(str(cache_dir / "pixmaps" / cached), "PNG")
+    pixmap = PixmapLibrary(directory=str(images), images={"mirror": "m.png"}).pixmap("mirror")
+    assert pixmap.toImage().pixelColor(0, 0) == QColor("blue")
+
+def test_source_change_invalidates_the_disk_cache(images, cache_dir):
+    PixmapLibrary(directory=str(images), images={"mirror": "m.png"}).pixmap("mirror")
+    (old,) = cached_files(cache_dir)
+    mtime = os.path.getmtime(images / "m.png") + 10
+    os.utime(images / "m.png", (mtime, mtime))
+    pixmap = PixmapLibrary(directory=str(images), images={"mirror": "m.png"}).pixmap("mirror")
+    (new,) = cached_files(cache_dir)
+    assert new != old and new == f"m@80-{int(mtime)}.png"
+    assert pixmap.toImage().pixelColor(0, 0) == QColor("red")
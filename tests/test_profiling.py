@@ -0,0 +1,77 @@
+import pytest
+
+from helpers import fabry_perot
+from netlist import NetlistCompiler
+from profiling import PROFILER, Profiler
+from solver import CarrierSolver
+
+@pytest.fixture
+def profiler():
+    was_enabled = PROFILER.enabled
+    PROFILER.reset()
+    PROFILER.enabled = True
+    yield PROFILER
+    PROFILER.enabled = was_enabled
+    PROFILER.reset()
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    profiler.count("x")
+    with profiler.span("y"):
+        pass
+    assert profiler.counters == {} and profiler.summary() == []
+
+def test_histogram_summary():
+    profiler = Profiler(enabled=True)
+    for seconds in (0.001, 0.002, 0.004):
+        profiler.record("op", 0.0, seconds)
+    (name, count, mean, p50, p95, worst), = profiler.summary()
+    assert (name, count, worst) == ("op", 3, 0.004)
+    assert mean == pytest.approx(0.007 / 3)
+    assert p50 <= p95 <= worst
+
+def test_solver_and_netlist_counters(profiler):
+    model, ids = fabry_perot()
+    solver = CarrierSolver(model)
+    solver.solve()
+    model.set_properties(ids["etm"], {"name": "ETM", "R": 0.5})
+    solver.solve()
+    assert profiler.counters["solver.factorisations"] == 2
+    compiler = NetlistCompiler(model)
+    compiler.compile()
+    full = profiler.counters["netlist.fragments"]
+    assert full == len(model.components) + len(model.connections)
+    model.set_properties(ids["etm"], {"name": "ETM", "R": 0.6})
+    compiler.compile()
+    compiler.compile()  # unchanged: served from the cached text
+    assert profiler.counters["netlist.compiles"] == 2
+    assert profiler.counters["netlist.fragments"] - full < full  # only the edit's fragments
+
+def test_line_update_counters(qapp, profiler):
+    from app import OpticalSetupGUI
+    window = OpticalSetupGUI()
+    model = window.model
+    a = model.add_component("mirror", 0, 0, properties={"name": "A"})
+    b = model.add_component("mirror", 200, 0, properties={"name": "B"})
+    model.connect(model.port(a, "p2").id, model.port(b, "p1").id, length=1.0)
+    window.scene.line_scheduler.flush()
+    model.move_component(a, 0, 50)
+    window.scene.line_scheduler.flush()
+    assert profiler.counters.get("lines.recomputed", 0) >= 1
+    window.close()
+
+def test_overlay_restores_the_previous_state(qapp):
+    from app import OpticalSetupGUI
+    was_enabled = PROFILER.enabled
+    PROFILER.enabled = False
+    try:
+        window = OpticalSetupGUI()
+        window.profiler_action.setChecked(True)
+        window.toggle_profiler()
+        assert PROFILER.enabled
+        window.profiler_action.setChecked(False)
+        window.toggle_profiler()
+        assert not PROFILER.enabled
+        window.close()
+    finally:
+        PROFILER.enabled = was_enabled
@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+from model import COMPONENT_PROPERTIES
+from proptable import is_default, stored_properties
+
+MIRROR = COMPONENT_PROPERTIES["mirror"]
+LASER = COMPONENT_PROPERTIES["laser"]
+
+@pytest.mark.parametrize("definition, value", [
+    (MIRROR["xbeta"], 0.0),
+    (MIRROR["R"], 0.5),
+    (MIRROR["Rc"], math.inf),
+    (LASER["P"], 1.0),
+    (LASER["f"], 0.0),
+    (LASER["phase"], 0.0),
+])
+def test_dialog_values_equal_to_their_default(definition, value):
+    assert is_default(definition, value)
+
+@pytest.mark.parametrize("definition, value", [
+    (MIRROR["xbeta"], 1e-6),
+    (MIRROR["R"], 0.9),
+    (MIRROR["Rc"], 20.0),
+    (MIRROR["name"], "ITM"),
+])
+def test_values_that_differ_from_their_default(definition, value):
+    assert not is_default(definition, value)
+
+def test_stored_properties_drops_unset_and_default_values():
+    values = {"name": "ITM", "R": 0.9, "T": 0.5, "L": None, "xbeta": 0.0, "Rc": math.inf}
+    assert stored_properties(values, MIRROR) == {"name": "ITM", "R": 0.9}
+
+@pytest.fixture
+def window(qapp):
+    from app import OpticalSetupGUI
+    gui = OpticalSetupGUI()
+    yield gui
+    gui.close()
+
+@pytest.mark.parametrize("comp_type, properties", [
+    ("mirror", {"name": "ITM", "R": 0.9}),
+    ("laser", {"name": "Laser"}),
+])
+def test_accepting_an_untouched_dialog_changes_nothing(window, monkeypatch, comp_type, properties):
+    from PyQt5.QtWidgets import QDialog
+    import app
+    monkeypatch.setattr(app.PropertiesDialog, "exec_", lambda self: QDialog.Accepted)
+    comp_id = window.model.add_component(comp_type, 0, 0, properties=dict(properties))
+    window.edit_properties(comp_id)
+    assert window.model.components[comp_id].properties == properties
+    assert window.history.undo_text() == "Add component"  # no empty "Edit properties" step
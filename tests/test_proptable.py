@@ -0,0 +1,79 @@
+import math
+
+import pytest
+
+from model import LayoutModel
+from proptable import PropertyTable, parse_floats, parse_bools
+
+def mirrors(count=3):
+    model = LayoutModel()
+    ids = [model.add_component("mirror", properties={"name": f"M{i}", "R": 0.9, "T": 0.1}) for i in range(count)]
+    return model, ids
+
+def test_parse_floats():
+    values = parse_floats(["1", " 2.5 ", "", "Infty", "-inf"])
+    assert values[:2].tolist() == [1.0, 2.5] and math.isnan(values[2])
+    assert values[3:].tolist() == [math.inf, -math.inf]
+    with pytest.raises(ValueError, match="'abc'"):
+        parse_floats(["1", "abc"])
+
+def test_parse_bools():
+    assert parse_bools(["True", "no", "1", ""]).tolist() == [True, False, True, False]
+    with pytest.raises(ValueError, match="'maybe'"):
+        parse_bools(["maybe"])
+
+def test_columns_follow_the_model_and_defaults():
+    model, ids = mirrors()
+    table = PropertyTable(model, ids)
+    assert len(table) == 3 and "angle" not in table.keys
+    assert table.text(0, "R") == "0.9" and table.text(0, "Rc") == "inf"
+    assert table.text(1, "misaligned") == "False" and table.text(2, "name") == "M2"
+    assert not len(table.changed_rows()) and table.changes() == {}
+
+def test_mixed_component_types_are_rejected():
+    model, ids = mirrors(1)
+    lens = model.add_component("lens")
+    with pytest.raises(ValueError):
+        PropertyTable(model, ids + [lens])
+
+def test_invalid_text_is_rejected_and_leaves_the_column():
+    model, ids = mirrors()
+    table = PropertyTable(model, ids)
+    with pytest.raises(ValueError):
+        table.set_values("R", [0, 1], ["0.2", "lots"])
+    with pytest.raises(ValueError):
+        table.set_values("misaligned", None, "sometimes")
+    assert table.columns["R"].tolist() == [0.9] * 3
+    assert not len(table.changed_rows())
+
+def test_validate_reports_bounds_sums_and_duplicate_names():
+    model, ids = mirrors()
+    table = PropertyTable(model, ids)
+    assert table.validate() == []
+    table.set_values("R", [0], "1.5")
+    table.set_values("T", [1], "0.5")
+    table.set_values("name", [2], "M0")
+    problems = {(row, key) for row, key, _ in table.validate()}
+    assert problems == {(0, "R"), (1, "R"), (0, "name"), (2, "name")}
+
+def test_changes_store_only_non_default_values_and_apply_round_trips():
+    model, ids = mirrors()
+    model.set_angle(ids[0], 30)
+    model.set_properties(ids[1], dict(model.components[ids[1]].properties, custom="x"))
+    table = PropertyTable(model, ids)
+    table.set_values("R", None, "0.5")  # the mirror default, so it is dropped
+    table.set_values("T", [1], ["0.25"])
+    table.set_values("misaligned", [2], "yes")
+    changes = table.changes()
+    assert changes == {
+        ids[0]: {"name": "M0", "T": 0.1},
+        ids[1]: {"custom": "x", "name": "M1", "T": 0.25},
+        ids[2]: {"name": "M2", "T": 0.1, "misaligned": True},
+    }
+    assert table.apply() == 3
+    assert model.components[ids[1]].properties == changes[ids[1]]
+    assert model.components[ids[0]].angle == 30
+    assert table.changes() == {}
+    again = PropertyTable(model, ids)
+    for key in table.keys:
+        assert [again.text(row, key) for row in range(3)] == [table.text(row, key) for row in range(3)]
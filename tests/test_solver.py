@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pytest
+
+from helpers import fabry_perot
+from solver import CarrierSolver, SPEED_OF_LIGHT, detector_powers
+
+def airy_transmission(R1, T1, R2, T2, round_trip_phase):
+    r1r2 = math.sqrt(R1 * R2)
+    return T1 * T2 / (1 + R1 * R2 - 2 * r1r2 * math.cos(round_trip_phase))
+
+def add_reflection_detector(model):
+    return model.add_component("power_detector", -200, 0, properties={"name": "refl", "node": "ITM.p1.o"})
+
+def set_property(model, comp_id, key, value):
+    props = dict(model.components[comp_id].properties)
+    props[key] = value
+    model.set_properties(comp_id, props)
+
+def test_untuned_fabry_perot_is_resonant():
+    model, _ = fabry_perot()
+    assert detector_powers(model)["trans"] == pytest.approx(1.0)
+
+@pytest.mark.parametrize("length", [1.0, 1.2345, 3995.0])
+def test_resonance_does_not_depend_on_length(length):
+    model, _ = fabry_perot(length=length)
+    assert detector_powers(model)["trans"] == pytest.approx(1.0)
+
+@pytest.mark.parametrize("phi", [10.0, 45.0, 90.0, 135.4])
+def test_tuning_follows_the_airy_function(phi):
+    model, ids = fabry_perot(R1=0.9, T1=0.1, R2=0.99, T2=0.01)
+    set_property(model, ids["etm"], "phi", phi)
+    expected = airy_transmission(0.9, 0.1, 0.99, 0.01, 2 * math.radians(phi))
+    assert detector_powers(model)["trans"] == pytest.approx(expected)
+
+def test_lossless_cavity_conserves_power():
+    model, ids = fabry_perot(R1=0.8, T1=0.2, R2=0.95, T2=0.05)
+    add_reflection_detector(model)
+    set_property(model, ids["etm"], "phi", 30.0)
+    powers = detector_powers(model)
+    assert powers["trans"] + powers["refl"] == pytest.approx(1.0)
+
+def test_half_free_spectral_range_offset_is_anti_resonant():
+    length = 2.0
+    model, ids = fabry_perot(length=length)
+    set_property(model, ids["laser"], "f", SPEED_OF_LIGHT / (4 * length))
+    assert detector_powers(model)["trans"] == pytest.approx(airy_transmission(0.9, 0.1, 0.9, 0.1, math.pi))
+    set_property(model, ids["laser"], "f", SPEED_OF_LIGHT / (2 * length))
+    assert detector_powers(model)["trans"] == pytest.approx(1.0)
+
+def test_laser_power_edits_reuse_the_factorisation():
+    model, ids = fabry_perot()
+    solver = CarrierSolver(model)
+    solver.solve()
+    set_property(model, ids["laser"], "P", 2.0)
+    assert solver.solve().detector_powers()["trans"] == pytest.approx(2.0)
+    assert solver.factorisations == 1
+    set_property(model, ids["etm"], "phi", 90.0)
+    solver.solve()
+    assert solver.factorisations == 2
+
+def test_batched_laser_powers_solve_as_columns():
+    model, ids = fabry_perot()
+    solver = CarrierSolver(model)
+    powers = solver.solve({ids["laser"]: (np.array([1.0, 2.0, 3.0]), np.zeros(3))}).detector_powers(columns=True)
+    assert powers["trans"] == pytest.approx([1.0, 2.0, 3.0])
+
+def test_unresolved_detector_node_has_no_power():
+    model, _ = fabry_perot()
+    model.add_component("power_detector", 0, 300, properties={"name": "nowhere", "node": "XYZ.p1"})
+    assert detector_powers(model)["nowhere"] is None
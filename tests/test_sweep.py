@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pytest
+
+import sweep
+from helpers import fabry_perot
+from solver import detector_powers
+from sweep import SweepAxis, run_sweep
+
+def set_property(model, comp_id, key, value):
+    props = dict(model.components[comp_id].properties)
+    props[key] = value
+    model.set_properties(comp_id, props)
+
+def direct_powers(model, comp_id, key, values):
+    powers = []
+    for value in values:
+        set_property(model, comp_id, key, value)
+        powers.append(detector_powers(model)["trans"])
+    return np.array(powers)
+
+def test_sweep_matches_direct_solves():
+    model, ids = fabry_perot()
+    values = np.linspace(0, 90, 7)
+    result = run_sweep(model, [SweepAxis(ids["etm"], "phi", values)], use_cache=False)
+    assert result.detectors == ["trans"]
+    assert result.detector("trans") == pytest.approx(direct_powers(model, ids["etm"], "phi", values))
+
+def test_sweep_in_worker_processes(monkeypatch):
+    monkeypatch.setattr(sweep, "CHUNK_SIZE", 2)
+    model, ids = fabry_perot()
+    values = np.linspace(0, 90, 5)
+    axes = [SweepAxis(ids["etm"], "phi", values)]
+    parallel = run_sweep(model, axes, max_workers=2, use_cache=False)
+    serial = run_sweep(model, axes, max_workers=1, use_cache=False)
+    assert parallel.powers == pytest.approx(serial.powers)
+
+def test_two_axes_with_source_axis_and_cache(cache_dir):
+    model, ids = fabry_perot()
+    axes = [SweepAxis(ids["laser"], "P", [1.0, 2.0]), SweepAxis(ids["etm"], "phi", [0.0, 90.0])]
+    assert not (cache_dir / "sweeps").exists()
+    result = run_sweep(model, axes)
+    assert not result.cached and len(os.listdir(cache_dir / "sweeps")) == 1
+    assert result.powers.shape == (2, 2, 1)
+    assert result.powers[1, :, 0] == pytest.approx(2 * result.powers[0, :, 0])
+    again = run_sweep(model, axes)
+    assert again.cached and again.powers == pytest.approx(result.powers)
+
+def test_sweep_task_reports_unexpected_errors(qapp, monkeypatch):
+    from concurrent.futures.process import BrokenProcessPool
+    from app import SweepTask
+    def broken(*args, **kwargs):
+        raise BrokenProcessPool("a worker died")
+    monkeypatch.setattr(sweep, "run_sweep", broken)
+    model, ids = fabry_perot()
+    task = SweepTask(model, [SweepAxis(ids["etm"], "phi", [0.0])])
+    failures = []
+    task.failed.connect(failures.append)
+    task.run()
+    assert failures == ["a worker died"]